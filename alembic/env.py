@@ -59,6 +59,17 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # app.migrations.upgrade passa a conexão da API em config.attributes
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(
+            connection=connection, target_metadata=target_metadata
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
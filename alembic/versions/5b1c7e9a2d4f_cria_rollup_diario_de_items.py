@@ -0,0 +1,51 @@
+"""Cria rollup diario de items
+
+Revision ID: 5b1c7e9a2d4f
+Revises: 03ee80d94e80
+Create Date: 2025-10-06 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1c7e9a2d4f'
+down_revision: Union[str, Sequence[str], None] = '03ee80d94e80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'items_daily_rollup',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('operation_type', sa.String(length=120), nullable=False),
+        sa.Column('success', sa.Boolean(), nullable=False),
+        sa.Column('hostname', sa.String(length=120), nullable=False),
+        sa.Column('num_caixa', sa.Integer(), nullable=False),
+        sa.Column('item_count', sa.BigInteger(), nullable=False),
+        sa.Column('vl_total_sum', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'operation_type', 'success', 'hostname', 'num_caixa'),
+    )
+    # Backfill com o histórico existente; depois disso a ingestão mantém o rollup
+    op.execute(
+        """
+        INSERT INTO items_daily_rollup
+            (day, operation_type, success, hostname, num_caixa, item_count, vl_total_sum)
+        SELECT DATE(created_at), operation_type, success,
+               COALESCE(hostname, ''), COALESCE(num_caixa, -1),
+               COUNT(id), SUM(vl_total)
+        FROM items
+        GROUP BY DATE(created_at), operation_type, success,
+                 COALESCE(hostname, ''), COALESCE(num_caixa, -1)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('items_daily_rollup')
@@ -0,0 +1,42 @@
+"""Remove indices EXTRACT de items
+
+Revision ID: 8e2f4a6c1b37
+Revises: 5b1c7e9a2d4f
+Create Date: 2025-10-08 14:03:52.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2f4a6c1b37'
+down_revision: Union[str, Sequence[str], None] = '5b1c7e9a2d4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # get_kpi_data passou a filtrar por intervalos de created_at, atendidos por
+    # ix_items_date_success_operation; os índices funcionais não são mais usados.
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX IF EXISTS ix_items_success_year_operation')
+    op.execute('DROP INDEX IF EXISTS ix_items_success_year_month_operation')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.create_index(
+        'ix_items_success_year_operation', 'items',
+        [sa.text('success, EXTRACT(year FROM created_at), operation_type')],
+    )
+    op.create_index(
+        'ix_items_success_year_month_operation', 'items',
+        [sa.text('success, EXTRACT(year FROM created_at), EXTRACT(month FROM created_at), operation_type')],
+    )
@@ -0,0 +1,130 @@
+"""Cria sketches diarios de items
+
+Revision ID: a9c1e3f5b7d2
+Revises: f3a5c7e9b1d4
+Create Date: 2026-10-17 15:40:12.731940
+
+"""
+from datetime import datetime, time, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c1e3f5b7d2'
+down_revision: Union[str, Sequence[str], None] = 'f3a5c7e9b1d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Cópia congelada do formato de app.sketches nesta revisão: a migração não
+# importa o código da aplicação, que pode mudar depois dela
+HLL_PRECISION = 12
+DIGEST_COMPRESSION = 200
+NULL_HOSTNAME = ''
+NULL_NUM_CAIXA = -1
+_REGISTERS = 1 << HLL_PRECISION
+_RANK_BITS = 64 - HLL_PRECISION
+_ENTRY = np.dtype('<u4')
+_CENTROID = np.dtype([('mean', '<f8'), ('weight', '<u4')])
+
+sketches = sa.table(
+    'items_daily_sketches',
+    sa.column('day', sa.Date), sa.column('operation_type', sa.String), sa.column('hostname', sa.String),
+    sa.column('num_caixa', sa.Integer), sa.column('item_count', sa.BigInteger),
+    sa.column('tickets', sa.LargeBinary), sa.column('vl_total', sa.LargeBinary),
+)
+_DAY_ITEMS = sa.text(
+    'SELECT o.name, h.name, i.num_caixa, i.ticket_code, i.vl_total FROM items i '
+    'JOIN operation_types o ON o.id = i.operation_type_id '
+    'LEFT JOIN hostnames h ON h.id = i.hostname_id '
+    'WHERE i.created_at >= :start AND i.created_at < :end'
+)
+
+
+def _hll(tickets) -> bytes:
+    hashes = pd.util.hash_array(np.asarray(tickets, dtype=object))
+    index = (hashes >> np.uint64(_RANK_BITS)).astype(np.int64)
+    _, exponent = np.frexp((hashes & np.uint64((1 << _RANK_BITS) - 1)).astype(np.float64))
+    registers = np.zeros(_REGISTERS, dtype=np.uint8)
+    np.maximum.at(registers, index, (_RANK_BITS + 1 - exponent).astype(np.uint8))
+    occupied = np.flatnonzero(registers)
+    return ((occupied.astype(np.uint32) << 8) | registers[occupied]).astype(_ENTRY).tobytes()
+
+
+def _digest(values) -> bytes:
+    """t-digest (escala k1) dos valores; até DIGEST_COMPRESSION valores, exato."""
+    means = np.sort(np.asarray(values, dtype=np.float64))
+    weights = np.ones(len(means))
+    if len(means) > DIGEST_COMPRESSION:
+        quantile = (np.cumsum(weights) - weights / 2) / len(means)
+        bucket = np.floor(DIGEST_COMPRESSION / (2 * np.pi) * np.arcsin(2 * quantile - 1)).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        merged = np.add.reduceat(weights, starts)
+        means, weights = np.add.reduceat(means * weights, starts) / merged, merged
+    centroids = np.empty(len(means), dtype=_CENTROID)
+    centroids['mean'] = means
+    centroids['weight'] = np.rint(weights)
+    return centroids.tobytes()
+
+
+def _backfill(connection) -> None:
+    """Sketches de cada dia já gravado em items, um dia por vez."""
+    first, last = connection.execute(sa.text('SELECT MIN(created_at), MAX(created_at) FROM items')).one()
+    if first is None:
+        return
+    if isinstance(first, str):
+        # SQLite devolve o texto gravado
+        first, last = datetime.fromisoformat(first), datetime.fromisoformat(last)
+    day = first.date()
+    while day <= last.date():
+        start = datetime.combine(day, time.min)
+        frame = pd.DataFrame(
+            connection.execute(_DAY_ITEMS, {'start': start, 'end': start + timedelta(days=1)}).all(),
+            columns=['operation_type', 'hostname', 'num_caixa', 'ticket_code', 'vl_total'],
+        )
+        frame['hostname'] = frame['hostname'].fillna(NULL_HOSTNAME)
+        frame['num_caixa'] = pd.to_numeric(frame['num_caixa']).fillna(NULL_NUM_CAIXA).astype(np.int64)
+        rows = [
+            {
+                'day': day, 'operation_type': operation_type, 'hostname': hostname,
+                'num_caixa': int(num_caixa), 'item_count': len(group),
+                'tickets': _hll(group['ticket_code'].to_numpy()), 'vl_total': _digest(group['vl_total'].to_numpy()),
+            }
+            for (operation_type, hostname, num_caixa), group in frame.groupby(
+                ['operation_type', 'hostname', 'num_caixa'], sort=True
+            )
+        ]
+        if rows:
+            connection.execute(sketches.insert(), rows)
+        day += timedelta(days=1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'items_daily_sketches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('operation_type', sa.String(length=120), nullable=False),
+        sa.Column('hostname', sa.String(length=120), nullable=False),
+        sa.Column('num_caixa', sa.Integer(), nullable=False),
+        sa.Column('item_count', sa.BigInteger(), nullable=False),
+        sa.Column('tickets', sa.LargeBinary(), nullable=False),
+        sa.Column('vl_total', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_items_daily_sketches_key', 'items_daily_sketches', ['day', 'operation_type', 'hostname', 'num_caixa']
+    )
+    # Backfill com o histórico existente, como no rollup
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_items_daily_sketches_key', table_name='items_daily_sketches')
+    op.drop_table('items_daily_sketches')
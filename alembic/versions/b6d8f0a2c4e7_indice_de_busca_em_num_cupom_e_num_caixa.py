@@ -0,0 +1,74 @@
+"""Indice de busca em num_cupom e num_caixa
+
+Revision ID: b6d8f0a2c4e7
+Revises: a9c1e3f5b7d2
+Create Date: 2026-10-17 18:05:41.502913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d8f0a2c4e7'
+down_revision: Union[str, Sequence[str], None] = 'a9c1e3f5b7d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLE = 'items_ticket_fts'
+TRIGGERS = ('items_ticket_fts_ai', 'items_ticket_fts_ad', 'items_ticket_fts_au')
+PG_INDEXES = {
+    'ix_items_num_cupom_trgm': 'num_cupom',
+    'ix_items_num_caixa_trgm': 'num_caixa',
+}
+
+
+def _sqlite_fts_ddl(columns: tuple[str, ...]) -> tuple[str, ...]:
+    """Tabela FTS5 trigram sobre ``columns`` de items e os gatilhos que a mantêm."""
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{name}' for name in columns)
+    old = ', '.join(f'old.{name}' for name in columns)
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{names}, content='items', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_ai AFTER INSERT ON items BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {names}) VALUES (new.id, {new}); END",
+        "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_ad AFTER DELETE ON items BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {names}) "
+        f"VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS items_ticket_fts_au AFTER UPDATE OF {names} ON items BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {names}) "
+        f"VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {names}) VALUES (new.id, {new}); END",
+    )
+
+
+def _rebuild_sqlite_fts(columns: tuple[str, ...]) -> None:
+    for trigger in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    for statement in _sqlite_fts_ddl(columns):
+        op.execute(statement)
+    op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name == 'postgresql':
+        # Mesma expressão CAST AS TEXT de app.search; no items particionado o
+        # índice é criado em cada partição
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, column in PG_INDEXES.items():
+            op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON items USING gin ((CAST({column} AS TEXT)) gin_trgm_ops)')
+        return
+    _rebuild_sqlite_fts(('ticket_code', 'num_cupom', 'num_caixa'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == 'postgresql':
+        for name in PG_INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS {name}')
+        return
+    _rebuild_sqlite_fts(('ticket_code',))
@@ -0,0 +1,113 @@
+"""Particiona items por mes
+
+Revision ID: c4d9e1f7a2b6
+Revises: 8e2f4a6c1b37
+Create Date: 2025-10-13 09:41:27.503318
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d9e1f7a2b6'
+down_revision: Union[str, Sequence[str], None] = '8e2f4a6c1b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partições futuras criadas já na migração; depois disso `python -m app.partitions
+# maintain` mantém a janela.
+MONTHS_AHEAD = 3
+
+# Índices recriados no pai particionado (e propagados a cada partição).
+# ix_items_created_at_desc duplicava ix_items_created_at e ix_items_success
+# indexava um booleano; ambos deixam de existir.
+INDEXES = {
+    'ix_items_ticket_code': 'ticket_code',
+    'ix_items_num_ped_ecf': 'num_ped_ecf',
+    'ix_items_num_cupom': 'num_cupom',
+    'ix_items_num_caixa': 'num_caixa',
+    'ix_items_hostname': 'hostname',
+    'ix_items_vl_total': 'vl_total',
+    'ix_items_operation_type': 'operation_type',
+    'ix_items_created_at': 'created_at',
+    'ix_items_created_at_operation_type': 'created_at, operation_type',
+    'ix_items_date_success_operation': 'created_at, success, operation_type',
+    'ix_items_caixa_date_operation': 'num_caixa, created_at, operation_type',
+    'ix_items_hostname_date_operation': 'hostname, created_at, operation_type',
+    'ix_items_date_only': 'DATE(created_at)',
+    'ix_items_value_date': 'vl_total, created_at',
+    'ix_items_ticket_date': 'ticket_code, created_at',
+}
+DROPPED_INDEXES = {
+    'ix_items_created_at_desc': 'created_at DESC',
+    'ix_items_success': 'success',
+}
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        # SQLite não tem particionamento; só remove os índices redundantes
+        for name in DROPPED_INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS {name}')
+        return
+
+    bind = op.get_bind()
+    op.execute('ALTER TABLE items RENAME TO items_unpartitioned')
+    op.execute('ALTER TABLE items_unpartitioned RENAME CONSTRAINT items_pkey TO items_unpartitioned_pkey')
+    op.execute('ALTER SEQUENCE items_id_seq OWNED BY NONE')
+    op.execute(
+        'CREATE TABLE items (LIKE items_unpartitioned INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (created_at)'
+    )
+    # A chave de partição precisa fazer parte da chave primária
+    op.execute('ALTER TABLE items ADD CONSTRAINT items_pkey PRIMARY KEY (id, created_at)')
+
+    oldest = bind.scalar(sa.text('SELECT MIN(created_at) FROM items_unpartitioned'))
+    current = date.today().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else current
+    last = _add_months(current, MONTHS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE items_p{month:%Y_%m} PARTITION OF items "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute('CREATE TABLE items_default PARTITION OF items DEFAULT')
+
+    op.execute('INSERT INTO items SELECT * FROM items_unpartitioned')
+    op.execute('DROP TABLE items_unpartitioned')
+    op.execute('ALTER SEQUENCE items_id_seq OWNED BY items.id')
+
+    for name, columns in INDEXES.items():
+        op.execute(f'CREATE INDEX {name} ON items ({columns})')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != 'postgresql':
+        for name, columns in DROPPED_INDEXES.items():
+            op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON items ({columns})')
+        return
+
+    op.execute('ALTER TABLE items RENAME TO items_partitioned')
+    op.execute('ALTER TABLE items_partitioned RENAME CONSTRAINT items_pkey TO items_partitioned_pkey')
+    op.execute('ALTER SEQUENCE items_id_seq OWNED BY NONE')
+    op.execute('CREATE TABLE items (LIKE items_partitioned INCLUDING DEFAULTS)')
+    op.execute('ALTER TABLE items ADD CONSTRAINT items_pkey PRIMARY KEY (id)')
+    op.execute('INSERT INTO items SELECT * FROM items_partitioned')
+    op.execute('DROP TABLE items_partitioned CASCADE')
+    op.execute('ALTER SEQUENCE items_id_seq OWNED BY items.id')
+
+    for name, columns in {**INDEXES, **DROPPED_INDEXES}.items():
+        op.execute(f'CREATE INDEX {name} ON items ({columns})')
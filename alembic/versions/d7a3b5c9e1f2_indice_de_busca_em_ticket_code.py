@@ -0,0 +1,57 @@
+"""Indice de busca em ticket_code
+
+Revision ID: d7a3b5c9e1f2
+Revises: c4d9e1f7a2b6
+Create Date: 2025-10-14 16:22:08.190436
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3b5c9e1f2'
+down_revision: Union[str, Sequence[str], None] = 'c4d9e1f7a2b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLE = 'items_ticket_fts'
+
+# Mesmo DDL de models.ITEMS_FTS_SQLITE_DDL
+SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "ticket_code, content='items', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_ai AFTER INSERT ON items BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, ticket_code) VALUES (new.id, new.ticket_code); END",
+    "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_ad AFTER DELETE ON items BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, ticket_code) "
+    "VALUES ('delete', old.id, old.ticket_code); END",
+    "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_au AFTER UPDATE OF ticket_code ON items BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, ticket_code) "
+    "VALUES ('delete', old.id, old.ticket_code); "
+    f"INSERT INTO {FTS_TABLE}(rowid, ticket_code) VALUES (new.id, new.ticket_code); END",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name == 'postgresql':
+        # GIN de trigramas atende ilike '%termo%'; no items particionado o índice
+        # é criado em cada partição
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_items_ticket_code_trgm ON items USING gin (ticket_code gin_trgm_ops)')
+        return
+    for statement in SQLITE_DDL:
+        op.execute(statement)
+    op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_items_ticket_code_trgm')
+        return
+    for trigger in ('items_ticket_fts_ai', 'items_ticket_fts_ad', 'items_ticket_fts_au'):
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
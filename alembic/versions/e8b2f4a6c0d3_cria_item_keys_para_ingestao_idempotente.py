@@ -0,0 +1,51 @@
+"""Cria item_keys para ingestao idempotente
+
+Revision ID: e8b2f4a6c0d3
+Revises: d7a3b5c9e1f2
+Create Date: 2026-10-17 07:41:12.503318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b2f4a6c0d3'
+down_revision: Union[str, Sequence[str], None] = 'd7a3b5c9e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'item_keys',
+        sa.Column('ticket_code', sa.String(length=120), nullable=False),
+        sa.Column('num_cupom', sa.BigInteger(), nullable=False),
+        sa.Column('operation_type', sa.String(length=120), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('ticket_code', 'num_cupom', 'operation_type'),
+    )
+    op.create_index('ix_item_keys_created_at', 'item_keys', ['created_at'])
+    # Backfill: duplicatas já existentes ficam em items; a chave aponta para a mais antiga
+    op.execute(
+        """
+        INSERT INTO item_keys (ticket_code, num_cupom, operation_type, item_id, created_at)
+        SELECT i.ticket_code, COALESCE(i.num_cupom, -1), i.operation_type, i.id, i.created_at
+        FROM items i
+        JOIN (
+            SELECT MIN(id) AS id
+            FROM items
+            GROUP BY ticket_code, COALESCE(num_cupom, -1), operation_type
+        ) first ON first.id = i.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_item_keys_created_at', table_name='item_keys')
+    op.drop_table('item_keys')
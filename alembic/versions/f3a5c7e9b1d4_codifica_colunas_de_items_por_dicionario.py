@@ -0,0 +1,134 @@
+"""Codifica colunas de items por dicionario
+
+Revision ID: f3a5c7e9b1d4
+Revises: e8b2f4a6c0d3
+Create Date: 2026-10-17 10:12:44.218305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a5c7e9b1d4'
+down_revision: Union[str, Sequence[str], None] = 'e8b2f4a6c0d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLE = 'items_ticket_fts'
+
+# Gatilhos do FTS5 como existiam nesta revisão (d7a3b5c9e1f2), recriados no downgrade
+SQLITE_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "ticket_code, content='items', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_ai AFTER INSERT ON items BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, ticket_code) VALUES (new.id, new.ticket_code); END",
+    "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_ad AFTER DELETE ON items BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, ticket_code) "
+    "VALUES ('delete', old.id, old.ticket_code); END",
+    "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_au AFTER UPDATE OF ticket_code ON items BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, ticket_code) "
+    "VALUES ('delete', old.id, old.ticket_code); "
+    f"INSERT INTO {FTS_TABLE}(rowid, ticket_code) VALUES (new.id, new.ticket_code); END",
+)
+
+# Coluna de items -> (tabela de dicionário, tipo do id, NOT NULL)
+DICTIONARIES = {
+    'operation_type': ('operation_types', 'SMALLINT', True),
+    'hostname': ('hostnames', 'SMALLINT', False),
+    'message': ('messages', 'INTEGER', True),
+}
+OLD_INDEXES = {
+    'ix_items_hostname': 'hostname',
+    'ix_items_operation_type': 'operation_type',
+    'ix_items_created_at_operation_type': 'created_at, operation_type',
+    'ix_items_date_success_operation': 'created_at, success, operation_type',
+    'ix_items_caixa_date_operation': 'num_caixa, created_at, operation_type',
+    'ix_items_hostname_date_operation': 'hostname, created_at, operation_type',
+}
+NEW_INDEXES = {
+    'ix_items_hostname_id': 'hostname_id',
+    'ix_items_operation_type_id': 'operation_type_id',
+    'ix_items_created_at_operation_type': 'created_at, operation_type_id',
+    'ix_items_date_success_operation': 'created_at, success, operation_type_id',
+    'ix_items_caixa_date_operation': 'num_caixa, created_at, operation_type_id',
+    'ix_items_hostname_date_operation': 'hostname_id, created_at, operation_type_id',
+}
+OLD_TYPES = {'operation_type': 'VARCHAR(120)', 'hostname': 'VARCHAR(120)', 'message': 'TEXT'}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    postgresql = op.get_context().dialect.name == 'postgresql'
+    small_id = sa.SmallInteger().with_variant(sa.Integer(), 'sqlite')
+    for table, id_type in (('operation_types', small_id), ('hostnames', small_id), ('messages', sa.Integer())):
+        op.create_table(
+            table,
+            sa.Column('id', id_type, primary_key=True),
+            sa.Column('name', sa.Text() if table == 'messages' else sa.String(length=120), nullable=False),
+            sa.UniqueConstraint('name'),
+        )
+
+    for column, (table, id_type, _) in DICTIONARIES.items():
+        op.execute(
+            f'INSERT INTO {table} (name) SELECT DISTINCT {column} FROM items '
+            f'WHERE {column} IS NOT NULL ORDER BY {column}'
+        )
+        op.execute(f'ALTER TABLE items ADD COLUMN {column}_id {id_type} REFERENCES {table} (id)')
+    # Uma única passada reescreve as três colunas
+    op.execute(
+        'UPDATE items SET '
+        + ', '.join(
+            f'{column}_id = (SELECT id FROM {table} WHERE name = items.{column})'
+            for column, (table, _, _) in DICTIONARIES.items()
+        )
+    )
+
+    for name in OLD_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    for column, (_, _, not_null) in DICTIONARIES.items():
+        # SQLite não altera NOT NULL de coluna existente; o modelo continua exigindo
+        if postgresql and not_null:
+            op.execute(f'ALTER TABLE items ALTER COLUMN {column}_id SET NOT NULL')
+        op.execute(f'ALTER TABLE items DROP COLUMN {column}')
+    for name, columns in NEW_INDEXES.items():
+        op.execute(f'CREATE INDEX {name} ON items ({columns})')
+    # No PostgreSQL o espaço das colunas removidas só volta com a reescrita da
+    # tabela (VACUUM FULL items, ou pg_repack por partição, fora do horário de pico)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    postgresql = op.get_context().dialect.name == 'postgresql'
+    for column in DICTIONARIES:
+        op.execute(f'ALTER TABLE items ADD COLUMN {column} {OLD_TYPES[column]}')
+    op.execute(
+        'UPDATE items SET '
+        + ', '.join(
+            f'{column} = (SELECT name FROM {table} WHERE id = items.{column}_id)'
+            for column, (table, _, _) in DICTIONARIES.items()
+        )
+    )
+
+    for name in NEW_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    if postgresql:
+        for column, (_, _, not_null) in DICTIONARIES.items():
+            if not_null:
+                op.execute(f'ALTER TABLE items ALTER COLUMN {column} SET NOT NULL')
+            op.execute(f'ALTER TABLE items DROP COLUMN {column}_id')
+    else:
+        # Com a FK do create_all o SQLite só remove a coluna recriando a tabela,
+        # o que leva junto os gatilhos do FTS e o índice de expressão
+        with op.batch_alter_table('items', recreate='always') as batch:
+            for column in DICTIONARIES:
+                batch.drop_column(f'{column}_id')
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        op.execute('CREATE INDEX IF NOT EXISTS ix_items_date_only ON items (DATE(created_at))')
+    for table, _, _ in DICTIONARIES.values():
+        op.drop_table(table)
+    for name, columns in OLD_INDEXES.items():
+        op.execute(f'CREATE INDEX {name} ON items ({columns})')
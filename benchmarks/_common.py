@@ -0,0 +1,127 @@
+# _common.py
+"""Utilitários compartilhados pelos scripts de benchmark.
+
+Os scripts rodam da raiz do repositório com o pacote ``app`` no caminho:
+``PYTHONPATH=src python benchmarks/<script>.py`` (ou depois de ``pip install -e .``).
+"""
+import random
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app import dictionary, migrations, models, rollup, sketches
+from app.config import settings
+
+# As medições repetem as mesmas consultas; com o cache só a primeira iria ao banco
+settings.QUERY_CACHE_ENABLED = False
+
+OPERATION_TYPES = ("MANUAL_VALIDATION", "AUTOMATIC_VALIDATION")
+
+# Distribuição "realista": poucas lojas concentram o volume, movimento no horário
+# comercial e mais itens nos dias recentes
+HOSTNAMES = [str(n).zfill(4) for n in range(1, 33)]
+HOSTNAME_WEIGHTS = [1 / rank ** 1.1 for rank in range(1, 33)]
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 4, 8, 10, 11, 12, 14, 13, 11, 10, 10, 11, 13, 14, 12, 8, 4, 2]
+
+
+def _drop_tables(connection) -> None:
+    """Remove as tabelas do banco, inclusive partições, ``alembic_version`` e as do FTS5."""
+    cascade = " CASCADE" if connection.dialect.name == "postgresql" else ""
+    for name in inspect(connection).get_table_names():
+        # No SQLite as tabelas internas do FTS5 somem com a virtual
+        if inspect(connection).has_table(name):
+            connection.execute(text(f'DROP TABLE IF EXISTS "{name}"{cascade}'))
+
+
+def make_sessionmaker(url: str | None = None):
+    """Cria o schema em ``url`` (ou em um SQLite temporário) e retorna um sessionmaker.
+
+    O schema vem das migrações (``alembic upgrade heads``), como em uma
+    instalação nova: no PostgreSQL ``items`` é particionada por mês.
+    """
+    if url is None:
+        path = Path(tempfile.mkdtemp(prefix="bench_")) / "bench.sqlite3"
+        url = f"sqlite:///{path}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        _drop_tables(connection)
+        migrations.upgrade(connection)
+    return sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def fake_item(rng: random.Random) -> dict:
+    """Gera o payload de um item com lojas, caixas e valores uniformes."""
+    operation_type = rng.choice(OPERATION_TYPES)
+    return {
+        "ticket_code": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "num_ped_ecf": str(rng.randint(0, 9999)),
+        "num_cupom": rng.randint(0, 9999),
+        "num_caixa": rng.randint(1, 32) if operation_type == "AUTOMATIC_VALIDATION" else None,
+        "hostname": str(rng.randint(1, 32)).zfill(4),
+        "vl_total": float(rng.randint(0, 9999)),
+        "operation_type": operation_type,
+        "success": rng.random() < 0.95,
+        "message": "Desconto aplicado",
+    }
+
+
+def realistic_item(rng: random.Random, now: datetime, days: int) -> dict:
+    """Item com ``created_at`` e as distribuições de ``HOSTNAME_WEIGHTS``/``HOUR_WEIGHTS``."""
+    item = fake_item(rng)
+    item["hostname"] = rng.choices(HOSTNAMES, HOSTNAME_WEIGHTS)[0]
+    item["vl_total"] = round(rng.lognormvariate(3.5, 0.8), 2)
+    item["operation_type"] = "AUTOMATIC_VALIDATION" if rng.random() < 0.7 else "MANUAL_VALIDATION"
+    item["num_caixa"] = rng.randint(1, 32) if item["operation_type"] == "AUTOMATIC_VALIDATION" else None
+    # Densidade linear decrescente com a idade: o volume cresce ao longo do período
+    day = int(days * (1 - rng.random() ** 0.5))
+    hour = rng.choices(range(24), HOUR_WEIGHTS)[0]
+    item["created_at"] = (now - timedelta(days=day)).replace(
+        hour=hour, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0,
+    )
+    if item["created_at"] > now:
+        item["created_at"] -= timedelta(days=1)
+    return item
+
+
+@contextmanager
+def timed(results: dict, name: str):
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def seed_items(
+    Session, rows: int, days: int = 730, chunk_size: int = 50_000, seed: int = 42, realistic: bool = False,
+    tickets: int | None = None,
+):
+    """Insere ``rows`` itens espalhados pelos últimos ``days`` dias e reconstrói rollup e sketches.
+
+    Com ``realistic``, usa ``realistic_item``; senão, datas e lojas uniformes.
+    Com ``tickets``, os ``ticket_code`` são sorteados entre esse número de
+    códigos (tickets com vários descontos).
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    span = days * 86400
+    with Session() as db:
+        for offset in range(0, rows, chunk_size):
+            chunk = []
+            for _ in range(min(chunk_size, rows - offset)):
+                if realistic:
+                    item = realistic_item(rng, now, days)
+                else:
+                    item = fake_item(rng)
+                    item["created_at"] = now - timedelta(seconds=rng.randrange(span))
+                if tickets:
+                    item["ticket_code"] = f"TK{rng.randrange(tickets):012d}"
+                chunk.append(item)
+            db.execute(insert(models.ItemModel), dictionary.encode_rows(db, chunk))
+            db.commit()
+        rollup.rebuild(db)
+        sketches.rebuild(db)
@@ -0,0 +1,111 @@
+# bench_async_api.py
+"""Compara requisições/s e latência p99 dos endpoints de /items com sessão síncrona
+(threadpool do Starlette) e assíncrona (``DATABASE_ASYNC=true``).
+
+Cada modo sobe um uvicorn próprio com um worker; o gerador de carga mantém
+``--concurrency`` requisições em voo, alternando GET /items/{id} e uma página
+de GET /items/. Requer o extra ``async`` e o uvicorn.
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_async_api.py --rows 100000 --concurrency 64 [--url postgresql+psycopg2://...]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from _common import make_sessionmaker, seed_items
+
+
+def _start_server(url: str, mode: str, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": url,
+        "DATABASE_ASYNC": str(mode == "async").lower(),
+        "QUERY_CACHE_ENABLED": "false",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"uvicorn ({mode}) não respondeu em 30s")
+
+
+async def _load(port: int, rows: int, requests: int, concurrency: int, seed: int = 42) -> tuple[float, list[float], int]:
+    rng = random.Random(seed)
+    paths = [
+        f"/items/{rng.randint(1, rows)}" if i % 2 else f"/items/?limit=50&skip={rng.randint(0, 1000)}"
+        for i in range(requests)
+    ]
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        queue = iter(paths)
+
+        async def worker():
+            nonlocal errors
+            for path in queue:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    failed = response.status_code >= 500
+                except httpx.TransportError:
+                    failed = True
+                latencies.append(time.perf_counter() - start)
+                # Erros entram na latência; no modo síncrono incluem timeouts do pool de conexões
+                errors += failed
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    Session = make_sessionmaker(args.url)
+    seed_items(Session, args.rows)
+    url = Session.kw["bind"].url.render_as_string(hide_password=False)
+
+    print(f"{args.rows:,} linhas, {args.requests:,} requisições, concorrência {args.concurrency}")
+    for mode in ("sync", "async"):
+        server = _start_server(url, mode, args.port)
+        try:
+            # Aquecimento: conexões do pool e caches de compilação do SQLAlchemy
+            asyncio.run(_load(args.port, args.rows, args.concurrency * 4, args.concurrency))
+            elapsed, latencies, errors = asyncio.run(_load(args.port, args.rows, args.requests, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        p50 = statistics.median(latencies)
+        p99 = statistics.quantiles(latencies, n=100)[98]
+        print(
+            f"{mode:>6}: {args.requests / elapsed:>8.0f} req/s | "
+            f"p50 {p50 * 1000:>7.1f} ms | p99 {p99 * 1000:>7.1f} ms | erros {errors}"
+        )
+
+
+if __name__ == "__main__":
+    main()
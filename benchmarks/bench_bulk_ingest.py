@@ -0,0 +1,43 @@
+# bench_bulk_ingest.py
+"""Compara a vazão de ingestão item a item (``crud.create_item``) com o caminho em lote
+(``crud.create_items_bulk``).
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_bulk_ingest.py --rows 5000 [--url postgresql+psycopg2://...]
+"""
+import argparse
+import random
+
+from app import crud, schemas
+from _common import fake_item, make_sessionmaker, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    # Itens distintos por modo: repetidos seriam descartados como retentativas (app.dedup)
+    single_items = [schemas.ItemCreate(**fake_item(rng)) for _ in range(args.rows)]
+    bulk_items = [schemas.ItemCreate(**fake_item(rng)) for _ in range(args.rows)]
+    Session = make_sessionmaker(args.url)
+
+    timings = {}
+    with Session() as db, timed(timings, "single"):
+        for item in single_items:
+            crud.create_item(db, item)
+
+    with Session() as db, timed(timings, "bulk"):
+        for i in range(0, len(bulk_items), args.batch_size):
+            crud.create_items_bulk(db, bulk_items[i:i + args.batch_size])
+
+    for name, elapsed in timings.items():
+        print(f"{name:>6}: {args.rows / elapsed:>10,.0f} linhas/s ({elapsed:.2f}s)")
+    print(f"speedup: {timings['single'] / timings['bulk']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# bench_dictionary.py
+"""Compara ``items`` com rótulos em texto e codificada por dicionário (PostgreSQL).
+
+Cria duas tabelas de rascunho com as mesmas linhas (``app.datagen``): uma no
+layout antigo, com ``operation_type``, ``hostname`` e ``message`` em texto, e
+outra com ids ``smallint``/``integer`` das tabelas de dicionário, como em
+``models.ItemModel``. Mede o tamanho de tabela e índices e o tempo de
+varreduras que não podem usar só índices.
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_dictionary.py --url postgresql+psycopg2://... --rows 1000000
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime
+from io import BytesIO
+
+import pyarrow.csv as pacsv
+from sqlalchemy import create_engine, text
+
+from app.datagen import MESSAGES, OPERATION_TYPES, _encode, _hostnames, generate_chunk
+
+TEXT_COLUMNS = """
+    id BIGSERIAL PRIMARY KEY,
+    ticket_code VARCHAR(120) NOT NULL,
+    num_ped_ecf VARCHAR(60),
+    num_cupom BIGINT,
+    num_caixa INTEGER,
+    hostname VARCHAR(120),
+    vl_total FLOAT NOT NULL,
+    operation_type VARCHAR(120) NOT NULL,
+    success BOOLEAN NOT NULL,
+    message TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+"""
+DICT_COLUMNS = """
+    id BIGSERIAL PRIMARY KEY,
+    ticket_code VARCHAR(120) NOT NULL,
+    num_ped_ecf VARCHAR(60),
+    num_cupom BIGINT,
+    num_caixa INTEGER,
+    hostname_id SMALLINT REFERENCES bench_hostnames (id),
+    vl_total FLOAT NOT NULL,
+    operation_type_id SMALLINT NOT NULL REFERENCES bench_operation_types (id),
+    success BOOLEAN NOT NULL,
+    message_id INTEGER NOT NULL REFERENCES bench_messages (id),
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+"""
+DICTIONARIES = {
+    "operation_type": ("bench_operation_types", "SMALLSERIAL", OPERATION_TYPES),
+    "hostname": ("bench_hostnames", "SMALLSERIAL", None),
+    "message": ("bench_messages", "SERIAL", MESSAGES),
+}
+
+# Índices de items que envolvem as colunas codificadas, nos dois layouts
+TEXT_INDEXES = [
+    "hostname", "operation_type", "created_at, operation_type", "created_at, success, operation_type",
+    "num_caixa, created_at, operation_type", "hostname, created_at, operation_type",
+]
+DICT_INDEXES = [columns.replace("hostname", "hostname_id").replace("operation_type", "operation_type_id")
+                for columns in TEXT_INDEXES]
+
+# Mesma consulta nos dois layouts; no dicionário, filtros por id e rótulos por junção
+QUERIES = {
+    "kpi por tipo": (
+        "SELECT count(*), count(CASE WHEN operation_type = 'MANUAL_VALIDATION' THEN 1 END) "
+        "FROM bench_items_text WHERE success",
+        "SELECT count(*), count(CASE WHEN operation_type_id = :manual THEN 1 END) "
+        "FROM bench_items_dict WHERE success",
+    ),
+    "distribuição por hostname": (
+        "SELECT hostname, num_caixa, count(*), sum(vl_total) FROM bench_items_text "
+        "WHERE operation_type = 'AUTOMATIC_VALIDATION' GROUP BY 1, 2",
+        "SELECT hostname_id, num_caixa, count(*), sum(vl_total) FROM bench_items_dict "
+        "WHERE operation_type_id = :automatic GROUP BY 1, 2",
+    ),
+    "falhas por mensagem": (
+        "SELECT message, count(*) FROM bench_items_text WHERE NOT success GROUP BY 1",
+        "SELECT m.name, count(*) FROM bench_items_dict i JOIN bench_messages m ON m.id = i.message_id "
+        "WHERE NOT success GROUP BY 1",
+    ),
+    "linhas com rótulos": (
+        "SELECT ticket_code, hostname, operation_type, message FROM bench_items_text",
+        "SELECT i.ticket_code, h.name, o.name, m.name FROM bench_items_dict i "
+        "LEFT JOIN bench_hostnames h ON h.id = i.hostname_id "
+        "JOIN bench_operation_types o ON o.id = i.operation_type_id "
+        "JOIN bench_messages m ON m.id = i.message_id",
+    ),
+}
+
+
+def _create_tables(conn, hostnames: int):
+    conn.execute(text(
+        "DROP TABLE IF EXISTS bench_items_text, bench_items_dict, "
+        f"{', '.join(table for table, _, _ in DICTIONARIES.values())} CASCADE"
+    ))
+    ids = {}
+    for column, (table, serial, labels) in DICTIONARIES.items():
+        conn.execute(text(f"CREATE TABLE {table} (id {serial} PRIMARY KEY, name TEXT NOT NULL UNIQUE)"))
+        labels = labels or _hostnames(hostnames)
+        rows = conn.execute(
+            text(f"INSERT INTO {table} (name) SELECT unnest(CAST(:labels AS text[])) RETURNING name, id"),
+            {"labels": list(labels)},
+        )
+        ids[column] = dict(rows.all())
+    conn.execute(text(f"CREATE TABLE bench_items_text ({TEXT_COLUMNS})"))
+    conn.execute(text(f"CREATE TABLE bench_items_dict ({DICT_COLUMNS})"))
+    return ids
+
+
+def _load(engine, rows: int, options: dict, batch_size: int):
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for index, start in enumerate(range(0, rows, batch_size)):
+            table = generate_chunk(index, min(batch_size, rows - start), options)
+            for name, chunk in (("bench_items_text", table), ("bench_items_dict", _encode(table, options["ids"]))):
+                buffer = BytesIO()
+                pacsv.write_csv(chunk, buffer, pacsv.WriteOptions(include_header=False))
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {name} ({', '.join(chunk.column_names)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _sizes(conn, table: str, extra: tuple[str, ...] = ()) -> dict:
+    tables = (table, *extra)
+    return {
+        "tabela": sum(conn.execute(text("SELECT pg_table_size(:t)"), {"t": t}).scalar() for t in tables),
+        "índices": sum(conn.execute(text("SELECT pg_indexes_size(:t)"), {"t": t}).scalar() for t in tables),
+    }
+
+
+def _median_ms(conn, sql: str, params: dict, repeat: int) -> float:
+    conn.execute(text(sql), params).all()  # Aquecimento: páginas no shared_buffers
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(text(sql), params).all()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True, help="URL de um PostgreSQL de testes")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--hostnames", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="Não remove as tabelas ao final")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    with engine.begin() as conn:
+        ids = _create_tables(conn, args.hostnames)
+    options = {
+        "seed": 42, "days": 365, "end": datetime.now().replace(microsecond=0), "hostnames": args.hostnames,
+        "caixas": 32, "success_ratio": 0.95, "manual_ratio": 0.3, "hostname_skew": 1.1,
+        "business_hours": True, "growth": True, "ids": ids,
+    }
+    start = time.perf_counter()
+    _load(engine, args.rows, options, args.batch_size)
+    print(f"{args.rows:,} linhas carregadas nas duas tabelas em {time.perf_counter() - start:.1f}s")
+
+    with engine.begin() as conn:
+        for table, indexes in (("bench_items_text", TEXT_INDEXES), ("bench_items_dict", DICT_INDEXES)):
+            for number, columns in enumerate(indexes):
+                conn.execute(text(f"CREATE INDEX {table}_ix{number} ON {table} ({columns})"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in ("bench_items_text", "bench_items_dict", *(t for t, _, _ in DICTIONARIES.values())):
+            conn.exec_driver_sql(f"VACUUM ANALYZE {table}")
+
+    with engine.connect() as conn:
+        before = _sizes(conn, "bench_items_text")
+        after = _sizes(conn, "bench_items_dict", tuple(table for table, _, _ in DICTIONARIES.values()))
+        print(f"\n{'tamanho':>28} {'texto':>12} {'dicionário':>12} {'redução':>8}")
+        for name in before:
+            reduction = 1 - after[name] / before[name]
+            print(f"{name:>28} {before[name] / 2**20:>10.1f}MB {after[name] / 2**20:>10.1f}MB {reduction:>8.0%}")
+
+        params = {
+            "manual": ids["operation_type"]["MANUAL_VALIDATION"],
+            "automatic": ids["operation_type"]["AUTOMATIC_VALIDATION"],
+        }
+        print(f"\n{'consulta':>28} {'texto':>12} {'dicionário':>12} {'ganho':>8}")
+        for name, (text_sql, dict_sql) in QUERIES.items():
+            text_ms = _median_ms(conn, text_sql, {}, args.repeat)
+            dict_ms = _median_ms(conn, dict_sql, params, args.repeat)
+            print(f"{name:>28} {text_ms:>10.1f}ms {dict_ms:>10.1f}ms {text_ms / dict_ms:>7.2f}x")
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "DROP TABLE IF EXISTS bench_items_text, bench_items_dict, "
+                f"{', '.join(table for table, _, _ in DICTIONARIES.values())} CASCADE"
+            ))
+
+
+if __name__ == "__main__":
+    main()
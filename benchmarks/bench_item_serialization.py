@@ -0,0 +1,120 @@
+# bench_item_serialization.py
+"""Compara a latência por página de 10 mil linhas de GET /items/ antes e depois
+da projeção de colunas com orjson.
+
+- antes: entidades ORM validadas por ``List[schemas.Item]`` (``response_model``)
+  e codificadas pelo ``JSONResponse`` padrão, como o FastAPI faz;
+- depois: tuplas de ``crud.get_items`` com todos os campos e com ``--fields``,
+  codificadas com ``ORJSONResponse`` (como ``app.main._items_response``).
+
+As páginas são percorridas pelo cursor; o tempo é dividido entre a consulta e a
+montagem do corpo da resposta.
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_item_serialization.py --rows 100000 [--fields id,ticket_code,vl_total] [--url postgresql+psycopg2://...]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from sqlalchemy import and_, or_, select
+
+from app import crud, models, schemas
+from _common import make_sessionmaker, seed_items
+
+PAGE_SIZE = 10_000
+
+
+def _legacy_route() -> APIRoute:
+    def read_items():
+        pass
+
+    return APIRoute("/items/", read_items, response_model=List[schemas.Item])
+
+
+def legacy_page(db, after, route: APIRoute):
+    """Consulta e resposta de GET /items/ antes da projeção."""
+    item = models.ItemModel
+    stmt = select(item).order_by(item.created_at, item.id).limit(PAGE_SIZE)
+    if after is not None:
+        created_at, item_id = after
+        stmt = stmt.where(
+            item.created_at >= created_at,
+            or_(item.created_at > created_at, and_(item.created_at == created_at, item.id > item_id)),
+        )
+    start = time.perf_counter()
+    items = db.scalars(stmt).all()
+    queried = time.perf_counter()
+    content = asyncio.run(serialize_response(field=route.response_field, response_content=items))
+    body = JSONResponse(content).body
+    return items, queried - start, time.perf_counter() - queried, len(body)
+
+
+def projected_page(db, after, fields: tuple[str, ...]):
+    start = time.perf_counter()
+    rows = crud.get_items(db, limit=PAGE_SIZE, after=after, fields=fields)
+    queried = time.perf_counter()
+    body = ORJSONResponse([dict(zip(fields, row)) for row in rows]).body
+    return rows, queried - start, time.perf_counter() - queried, len(body)
+
+
+def _walk(Session, page) -> list[tuple[float, float, int]]:
+    """Percorre a tabela inteira em páginas; devolve (consulta, serialização, bytes) de cada uma."""
+    timings = []
+    after = None
+    with Session() as db:
+        while True:
+            rows, query_s, serialize_s, size = page(db, after)
+            if rows:
+                timings.append((query_s, serialize_s, size))
+            # A última página, parcial, também entra na medida
+            if len(rows) < PAGE_SIZE:
+                break
+            last = rows[-1]
+            after = (last.created_at, last.id)
+            # Entidades carregadas não se acumulam no identity map entre as páginas
+            db.expunge_all()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--fields", default="id,ticket_code,vl_total", help="Projeção medida além de todos os campos")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    Session = make_sessionmaker(args.url)
+    seed_items(Session, args.rows)
+    route = _legacy_route()
+    fields = crud.parse_fields(args.fields)
+    variants = {
+        "antes (ORM + pydantic)": lambda db, after: legacy_page(db, after, route),
+        "orjson, todos os campos": lambda db, after: projected_page(db, after, schemas.ITEM_FIELDS),
+        f"orjson, fields={','.join(fields)}": lambda db, after: projected_page(db, after, fields),
+    }
+
+    print(f"{args.rows:,} linhas, páginas de {PAGE_SIZE:,}")
+    print(f"{'':>40} {'consulta':>10} {'serialização':>13} {'total':>10} {'corpo':>9} {'ganho':>6}")
+    baseline = None
+    for name, page in variants.items():
+        _walk(Session, page)  # Aquecimento
+        timings = [timing for _ in range(args.repeat) for timing in _walk(Session, page)]
+        if not timings:
+            print(f"{name:>40} sem páginas medidas")
+            continue
+        query_ms = statistics.median(t[0] for t in timings) * 1000
+        serialize_ms = statistics.median(t[1] for t in timings) * 1000
+        total_ms = statistics.median(t[0] + t[1] for t in timings) * 1000
+        baseline = baseline or total_ms
+        print(f"{name:>40} {query_ms:>8.1f}ms {serialize_ms:>11.1f}ms {total_ms:>8.1f}ms "
+              f"{timings[0][2] / 2**20:>6.2f}MB  {baseline / total_ms:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_kpi.py
+"""Compara ``get_kpi_data`` em passada única com a versão anterior de quatro COUNTs
+com EXTRACT.
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_kpi.py --rows 10000000 [--url postgresql+psycopg2://...]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime
+
+from sqlalchemy import func
+
+from app import dictionary, models, repository
+from _common import make_sessionmaker, seed_items
+
+
+def legacy_kpi(db, start_date, end_date, operation_types):
+    """Implementação anterior: quatro COUNTs com EXTRACT sobre a mesma consulta base."""
+    current_year = datetime.now().year
+    current_month = datetime.now().month
+    item = models.ItemModel
+    operation_type_ids = dictionary.operation_types.ids
+    base_query = db.query(item).filter(
+        item.created_at.between(start_date, end_date),
+        item.operation_type_id.in_(operation_type_ids(db, operation_types)),
+        item.success == True,
+    )
+    year = func.extract('year', item.created_at) == current_year
+    return {
+        "desconto_ano": base_query.filter(year).with_entities(func.count()).scalar(),
+        "desconto_mes_atual": base_query.filter(
+            year, func.extract('month', item.created_at) == current_month
+        ).with_entities(func.count()).scalar(),
+        "validacao_manual": base_query.filter(
+            year, item.operation_type_id.in_(operation_type_ids(db, ['MANUAL_VALIDATION']))
+        ).with_entities(func.count()).scalar(),
+        "validacao_automatica": base_query.filter(
+            year, item.operation_type_id.in_(operation_type_ids(db, ['AUTOMATIC_VALIDATION']))
+        ).with_entities(func.count()).scalar(),
+    }
+
+
+def _measure(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    Session = make_sessionmaker(args.url)
+    seed_items(Session, args.rows)
+
+    today = datetime.now()
+    start_date = datetime(today.year, 1, 1)
+    end_date = datetime.combine(today.date(), datetime.max.time())
+    operation_types = ("AUTOMATIC_VALIDATION", "MANUAL_VALIDATION")
+
+    with Session() as db:
+        legacy = legacy_kpi(db, start_date, end_date, operation_types)
+        single = repository._kpi_from_items(db, start_date, end_date, operation_types)
+        assert legacy == single, (legacy, single)
+
+        timings = {
+            "quatro COUNTs (EXTRACT)": _measure(
+                lambda: legacy_kpi(db, start_date, end_date, operation_types), args.repeat),
+            "passada única (items)": _measure(
+                lambda: repository._kpi_from_items(db, start_date, end_date, operation_types), args.repeat),
+            "passada única (rollup)": _measure(
+                lambda: repository.get_kpi_data(db, start_date, end_date, operation_types), args.repeat),
+        }
+
+    print(f"{args.rows:,} linhas")
+    for name, elapsed in timings.items():
+        print(f"{name:>24}: {elapsed * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# bench_partitioning.py
+"""Compara ingestão e consultas em ``items`` sem partição e particionada por mês
+(PostgreSQL).
+
+Cria duas tabelas de rascunho no banco indicado, com as mesmas colunas e
+índices de ``items``, carrega as mesmas linhas nas duas e mede o tempo de
+ingestão e de consultas por intervalo de datas.
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_partitioning.py --url postgresql+psycopg2://... --rows 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from _common import fake_item
+
+COLUMNS = """
+    id BIGSERIAL,
+    ticket_code VARCHAR(120) NOT NULL,
+    num_ped_ecf VARCHAR(60),
+    num_cupom BIGINT,
+    num_caixa INTEGER,
+    hostname VARCHAR(120),
+    vl_total FLOAT NOT NULL,
+    operation_type VARCHAR(120) NOT NULL,
+    success BOOLEAN NOT NULL,
+    message TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+"""
+
+INDEXES = [
+    "ticket_code", "num_ped_ecf", "num_cupom", "num_caixa", "hostname", "vl_total", "operation_type",
+    "created_at", "created_at, operation_type", "created_at, success, operation_type",
+    "num_caixa, created_at, operation_type", "hostname, created_at, operation_type",
+    "DATE(created_at)", "vl_total, created_at", "ticket_code, created_at",
+]
+
+QUERIES = {
+    "contagem do último mês": (
+        "SELECT count(*) FROM {table} WHERE created_at >= :month_start AND created_at < :month_end"
+    ),
+    "contagem diária do último mês": (
+        "SELECT DATE(created_at), success, count(*) FROM {table} "
+        "WHERE created_at >= :month_start AND created_at < :month_end GROUP BY 1, 2"
+    ),
+    "kpi do ano": (
+        "SELECT count(*), count(CASE WHEN operation_type = 'MANUAL_VALIDATION' THEN 1 END) "
+        "FROM {table} WHERE created_at >= :year_start AND success"
+    ),
+}
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_tables(conn, days: int):
+    conn.execute(text("DROP TABLE IF EXISTS bench_items_plain, bench_items_part CASCADE"))
+    conn.execute(text(f"CREATE TABLE bench_items_plain ({COLUMNS}, PRIMARY KEY (id))"))
+    conn.execute(text(
+        f"CREATE TABLE bench_items_part ({COLUMNS}, PRIMARY KEY (id, created_at)) "
+        "PARTITION BY RANGE (created_at)"
+    ))
+    today = date.today()
+    month = (today - timedelta(days=days)).replace(day=1)
+    while month <= today:
+        upper = _add_months(month, 1)
+        conn.execute(text(
+            f"CREATE TABLE bench_items_part_p{month:%Y_%m} PARTITION OF bench_items_part "
+            f"FOR VALUES FROM ('{month}') TO ('{upper}')"
+        ))
+        month = upper
+    for table in ("bench_items_plain", "bench_items_part"):
+        for number, columns in enumerate(INDEXES):
+            conn.execute(text(f"CREATE INDEX {table}_ix{number} ON {table} ({columns})"))
+
+
+def _rows(count: int, days: int, seed: int = 42):
+    rng = random.Random(seed)
+    now = datetime.now()
+    span = days * 86400
+    rows = []
+    for _ in range(count):
+        item = fake_item(rng)
+        item["created_at"] = now - timedelta(seconds=rng.randrange(span))
+        rows.append(item)
+    return rows
+
+
+def _insert(engine, table: str, rows: list[dict], batch_size: int) -> float:
+    stmt = text(
+        f"INSERT INTO {table} (ticket_code, num_ped_ecf, num_cupom, num_caixa, hostname, vl_total, "
+        "operation_type, success, message, created_at) VALUES (:ticket_code, :num_ped_ecf, :num_cupom, "
+        ":num_caixa, :hostname, :vl_total, :operation_type, :success, :message, :created_at)"
+    )
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        with engine.begin() as conn:
+            conn.execute(stmt, rows[i:i + batch_size])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True, help="URL de um PostgreSQL de testes")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url, insertmanyvalues_page_size=args.batch_size)
+    with engine.begin() as conn:
+        _create_tables(conn, args.days)
+
+    rows = _rows(args.rows, args.days)
+    today = date.today()
+    params = {
+        "month_start": _add_months(today.replace(day=1), -1),
+        "month_end": today.replace(day=1),
+        "year_start": today.replace(month=1, day=1),
+    }
+
+    print(f"{args.rows:,} linhas, {args.days} dias")
+    for table in ("bench_items_plain", "bench_items_part"):
+        elapsed = _insert(engine, table, rows, args.batch_size)
+        with engine.begin() as conn:
+            conn.execute(text(f"ANALYZE {table}"))
+        print(f"\n{table}\n  ingestão: {args.rows / elapsed:>10,.0f} linhas/s")
+        with engine.connect() as conn:
+            for name, sql in QUERIES.items():
+                samples = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    conn.execute(text(sql.format(table=table)), params).all()
+                    samples.append(time.perf_counter() - start)
+                print(f"  {name:>30}: {statistics.median(samples) * 1000:>9.1f} ms")
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_items_plain, bench_items_part CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench_search.py
+"""Compara a busca por ``search_term`` com índice (``app.search``) com o ilike
+'%termo%' anterior em ticket_code, num_cupom e num_caixa.
+
+O schema vem das migrações: no PostgreSQL, os índices GIN de trigramas de
+d7a3b5c9e1f2 e b6d8f0a2c4e7 (requer a extensão pg_trgm).
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_search.py --rows 10000000 [--url postgresql+psycopg2://...]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime
+
+from sqlalchemy import String, func, or_, text
+
+from app import dictionary, models, repository
+from _common import OPERATION_TYPES, make_sessionmaker, seed_items
+
+
+def legacy_count(db, start_date, end_date, operation_types, search_term):
+    """Implementação anterior: ilike em ticket_code e nas colunas numéricas convertidas para texto."""
+    item = models.ItemModel
+    return (
+        db.query(func.count(item.id))
+        .filter(
+            item.created_at.between(start_date, end_date),
+            item.operation_type_id.in_(dictionary.operation_types.ids(db, operation_types)),
+            or_(
+                item.ticket_code.ilike(f"%{search_term}%"),
+                item.num_cupom.cast(String).ilike(f"%{search_term}%"),
+                item.num_caixa.cast(String).ilike(f"%{search_term}%"),
+            ),
+        )
+        .scalar()
+    )
+
+
+def _measure(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    Session = make_sessionmaker(args.url)
+    seed_items(Session, args.rows)
+
+    with Session() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("ANALYZE items"))
+            db.commit()
+
+        ticket_code, num_cupom = db.query(models.ItemModel.ticket_code, models.ItemModel.num_cupom).first()
+        terms = {
+            "trecho de ticket_code": ticket_code[9:18],
+            "num_cupom": str(num_cupom),
+        }
+        start_date, end_date = datetime(2000, 1, 1), datetime.now()
+
+        print(f"{args.rows:,} linhas")
+        for name, term in terms.items():
+            legacy = _measure(
+                lambda term=term: legacy_count(db, start_date, end_date, OPERATION_TYPES, term), args.repeat
+            )
+            indexed = _measure(
+                lambda term=term: repository.count_items_by_date(db, start_date, end_date, OPERATION_TYPES, term),
+                args.repeat,
+            )
+            print(f"{name:>22} ({term!r}): ilike {legacy * 1000:>9.1f} ms | índice {indexed * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
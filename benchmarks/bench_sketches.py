@@ -0,0 +1,171 @@
+# bench_sketches.py
+"""Precisão e tempo dos sketches diários (``app.sketches``) contra as consultas exatas.
+
+Para as janelas dos últimos 30 e 365 dias compara, por caixa (hostname e
+num_caixa) e por dia:
+
+- tickets distintos: ``COUNT(DISTINCT ticket_code)`` contra o HyperLogLog;
+- p50/p95/p99 de ``vl_total``: ``percentile_cont`` no PostgreSQL (no SQLite, os
+  valores lidos e ordenados no pandas) contra o t-digest.
+
+Imprime o erro relativo (mediana, p95 e máximo entre os grupos) e a mediana de
+tempo de cada lado. Termina com código 1 se o erro mediano passar de
+``--max-error`` por cento.
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_sketches.py --rows 1000000 [--tickets 300000] [--url postgresql+psycopg2://...]
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select, text
+
+from app import dictionary, models, repository
+from _common import OPERATION_TYPES, make_sessionmaker, seed_items
+
+WINDOWS = {"30d": 30, "365d": 365}
+STATS = ["Tickets Distintos", "P50", "P95", "P99"]
+
+# percentile_cont tem a mesma interpolação linear de sketches._quantiles
+EXACT_SQL = """
+    SELECT {keys},
+           COUNT(DISTINCT i.ticket_code),
+           percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY i.vl_total)
+    FROM items i LEFT JOIN hostnames h ON h.id = i.hostname_id
+    WHERE i.created_at BETWEEN :start AND :end AND i.operation_type_id = ANY(:operation_types)
+    GROUP BY {keys}
+"""
+KEYS = {"caixa": ("h.name", "i.num_caixa"), "dia": ("CAST(i.created_at AS date)",)}
+COLUMNS = {"caixa": ["Hostname", "Num Caixa"], "dia": ["Data"]}
+
+
+def _exact_postgresql(db, by: str, start_date, end_date, operation_types) -> pd.DataFrame:
+    sql = EXACT_SQL.format(keys=", ".join(KEYS[by]))
+    rows = db.execute(text(sql), {
+        "start": start_date, "end": end_date,
+        "operation_types": dictionary.operation_types.ids(db, operation_types),
+    }).all()
+    return pd.DataFrame(
+        [(*row[:-2], row[-2], *row[-1]) for row in rows], columns=[*COLUMNS[by], *STATS]
+    )
+
+
+def _exact_pandas(db, by: str, start_date, end_date, operation_types) -> pd.DataFrame:
+    item = models.ItemModel
+    stmt = dictionary.with_labels(
+        select(dictionary.hostnames.label, item.num_caixa, item.created_at, item.ticket_code, item.vl_total),
+        dictionary.hostnames,
+    ).where(
+        item.created_at.between(start_date, end_date),
+        item.operation_type_id.in_(dictionary.operation_types.ids(db, operation_types)),
+    )
+    frame = pd.DataFrame(
+        db.execute(stmt).all(), columns=["Hostname", "Num Caixa", "created_at", "ticket_code", "vl_total"]
+    )
+    frame["Data"] = pd.to_datetime(frame["created_at"]).dt.date
+    grouped = frame.groupby(COLUMNS[by], dropna=False)
+    result = grouped["ticket_code"].nunique().rename("Tickets Distintos").to_frame()
+    for name, q in (("P50", 0.5), ("P95", 0.95), ("P99", 0.99)):
+        result[name] = grouped["vl_total"].quantile(q)
+    return result.reset_index()
+
+
+def exact_stats(db, by: str, start_date, end_date, operation_types) -> pd.DataFrame:
+    if db.get_bind().dialect.name == "postgresql":
+        return _exact_postgresql(db, by, start_date, end_date, operation_types)
+    return _exact_pandas(db, by, start_date, end_date, operation_types)
+
+
+def sketch_stats(db, by: str, start_date, end_date, operation_types) -> pd.DataFrame:
+    if by == "caixa":
+        return repository.get_hostname_caixa_sketch_stats(db, start_date, end_date, operation_types)
+    return repository.get_daily_sketch_stats(db, start_date, end_date, operation_types)
+
+
+def relative_errors(exact: pd.DataFrame, estimated: pd.DataFrame, by: str) -> dict:
+    """Erro relativo absoluto de cada estatística, grupo a grupo."""
+    keys = COLUMNS[by]
+    exact, estimated = exact.copy(), estimated.copy()
+    for frame in (exact, estimated):
+        if "Num Caixa" in keys:
+            frame["Num Caixa"] = frame["Num Caixa"].astype("Int64")
+        # Chaves nulas casam entre si
+        frame[keys] = frame[keys].astype(object).where(frame[keys].notna(), "<nulo>").astype(str)
+    joined = exact.merge(estimated, on=keys, how="outer", suffixes=("_exato", "_sketch"), indicator=True)
+    missing = int((joined["_merge"] != "both").sum())
+    if missing:
+        raise AssertionError(f"{missing} grupos presentes só de um lado")
+    return {
+        stat: np.abs(joined[f"{stat}_sketch"].astype(float) / joined[f"{stat}_exato"].astype(float) - 1).to_numpy()
+        for stat in STATS
+    }
+
+
+def _median_ms(fn, repeat: int) -> float:
+    fn()  # Aquecimento
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--tickets", type=int, default=None, help="Tickets distintos (padrão: rows / 3)")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-error", type=float, default=2.0, help="Erro mediano máximo, em %%")
+    parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    Session = make_sessionmaker(args.url)
+    start = time.perf_counter()
+    seed_items(Session, args.rows, days=args.days, realistic=True, tickets=args.tickets or max(args.rows // 3, 1))
+    print(f"{args.rows:,} linhas semeadas (com sketches) em {time.perf_counter() - start:.1f}s")
+
+    now = datetime.now()
+    end_date = datetime.combine(now.date(), datetime.max.time())
+    failed = False
+    with Session() as db:
+        sketch = models.ItemDailySketchModel
+        count, size = db.execute(
+            select(func.count(), func.sum(func.length(sketch.tickets) + func.length(sketch.vl_total)))
+        ).one()
+        print(f"items_daily_sketches: {count:,} linhas, {(size or 0) / 2**20:.1f}MB de sketches\n")
+
+        print(f"{'consulta':>12} {'estatística':>18} {'mediana':>8} {'p95':>8} {'máximo':>8}")
+        timings = []
+        for window, days in WINDOWS.items():
+            start_date = datetime.combine(now.date() - timedelta(days=days), datetime.min.time())
+            for by in COLUMNS:
+                filters = (start_date, end_date, OPERATION_TYPES)
+                errors = relative_errors(exact_stats(db, by, *filters), sketch_stats(db, by, *filters), by)
+                for stat, values in errors.items():
+                    median = float(np.median(values)) * 100
+                    failed |= median > args.max_error
+                    print(f"{by + '.' + window:>12} {stat:>18} {median:>7.2f}% "
+                          f"{np.percentile(values, 95) * 100:>7.2f}% {values.max() * 100:>7.2f}%")
+                timings.append((
+                    f"{by}.{window}",
+                    _median_ms(lambda by=by, filters=filters: exact_stats(db, by, *filters), args.repeat),
+                    _median_ms(lambda by=by, filters=filters: sketch_stats(db, by, *filters), args.repeat),
+                ))
+
+    print(f"\n{'consulta':>12} {'exata':>12} {'sketches':>12} {'ganho':>8}")
+    for name, exact_ms, sketch_ms in timings:
+        print(f"{name:>12} {exact_ms:>10.1f}ms {sketch_ms:>10.1f}ms {exact_ms / sketch_ms:>7.2f}x")
+    if failed:
+        print(f"\nErro mediano acima de {args.max_error}%", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
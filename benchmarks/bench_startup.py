@@ -0,0 +1,105 @@
+# bench_startup.py
+"""Mede a subida da API: importação de ``app.main`` e o lifespan (schema e
+gravação em lote), cada amostra em um processo novo.
+
+Compara os modos de ``SCHEMA_STARTUP`` (``create_all`` equivale à subida
+anterior, que rodava o ``create_all`` ao importar) e lista os módulos pesados
+(pandas, numpy, pyarrow, ``app.repository``...) carregados ao fim da subida, que
+devem ficar para a primeira consulta. Termina com código 1 se a importação
+mediana passar de ``--max-import-ms``. ``suite.py run`` inclui as mesmas
+medidas (modo ``check``) para o ``compare``.
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_startup.py [--repeat 10] [--max-import-ms 600] [--url postgresql+psycopg2://...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from _common import make_sessionmaker
+
+MODES = ("create_all", "check", "off")
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "alembic", "app.repository", "app.sketches", "app.frames")
+
+# Roda em um interpretador novo: nada importado antes de app.main
+_PROBE = f"""
+import asyncio, json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+
+async def startup():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        return time.perf_counter()
+
+
+ready = asyncio.run(startup())
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "lifespan_ms": (ready - imported) * 1000,
+    "heavy": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def probe(url: str, mode: str) -> dict:
+    """Sobe a API uma vez em um processo novo; devolve os tempos em ms."""
+    env = {**os.environ, "DATABASE_URL": url, "SCHEMA_STARTUP": mode}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", _PROBE], env=env, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode:
+        raise RuntimeError(f"Subida com SCHEMA_STARTUP={mode} falhou:\n{result.stderr}")
+    return {**json.loads(result.stdout.splitlines()[-1]), "process_ms": elapsed}
+
+
+def _summary(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "samples": len(samples),
+    }
+
+
+def startup_latency(url: str, repeat: int, mode: str = "check") -> dict:
+    """Medidas ``startup.*`` no formato de ``suite.py``."""
+    probe(url, mode)  # Aquecimento: bytecode e cache de páginas do sistema
+    runs = [probe(url, mode) for _ in range(repeat)]
+    return {
+        f"startup.{name}": _summary([run[f"{name}_ms"] for run in runs])
+        for name in ("import", "lifespan", "process")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float, default=None, help="Importação mediana máxima de app.main")
+    parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    Session = make_sessionmaker(args.url)
+    url = Session.kw["bind"].url.render_as_string(hide_password=False)
+
+    print(f"{'SCHEMA_STARTUP':>14} {'import':>10} {'lifespan':>10} {'processo':>10}  módulos pesados")
+    failed = False
+    for mode in MODES:
+        results = startup_latency(url, args.repeat, mode)
+        import_ms, lifespan_ms, process_ms = (results[f"startup.{name}"]["median_ms"] for name in ("import", "lifespan", "process"))
+        heavy = probe(url, mode)["heavy"]
+        failed |= args.max_import_ms is not None and import_ms > args.max_import_ms
+        print(f"{mode:>14} {import_ms:>8.1f}ms {lifespan_ms:>8.1f}ms {process_ms:>8.1f}ms  {', '.join(heavy) or '-'}")
+    if failed:
+        print(f"\nImportação de app.main acima de {args.max_import_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
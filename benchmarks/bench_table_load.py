@@ -0,0 +1,98 @@
+# bench_table_load.py
+"""Compara a carga da tabela analítica em DataFrame (``repository.get_items_frame``)
+com a versão anterior de ``fetch_table_data``: lista de Rows e dois ``apply``.
+
+Tempo e memória são medidos em processos novos e separados. O pico de memória
+é o do ``tracemalloc`` (objetos Python e arrays do numpy) somado ao pico do
+pool de memória do Arrow, que o ``tracemalloc`` não enxerga. Os dois picos
+podem não coincidir: a soma é um limite superior.
+
+Uso:
+    PYTHONPATH=src python benchmarks/bench_table_load.py --rows 1000000 [--url postgresql+psycopg2://...]
+"""
+import argparse
+import multiprocessing
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import repository
+from _common import OPERATION_TYPES, make_sessionmaker, seed_items
+
+MANUAL_VALIDATION = "MANUAL_VALIDATION"
+
+
+def legacy_frame(db, start_date, end_date, operation_types):
+    """Implementação anterior do dashboard."""
+    items = repository._apply_filters_and_sorting(
+        repository.table_query(db), start_date, end_date, operation_types,
+    ).all()
+    df = pd.DataFrame(items, columns=[
+        "Ticket Code", "Num Cupom", "Num Caixa", "Hostname", "Num Ped ECF", "Valor Total",
+        "Validação Manual", "Status", "Criado em"
+    ])
+    df['Validação Manual'] = df['Validação Manual'].apply(lambda x: "Sim" if x == MANUAL_VALIDATION else "Não")
+    df['Status'] = df['Status'].apply(lambda x: "Sucesso" if x else "Falha")
+    return df
+
+
+def _load(url: str, loader: str, trace: bool = False) -> tuple[float, int, int]:
+    """Executa uma carga; devolve (segundos, bytes de pico, linhas).
+
+    O pico só é medido com ``trace``, que deixa a carga mais lenta.
+    """
+    # O cache de consultas está desligado pelo _common
+    fn = legacy_frame if loader == "legacy" else repository.get_items_frame
+    engine = create_engine(url)
+    with Session(engine) as db:
+        db.connection()
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        frame = fn(db, datetime(2000, 1, 1), datetime.now(), OPERATION_TYPES)
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            if "pyarrow" in sys.modules:
+                # Processo novo: tudo o que o pool do Arrow alocou foi nesta carga
+                peak += sys.modules["pyarrow"].default_memory_pool().max_memory() or 0
+    return elapsed, peak, len(frame)
+
+
+def _in_new_process(context, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_load, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    Session_ = make_sessionmaker(args.url)
+    seed_items(Session_, args.rows)
+    url = Session_.kw["bind"].url.render_as_string(hide_password=False)
+
+    print(f"{args.rows:,} linhas")
+    context = multiprocessing.get_context("spawn")
+    for loader in ("legacy", "arrow"):
+        runs = [_in_new_process(context, url, loader) for _ in range(args.repeat)]
+        traced = [_in_new_process(context, url, loader, True) for _ in range(args.repeat)]
+        elapsed = statistics.median(run[0] for run in runs)
+        peak = statistics.median(run[1] for run in traced)
+        print(f"{loader:>7}: {elapsed * 1000:>9.1f} ms | pico de memória {peak / 2**20:>8.1f} MiB | {runs[0][2]:,} linhas")
+
+
+if __name__ == "__main__":
+    main()
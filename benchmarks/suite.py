@@ -0,0 +1,237 @@
+# suite.py
+"""Suíte de benchmarks de ingestão e das consultas do repositório, com saída em JSON.
+
+``run`` popula o banco com ``--rows`` itens de distribuição realista (ver
+``_common.realistic_item``) e mede:
+
+- ``ingest.create_item`` / ``ingest.create_items_bulk``: linhas/s sobre a tabela
+  já populada; os itens inseridos são removidos ao final.
+- ``query.<função>.<janela>``: latência (mediana, p95, mínimo) de cada função
+  do repositório para as janelas dos últimos 30 e 365 dias, sem o cache.
+- ``startup.import`` / ``startup.lifespan`` / ``startup.process``: subida da API
+  em processos novos (ver ``bench_startup.py``).
+
+``compare`` confronta dois resultados e termina com código 1 se alguma medida
+piorou além de ``--tolerance`` por cento.
+
+Uso:
+    PYTHONPATH=src python benchmarks/suite.py run --rows 1000000 --output base.json [--url postgresql+psycopg2://...]
+    PYTHONPATH=src python benchmarks/suite.py run --rows 1000000 --url ... --no-seed --output novo.json
+    PYTHONPATH=src python benchmarks/suite.py compare base.json novo.json [--tolerance 10]
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import sqlalchemy
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, repository, rollup, schemas, sketches
+from _common import OPERATION_TYPES, fake_item, make_sessionmaker, seed_items
+from bench_startup import startup_latency
+
+WINDOWS = {"30d": 30, "365d": 365}
+QUERIES = {
+    "get_kpi_data": repository.get_kpi_data,
+    "get_daily_counts": repository.get_daily_counts,
+    "get_hostname_caixa_distribution": repository.get_hostname_caixa_distribution,
+    "get_hostname_caixa_sketch_stats": repository.get_hostname_caixa_sketch_stats,
+    "get_daily_sketch_stats": repository.get_daily_sketch_stats,
+    "get_items_by_date": repository.get_items_by_date,
+    "count_items_by_date": repository.count_items_by_date,
+}
+# Sentido de melhora de cada medida usada no compare
+METRICS = {"median_ms": "lower", "rows_per_s": "higher"}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _vacuum(bind):
+    """No PostgreSQL, limpa tuplas mortas e atualiza estatísticas antes de medir."""
+    if bind.dialect.name != "postgresql":
+        return
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM ANALYZE items")
+        conn.exec_driver_sql("VACUUM ANALYZE items_daily_rollup")
+        conn.exec_driver_sql("VACUUM ANALYZE items_daily_sketches")
+
+
+def _latency(fn, repeat: int) -> dict:
+    fn()  # Aquecimento: cache de compilação do SQLAlchemy e páginas do banco
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "samples": len(samples),
+    }
+
+
+def _throughput(rows: int, elapsed: float) -> dict:
+    return {"rows_per_s": round(rows / elapsed, 1), "rows": rows, "seconds": round(elapsed, 3)}
+
+
+def bench_ingest(Session, single_rows: int, bulk_rows: int, batch_size: int) -> dict:
+    rng = random.Random(7)
+    single = [schemas.ItemCreate(**fake_item(rng)) for _ in range(single_rows)]
+    bulk = [schemas.ItemCreate(**fake_item(rng)) for _ in range(bulk_rows)]
+    results = {}
+    with Session() as db:
+        last_id = db.scalar(select(func.max(models.ItemModel.id))) or 0
+        try:
+            start = time.perf_counter()
+            for item in single:
+                crud.create_item(db, item)
+            results["ingest.create_item"] = _throughput(single_rows, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for i in range(0, bulk_rows, batch_size):
+                crud.create_items_bulk(db, bulk[i:i + batch_size])
+            results["ingest.create_items_bulk"] = _throughput(bulk_rows, time.perf_counter() - start)
+        finally:
+            # Devolve a tabela ao estado semeado para que rodadas com --no-seed sejam comparáveis
+            db.rollback()
+            db.execute(delete(models.ItemModel).where(models.ItemModel.id > last_id))
+            db.commit()
+            today = datetime.now().date()
+            rollup.rebuild(db, today - timedelta(days=1), today)
+            sketches.rebuild(db, today - timedelta(days=1), today)
+    _vacuum(Session.kw["bind"])
+    return results
+
+
+def bench_queries(Session, repeat: int) -> dict:
+    now = datetime.now()
+    end_date = datetime.combine(now.date(), datetime.max.time())
+    results = {}
+    with Session() as db:
+        for window, days in WINDOWS.items():
+            start_date = datetime.combine(now.date() - timedelta(days=days), datetime.min.time())
+            for name, fn in QUERIES.items():
+                results[f"query.{name}.{window}"] = _latency(
+                    lambda fn=fn, start_date=start_date: fn(db, start_date, end_date, OPERATION_TYPES), repeat,
+                )
+                print(f"{name}.{window}: {results[f'query.{name}.{window}']['median_ms']:.1f} ms", file=sys.stderr)
+    return results
+
+
+def run(args):
+    if args.no_seed:
+        if args.url is None:
+            sys.exit("--no-seed exige --url")
+        Session = sessionmaker(bind=create_engine(args.url), autoflush=False, expire_on_commit=False)
+    else:
+        Session = make_sessionmaker(args.url)
+        start = time.perf_counter()
+        seed_items(Session, args.rows, realistic=True)
+        print(f"{args.rows:,} linhas semeadas em {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    bind = Session.kw["bind"]
+    _vacuum(bind)
+    with Session() as db:
+        rows = db.scalar(select(func.count()).select_from(models.ItemModel))
+
+    results = bench_queries(Session, args.repeat)
+    if not args.skip_ingest:
+        results.update(bench_ingest(Session, args.single_rows, args.bulk_rows, args.batch_size))
+    if not args.skip_startup:
+        results.update(startup_latency(bind.url.render_as_string(hide_password=False), args.repeat))
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "database": bind.dialect.name,
+            "server_version": ".".join(map(str, bind.dialect.server_version_info or ())),
+            "rows": rows,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+def compare(args) -> int:
+    base = json.loads(Path(args.base).read_text())
+    new = json.loads(Path(args.new).read_text())
+    if (base["meta"]["database"], base["meta"]["rows"]) != (new["meta"]["database"], new["meta"]["rows"]):
+        print(
+            f"Atenção: bases diferentes ({base['meta']['database']}, {base['meta']['rows']:,} linhas"
+            f" x {new['meta']['database']}, {new['meta']['rows']:,} linhas)"
+        )
+    regressions = 0
+    for name, result in new["results"].items():
+        if name not in base["results"]:
+            print(f"{name:>50}: nova")
+            continue
+        metric = next(metric for metric in METRICS if metric in result)
+        before, after = base["results"][name][metric], result[metric]
+        change = (after - before) / before * 100 if before else 0.0
+        worse = change > args.tolerance if METRICS[metric] == "lower" else change < -args.tolerance
+        regressions += worse
+        print(
+            f"{name:>50}: {before:>12,.1f} -> {after:>12,.1f} {metric} ({change:+6.1f}%)"
+            f"{'  REGRESSÃO' if worse else ''}"
+        )
+    print(f"{regressions} regressões acima de {args.tolerance}%")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Executa a suíte e grava o resultado em JSON")
+    run_parser.add_argument("--rows", type=int, default=1_000_000)
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--url", default=None, help="Banco alvo (padrão: SQLite temporário)")
+    run_parser.add_argument("--no-seed", action="store_true", help="Reaproveita o banco já semeado em --url")
+    run_parser.add_argument("--single-rows", type=int, default=2_000, help="Itens de crud.create_item")
+    run_parser.add_argument("--bulk-rows", type=int, default=50_000, help="Itens de crud.create_items_bulk")
+    run_parser.add_argument("--batch-size", type=int, default=1_000)
+    run_parser.add_argument("--skip-ingest", action="store_true")
+    run_parser.add_argument("--skip-startup", action="store_true")
+    run_parser.add_argument("--output", default=None, help="Arquivo JSON (padrão: stdout)")
+
+    compare_parser = subparsers.add_parser("compare", help="Compara dois resultados de run")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--tolerance", type=float, default=10.0, help="Piora tolerada, em %%")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
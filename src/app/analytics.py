@@ -0,0 +1,217 @@
+# analytics.py
+"""Endpoints ``/analytics/*``: as consultas do dashboard expostas pela API.
+
+As respostas saem em JSON compacto (colunas + linhas) ou em Arrow IPC e levam
+um ETag derivado dos filtros e da marca d'água dos dados (``app.cache``).
+Clientes que repetem a consulta com ``If-None-Match`` recebem ``304`` sem que a
+consulta seja executada enquanto nenhuma linha nova chegar.
+
+``app.repository`` e o pandas só são importados na primeira consulta: incluir o
+router não pesa na subida da API.
+"""
+import hashlib
+import io
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Literal
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from app import cache, export
+from app.database import get_analytics_db
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+ResponseFormat = Literal["json", "arrow"]
+
+TABLE_COLUMN_NAMES = [
+    "Ticket Code", "Num Cupom", "Num Caixa", "Hostname", "Num Ped ECF", "Valor Total",
+    "Operation Type", "Success", "Criado em",
+]
+
+
+def _etag(db: Session, name: str, fmt: str, *filters) -> str:
+    extra = f"{datetime.now():%Y-%m}" if name == "kpi" else None
+    key = cache.make_key(name, fmt, extra, *filters)
+    digest = hashlib.sha1(f"{key}|{cache.watermark(db)}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    candidates = request.headers.get("if-none-match")
+    if not candidates:
+        return False
+    # Aceita a lista de ETags e a forma fraca (W/"...") enviada por alguns proxies
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in candidates.split(","))
+
+
+def _frame_response(frame: "pd.DataFrame", fmt: str, etag: str, headers: dict | None = None) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(sink.getvalue(), media_type=export.MEDIA_TYPES["arrow"], headers=headers)
+    # NaN não é JSON válido; vira null
+    rows = frame.astype(object).where(frame.notna(), None).values.tolist()
+    return JSONResponse(
+        jsonable_encoder({"columns": list(frame.columns), "rows": rows}), headers=headers
+    )
+
+
+def _respond(request: Request, db: Session, name: str, fmt: str, filters: tuple, load) -> Response:
+    etag = _etag(db, name, fmt, *filters)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return load(etag)
+
+
+def _operation_types(operation_type: List[str]) -> tuple[str, ...]:
+    return tuple(sorted(operation_type))
+
+
+@router.get("/kpi")
+def analytics_kpi(
+    request: Request,
+    start_date: datetime,
+    end_date: datetime,
+    operation_type: List[str] = Query(["MANUAL_VALIDATION", "AUTOMATIC_VALIDATION"]),
+    format: ResponseFormat = "json",
+    db: Session = Depends(get_analytics_db),
+):
+    filters = (start_date, end_date, _operation_types(operation_type))
+
+    def load(etag):
+        import pandas as pd
+        from app import repository
+
+        kpi = repository.get_kpi_data(db, *filters)
+        if format == "arrow":
+            return _frame_response(pd.DataFrame([kpi]), format, etag)
+        return JSONResponse(kpi, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    return _respond(request, db, "kpi", format, filters, load)
+
+
+@router.get("/daily")
+def analytics_daily(
+    request: Request,
+    start_date: datetime,
+    end_date: datetime,
+    operation_type: List[str] = Query(["MANUAL_VALIDATION", "AUTOMATIC_VALIDATION"]),
+    format: ResponseFormat = "json",
+    db: Session = Depends(get_analytics_db),
+):
+    filters = (start_date, end_date, _operation_types(operation_type))
+
+    def load(etag):
+        import pandas as pd
+        from app import repository
+
+        rows = repository.get_daily_counts(db, *filters)
+        frame = pd.DataFrame(rows, columns=["Data", "Status", "Quantidade"])
+        return _frame_response(frame, format, etag)
+
+    return _respond(request, db, "daily_counts", format, filters, load)
+
+
+@router.get("/distribution")
+def analytics_distribution(
+    request: Request,
+    start_date: datetime,
+    end_date: datetime,
+    operation_type: List[str] = Query(["MANUAL_VALIDATION", "AUTOMATIC_VALIDATION"]),
+    format: ResponseFormat = "json",
+    db: Session = Depends(get_analytics_db),
+):
+    filters = (start_date, end_date, _operation_types(operation_type))
+
+    def load(etag):
+        from app import repository
+
+        frame = repository.get_hostname_caixa_distribution(db, *filters)
+        # Inteiro com nulos, em vez do float que o pandas usa para colunas com None
+        frame = frame.astype({"Num Caixa": "Int64"})
+        return _frame_response(frame, format, etag)
+
+    return _respond(request, db, "distribution", format, filters, load)
+
+
+@router.get("/caixa-stats")
+def analytics_caixa_stats(
+    request: Request,
+    start_date: datetime,
+    end_date: datetime,
+    operation_type: List[str] = Query(["MANUAL_VALIDATION", "AUTOMATIC_VALIDATION"]),
+    format: ResponseFormat = "json",
+    db: Session = Depends(get_analytics_db),
+):
+    """Tickets distintos e percentis de valor total por caixa, estimados por sketches."""
+    filters = (start_date, end_date, _operation_types(operation_type))
+
+    def load(etag):
+        from app import repository
+
+        frame = repository.get_hostname_caixa_sketch_stats(db, *filters)
+        frame = frame.astype({"Num Caixa": "Int64"})
+        return _frame_response(frame, format, etag)
+
+    return _respond(request, db, "caixa_sketch_stats", format, filters, load)
+
+
+@router.get("/daily-stats")
+def analytics_daily_stats(
+    request: Request,
+    start_date: datetime,
+    end_date: datetime,
+    operation_type: List[str] = Query(["MANUAL_VALIDATION", "AUTOMATIC_VALIDATION"]),
+    format: ResponseFormat = "json",
+    db: Session = Depends(get_analytics_db),
+):
+    """Tickets distintos e percentis de valor total por dia, estimados por sketches."""
+    filters = (start_date, end_date, _operation_types(operation_type))
+
+    def load(etag):
+        from app import repository
+
+        return _frame_response(repository.get_daily_sketch_stats(db, *filters), format, etag)
+
+    return _respond(request, db, "daily_sketch_stats", format, filters, load)
+
+
+@router.get("/table")
+def analytics_table(
+    request: Request,
+    start_date: datetime,
+    end_date: datetime,
+    operation_type: List[str] = Query(["MANUAL_VALIDATION", "AUTOMATIC_VALIDATION"]),
+    search_term: str | None = None,
+    sort_by: str | None = Query(None, description="Uma das colunas de repository.COLUMN_MAP"),
+    sort_order: Literal["asc", "desc"] = "desc",
+    limit: int = Query(1000, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+    format: ResponseFormat = "json",
+    db: Session = Depends(get_analytics_db),
+):
+    """Página da tabela analítica; o total filtrado vai em ``X-Total-Count``."""
+    operation_types = _operation_types(operation_type)
+    filters = (start_date, end_date, operation_types, search_term, sort_by, sort_order, limit, offset)
+
+    def load(etag):
+        import pandas as pd
+        from app import repository
+
+        rows = repository.get_items_page(db, *filters)
+        total = repository.count_items_by_date(db, start_date, end_date, operation_types, search_term)
+        frame = pd.DataFrame(rows, columns=TABLE_COLUMN_NAMES).astype({"Num Cupom": "Int64", "Num Caixa": "Int64"})
+        return _frame_response(frame, format, etag, headers={"X-Total-Count": str(total)})
+
+    return _respond(request, db, "items_page", format, filters, load)
@@ -0,0 +1,479 @@
+# archive.py
+"""Camada fria de ``items`` em Parquet particionado por mês.
+
+Meses fechados são exportados para ``ARCHIVE_PATH`` no layout hive
+``month=AAAA-MM/operation_type=<tipo>/part-0.parquet`` e, opcionalmente,
+removidos da tabela quente::
+
+    python -m app.archive run --keep-months 3 [--prune]
+
+O manifesto ``_manifest.json`` guarda o ``cutoff``: tudo antes dele é lido do
+arquivo, tudo a partir dele continua no banco. As funções de leitura daqui
+aplicam os filtros de data e operation_type como pushdown nas partições e nas
+estatísticas dos row groups e leem em lotes, sem carregar o intervalo inteiro.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app import cache, dictionary, models, search
+from app.config import settings
+from app.database import MaintenanceSessionLocal
+
+MANIFEST_NAME = "_manifest.json"
+
+ARCHIVE_COLUMNS = (
+    "id", "ticket_code", "num_ped_ecf", "num_cupom", "num_caixa", "hostname",
+    "vl_total", "operation_type", "success", "message", "created_at", "updated_at",
+)
+
+# Colunas da tabela analítica e da exportação, na ordem de repository.TABLE_COLUMNS
+TABLE_FIELDS = (
+    "ticket_code", "num_cupom", "num_caixa", "hostname", "num_ped_ecf",
+    "vl_total", "operation_type", "success", "created_at",
+)
+
+# Linhas por lote lido do Parquet e por trecho ordenado em memória (ver _merged_rows)
+BATCH_ROWS = 16_384
+RUN_ROWS = 200_000
+
+_manifest_cache: dict = {}
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("ticket_code", pa.string()),
+        ("num_ped_ecf", pa.string()),
+        ("num_cupom", pa.int64()),
+        ("num_caixa", pa.int64()),
+        ("hostname", pa.string()),
+        ("vl_total", pa.float64()),
+        ("success", pa.bool_()),
+        ("message", pa.string()),
+        ("created_at", pa.timestamp("us")),
+        ("updated_at", pa.timestamp("us")),
+    ])
+
+
+def _month_start(day: date) -> datetime:
+    return datetime(day.year, day.month, 1)
+
+
+def _next_month(moment: datetime) -> datetime:
+    return datetime(moment.year + (moment.month == 12), moment.month % 12 + 1, 1)
+
+
+def read_manifest(root: Path) -> dict:
+    """Lê o manifesto, reaproveitando a leitura enquanto o arquivo não muda."""
+    path = root / MANIFEST_NAME
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return {"cutoff": None, "months": {}}
+    cached = _manifest_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    manifest = json.loads(path.read_text())
+    _manifest_cache[path] = (mtime, manifest)
+    return manifest
+
+
+def _write_manifest(root: Path, manifest: dict):
+    tmp = root / f".{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp, root / MANIFEST_NAME)
+
+
+def archive_root() -> Path | None:
+    return Path(settings.ARCHIVE_PATH) if settings.ARCHIVE_PATH else None
+
+
+def cutoff() -> datetime | None:
+    """Primeiro instante que ainda é lido da tabela quente, ou None sem arquivo."""
+    root = archive_root()
+    if root is None:
+        return None
+    value = read_manifest(root)["cutoff"]
+    return datetime.fromisoformat(value) if value else None
+
+
+def split_tiers(
+    start_date: datetime, end_date: datetime
+) -> tuple[tuple[datetime, datetime] | None, tuple[datetime, datetime] | None]:
+    """Divide ``[start_date, end_date]`` entre o trecho arquivado e o trecho quente."""
+    boundary = cutoff()
+    if boundary is None or start_date >= boundary:
+        return None, (start_date, end_date)
+    if end_date < boundary:
+        return (start_date, end_date), None
+    return (start_date, boundary - timedelta(microseconds=1)), (boundary, end_date)
+
+
+def archive_month(db: Session, root: Path, month: datetime, chunk_size: int = 50_000) -> int:
+    """Exporta um mês de ``items`` para o dataset, substituindo a partição se existir."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    label = f"{month:%Y-%m}"
+    tmp_dir = root / f".tmp-month={label}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    item = models.ItemModel
+    labels = {encoded.column: encoded.label for encoded in dictionary.DICTIONARIES}
+    columns = [labels[column] if column in labels else getattr(item, column) for column in ARCHIVE_COLUMNS]
+    stmt = (
+        dictionary.with_labels(select(*columns))
+        .where(item.created_at >= month, item.created_at < _next_month(month))
+        .order_by(item.operation_type_id, item.created_at)
+    )
+    writers = {}
+    rows_written = 0
+    try:
+        result = db.execute(stmt, execution_options={"yield_per": chunk_size})
+        for rows in result.partitions():
+            by_operation = {}
+            for row in rows:
+                by_operation.setdefault(row.operation_type, []).append(row)
+            for operation_type, op_rows in by_operation.items():
+                if operation_type not in writers:
+                    path = tmp_dir / f"operation_type={operation_type}" / "part-0.parquet"
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    writers[operation_type] = pq.ParquetWriter(path, schema, compression="zstd")
+                columns = {name: [getattr(row, name) for row in op_rows] for name in schema.names}
+                writers[operation_type].write_table(pa.Table.from_pydict(columns, schema=schema))
+                rows_written += len(op_rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    final_dir = root / f"month={label}"
+    shutil.rmtree(final_dir, ignore_errors=True)
+    if rows_written:
+        os.replace(tmp_dir, final_dir)
+    else:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return rows_written
+
+
+def run(db: Session, root: Path, before: datetime, prune: bool = False) -> dict:
+    """Arquiva todos os meses fechados anteriores a ``before`` e avança o cutoff.
+
+    O arquivamento é contíguo desde o mês mais antigo de ``items``, de modo que
+    tudo antes do cutoff esteja no arquivo. Com ``prune`` as linhas arquivadas
+    (e o rollup desses dias) são removidas do banco.
+    """
+    before = _month_start(before)
+    current_month = _month_start(date.today())
+    if before > current_month:
+        raise ValueError("Só é possível arquivar meses fechados")
+
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(root)
+    oldest = db.scalar(select(func.min(models.ItemModel.created_at)))
+    month = _month_start(oldest) if oldest is not None else before
+
+    while month < before:
+        label = f"{month:%Y-%m}"
+        # Meses fechados não recebem linhas novas; os já arquivados são pulados
+        if label not in manifest["months"]:
+            manifest["months"][label] = {"rows": archive_month(db, root, month), "pruned": False}
+        month = _next_month(month)
+
+    if manifest["cutoff"] is None or before > datetime.fromisoformat(manifest["cutoff"]):
+        manifest["cutoff"] = before.isoformat()
+    _write_manifest(root, manifest)
+
+    if prune:
+        boundary = datetime.fromisoformat(manifest["cutoff"])
+        db.execute(delete(models.ItemModel).where(models.ItemModel.created_at < boundary))
+        db.execute(delete(models.ItemDailyRollupModel).where(models.ItemDailyRollupModel.day < boundary.date()))
+        db.execute(delete(models.ItemKeyModel).where(models.ItemKeyModel.created_at < boundary))
+        db.commit()
+        for entry in manifest["months"].values():
+            entry["pruned"] = True
+        _write_manifest(root, manifest)
+    cache.invalidate_all()
+    return manifest
+
+
+def _dataset(root: Path):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(
+        pa.schema([("month", pa.string()), ("operation_type", pa.string())]), flavor="hive"
+    )
+    return ds.dataset(root, format="parquet", partitioning=partitioning)
+
+
+def _filtered_batches(start_date: datetime, end_date: datetime, operation_types: tuple[str, ...],
+                      columns: list[str]):
+    """Lotes de até ``BATCH_ROWS`` linhas, só das partições e row groups que podem conter o filtro."""
+    import pyarrow.dataset as ds
+
+    root = archive_root()
+    if root is None or not any(root.glob("month=*")):
+        return
+    expression = (
+        (ds.field("month") >= f"{start_date:%Y-%m}")
+        & (ds.field("month") <= f"{end_date:%Y-%m}")
+        & ds.field("operation_type").isin(list(operation_types))
+        & (ds.field("created_at") >= start_date)
+        & (ds.field("created_at") <= end_date)
+    )
+    yield from _dataset(root).to_batches(columns=columns, filter=expression, batch_size=BATCH_ROWS)
+
+
+def _count_true(mask) -> int:
+    import pyarrow.compute as pc
+
+    return pc.sum(pc.cast(pc.fill_null(mask, False), "int64")).as_py() or 0
+
+
+def _add_sums(a, b):
+    # Soma do Arrow é nula quando o grupo só tem nulos
+    return b if a is None else a if b is None else a + b
+
+
+def kpi_counts(start_date: datetime, end_date: datetime, operation_types: tuple[str, ...],
+               year_start: datetime, year_end: datetime, month_start: datetime, month_end: datetime) -> tuple:
+    import pyarrow.compute as pc
+
+    start_date, end_date = max(start_date, year_start), min(end_date, year_end - timedelta(microseconds=1))
+    counts = [0, 0, 0, 0]
+    if start_date > end_date:
+        return tuple(counts)
+    for batch in _filtered_batches(start_date, end_date, operation_types, ["created_at", "operation_type", "success"]):
+        success = pc.fill_null(batch["success"], False)
+        created_at = batch["created_at"]
+        in_month = pc.and_(pc.greater_equal(created_at, month_start), pc.less(created_at, month_end))
+        counts[0] += _count_true(success)
+        counts[1] += _count_true(pc.and_(success, in_month))
+        counts[2] += _count_true(pc.and_(success, pc.equal(batch["operation_type"], "MANUAL_VALIDATION")))
+        counts[3] += _count_true(pc.and_(success, pc.equal(batch["operation_type"], "AUTOMATIC_VALIDATION")))
+    return tuple(counts)
+
+
+def daily_counts(start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]) -> list[tuple]:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    counts = {}
+    for batch in _filtered_batches(start_date, end_date, operation_types, ["created_at", "success"]):
+        table = pa.Table.from_batches([batch])
+        table = table.append_column("day", pc.cast(table["created_at"], "date32"))
+        grouped = table.group_by(["day", "success"]).aggregate([("created_at", "count")])
+        for day, success, count in zip(
+            grouped["day"].to_pylist(), grouped["success"].to_pylist(), grouped["created_at_count"].to_pylist()
+        ):
+            counts[day, success] = counts.get((day, success), 0) + count
+    return [(*key, count) for key, count in counts.items()]
+
+
+def distribution(start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]) -> list[tuple]:
+    import pyarrow as pa
+
+    groups = {}
+    for batch in _filtered_batches(start_date, end_date, operation_types, ["hostname", "num_caixa", "vl_total"]):
+        grouped = pa.Table.from_batches([batch]).group_by(["hostname", "num_caixa"]).aggregate(
+            [("vl_total", "count"), ("vl_total", "sum")]
+        )
+        for hostname, num_caixa, count, total in zip(
+            grouped["hostname"].to_pylist(),
+            grouped["num_caixa"].to_pylist(),
+            grouped["vl_total_count"].to_pylist(),
+            grouped["vl_total_sum"].to_pylist(),
+        ):
+            previous = groups.get((hostname, num_caixa), (0, None))
+            groups[hostname, num_caixa] = (previous[0] + count, _add_sums(previous[1], total))
+    return [(*key, count, total) for key, (count, total) in groups.items()]
+
+
+def items_frame(start_date: datetime, end_date: datetime, operation_types: tuple[str, ...],
+                columns: list[str]):
+    """Colunas ``columns`` das linhas arquivadas do filtro, como DataFrame.
+
+    Usado só para as pontas parciais de um intervalo (no máximo dois dias).
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    batches = list(_filtered_batches(start_date, end_date, operation_types, columns))
+    if not batches:
+        return pd.DataFrame(columns=columns)
+    return pa.Table.from_batches(batches).to_pandas()
+
+
+def _search_matches(batch, search_term: str):
+    """Máscara do termo de busca, com a mesma semântica de search.search_filter."""
+    import pyarrow.compute as pc
+
+    matches = pc.match_substring(batch["ticket_code"], search_term, ignore_case=True)
+    if search.matches_numbers(search_term):
+        for name in search.NUMBER_COLUMNS:
+            matches = pc.or_kleene(matches, pc.match_substring(pc.cast(batch[name], "string"), search_term))
+    return pc.fill_null(matches, False)
+
+
+def count_items(start_date: datetime, end_date: datetime, operation_types: tuple[str, ...],
+                search_term: str | None = None) -> int:
+    total = 0
+    for batch in _filtered_batches(start_date, end_date, operation_types, ["ticket_code", "num_cupom", "num_caixa"]):
+        total += _count_true(_search_matches(batch, search_term)) if search_term else batch.num_rows
+    return total
+
+
+def _month_ranges(start_date: datetime, end_date: datetime) -> list[tuple[datetime, datetime]]:
+    ranges = []
+    month = _month_start(start_date)
+    while month <= end_date:
+        following = _next_month(month)
+        ranges.append((max(start_date, month), min(end_date, following - timedelta(microseconds=1))))
+        month = following
+    return ranges
+
+
+def sort_key(field: str, descending: bool, nulls_last: bool):
+    """Chave de ``heapq.merge(..., reverse=descending)`` para linhas de ``TABLE_FIELDS`` com o id no fim.
+
+    Mesma ordem do banco: ``field`` com os NULLs na ponta de ``nulls_last`` e
+    desempate pelo id decrescente.
+    """
+    position = TABLE_FIELDS.index(field)
+    null_largest = nulls_last != descending
+
+    def key(row):
+        value, item_id = row[position], row[-1]
+        return (value is None) == null_largest, value if value is not None else 0, item_id if descending else -item_id
+
+    return key
+
+
+def _sorted_runs(batches, field: str, descending: bool, nulls_last: bool):
+    """Tabelas de até ``RUN_ROWS`` linhas de ``batches``, cada uma ordenada."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    sort_keys = [(field, "descending" if descending else "ascending"), ("id", "descending")]
+    pending, size = [], 0
+    for batch in itertools.chain(batches, [None]):
+        if batch is not None and batch.num_rows:
+            pending.append(batch)
+            size += batch.num_rows
+        if pending and (batch is None or size >= RUN_ROWS):
+            table = pa.Table.from_batches(pending)
+            pending, size = [], 0
+            yield table.take(pc.sort_indices(
+                table, sort_keys=sort_keys, null_placement="at_end" if nulls_last else "at_start",
+            ))
+
+
+def _table_rows(table):
+    for batch in table.to_batches(max_chunksize=BATCH_ROWS):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+def _spill(table, path: Path) -> Path:
+    import pyarrow as pa
+
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=BATCH_ROWS)
+    return path
+
+
+def _spilled_rows(path: Path):
+    import pyarrow as pa
+
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index)
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+def _merged_rows(batches, field: str, descending: bool, nulls_last: bool):
+    """Linhas de ``batches`` ordenadas com memória limitada.
+
+    Cada trecho de ``RUN_ROWS`` linhas é ordenado no Arrow; havendo mais de um,
+    os trechos vão para arquivos IPC temporários e saem de uma junção k-way,
+    um lote de cada trecho em memória por vez.
+    """
+    runs = _sorted_runs(batches, field, descending, nulls_last)
+    first = next(runs, None)
+    if first is None:
+        return
+    second = next(runs, None)
+    if second is None:
+        yield from _table_rows(first)
+        return
+    with tempfile.TemporaryDirectory(prefix="archive-sort-") as directory:
+        directory = Path(directory)
+        paths = [_spill(first, directory / "run-0.arrow"), _spill(second, directory / "run-1.arrow")]
+        del first, second
+        paths.extend(_spill(table, directory / f"run-{n}.arrow") for n, table in enumerate(runs, 2))
+        yield from heapq.merge(
+            *(_spilled_rows(path) for path in paths), key=sort_key(field, descending, nulls_last), reverse=descending,
+        )
+
+
+def table_rows(start_date: datetime, end_date: datetime, operation_types: tuple[str, ...],
+               search_term: str | None = None, sort_field: str = "created_at", descending: bool = True,
+               nulls_last: bool = False, with_id: bool = False):
+    """Linhas arquivadas do filtro com as colunas de ``TABLE_FIELDS``, como tuplas ordenadas.
+
+    A ordem é a de ``sort_field`` com desempate pelo id decrescente, como no
+    banco; ``with_id`` inclui o id como última coluna. A leitura é em lotes e a
+    ordenação, por trechos (ver ``_merged_rows``): a memória não cresce com o
+    intervalo. Por ``created_at`` cada mês é ordenado à parte, já na ordem final.
+    """
+    if sort_field == "created_at":
+        ranges = _month_ranges(start_date, end_date)
+        if descending:
+            ranges.reverse()
+    else:
+        ranges = [(start_date, end_date)]
+    for start, end in ranges:
+        batches = _filtered_batches(start, end, operation_types, [*TABLE_FIELDS, "id"])
+        if search_term:
+            batches = (batch.filter(_search_matches(batch, search_term)) for batch in batches)
+        for row in _merged_rows(batches, sort_field, descending, nulls_last):
+            yield row if with_id else row[:-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivamento de items em Parquet")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Arquiva os meses fechados mais antigos")
+    run_parser.add_argument("--keep-months", type=int, default=3,
+                            help="Meses fechados mantidos na tabela quente")
+    run_parser.add_argument("--prune", action="store_true", help="Remove do banco as linhas arquivadas")
+    args = parser.parse_args()
+
+    root = archive_root()
+    if root is None:
+        parser.error("Defina ARCHIVE_PATH para usar o arquivamento")
+
+    before = _month_start(date.today())
+    for _ in range(args.keep_months):
+        before = _month_start((before - timedelta(days=1)).date())
+
+    with MaintenanceSessionLocal() as db:
+        manifest = run(db, root, before, prune=args.prune)
+    print(f"Arquivo atualizado; cutoff={manifest['cutoff']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# cache.py
+"""Cache de resultados das consultas do dashboard, compartilhado entre processos.
+
+As entradas ficam em um arquivo SQLite (``QUERY_CACHE_PATH``) visível para a API,
+o dashboard e suas réplicas. Cada entrada guarda a marca d'água dos dados no
+momento do cálculo (ver ``watermark``), que muda a cada ingestão; as manutenções
+que removem ou reescrevem dados (arquivamento, partições, rebuild do rollup)
+e as ingestões com commit atrasado (ver ``app.incremental.commit_items``)
+chamam ``invalidate_all``, que avança a geração. Não há TTL: uma entrada só
+deixa de valer quando os dados mudam. Funções com ``incremental`` (ver
+``app.incremental``) não recalculam tudo quando só chegaram linhas novas:
+somam essas linhas ao resultado guardado.
+
+O arquivo é limitado a ``QUERY_CACHE_MAX_BYTES``, descartando as entradas usadas
+há mais tempo. Falhas no cache são registradas e a consulta segue sem ele.
+
+Os valores não usam pickle, que executaria código de quem escrevesse no
+arquivo compartilhado: DataFrames vão como Arrow IPC e o resto como JSON (ver
+``_encode``). Entradas em outro formato contam como ausentes.
+"""
+import functools
+import json
+import logging
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import Row, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.incremental import settled_id
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS entries ("
+    "key TEXT PRIMARY KEY, watermark TEXT NOT NULL, value BLOB NOT NULL, "
+    "size INTEGER NOT NULL, last_access REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)",
+    "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO counters VALUES "
+    "('generation', 0), ('hits', 0), ('misses', 0), ('refreshes', 0), ('evictions', 0)",
+)
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Uma conexão por thread, recriada se o caminho mudar."""
+    path = settings.QUERY_CACHE_PATH
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == path:
+        return conn
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    _local.conn, _local.path = conn, path
+    return conn
+
+
+def _normalize(value):
+    """Forma canônica dos argumentos de filtro para compor a chave."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sorted(_normalize(item) for item in value)
+    return value
+
+
+def make_key(name: str, *args, **kwargs) -> str:
+    return json.dumps(
+        [name, [_normalize(arg) for arg in args], {k: _normalize(v) for k, v in sorted(kwargs.items())}],
+        separators=(",", ":"),
+    )
+
+
+def _counter(conn: sqlite3.Connection, name: str) -> int:
+    return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+
+def _bump(conn: sqlite3.Connection, name: str, amount: int = 1):
+    conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, name))
+
+
+def watermark(db: Session, conn: sqlite3.Connection | None = None) -> str:
+    """Marca d'água atual dos dados, ``<geração>:<settled_id>:<max(id)>:<linhas acima de settled_id>``.
+
+    Só o ``max(id)`` não basta: uma transação que pegou um id menor pode fazer
+    commit depois de outra. Essas linhas ficam acima de ``settled_id`` (ver
+    ``app.incremental``) e mudam a contagem.
+    """
+    settled = settled_id(db)
+    max_id, recent = db.execute(
+        select(func.max(models.ItemModel.id), func.count()).where(models.ItemModel.id > settled)
+    ).one()
+    generation = _counter(conn or _connect(), 'generation')
+    return f"{generation}:{settled}:{max_id or settled}:{recent}"
+
+
+_FORMAT = b"DLC1"
+_HEADER = struct.Struct(">I")
+
+
+def _to_json(value, frames: list):
+    """Forma JSON de ``value``; tipos sem equivalente viram ``{"$tipo": ...}``."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, list):
+        return [_to_json(item, frames) for item in value]
+    # Linhas do SQLAlchemy voltam como tuplas
+    if isinstance(value, (tuple, Row)):
+        return {"$tuple": [_to_json(item, frames) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {"$set": [_to_json(item, frames) for item in value]}
+    if isinstance(value, dict):
+        if all(isinstance(k, str) and not k.startswith("$") for k in value):
+            return {k: _to_json(v, frames) for k, v in value.items()}
+        return {"$dict": [[_to_json(k, frames), _to_json(v, frames)] for k, v in value.items()]}
+    # pandas só é olhado se já foi carregado por quem calculou o valor
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(value, pd.DataFrame):
+        import pyarrow as pa
+
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(value)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        frames.append(sink.getvalue().to_pybytes())
+        return {"$frame": len(frames) - 1}
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(value, np.generic):
+        return _to_json(value.item(), frames)
+    raise TypeError(f"Valor sem formato no cache: {type(value).__name__}")
+
+
+def _from_json(value, frames: list):
+    if isinstance(value, list):
+        return [_from_json(item, frames) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        (tag, content), = value.items()
+        if tag == "$datetime":
+            return datetime.fromisoformat(content)
+        if tag == "$date":
+            return date.fromisoformat(content)
+        if tag == "$decimal":
+            return Decimal(content)
+        if tag == "$tuple":
+            return tuple(_from_json(item, frames) for item in content)
+        if tag == "$set":
+            return {_from_json(item, frames) for item in content}
+        if tag == "$dict":
+            return {_from_json(k, frames): _from_json(v, frames) for k, v in content}
+        if tag == "$frame":
+            import pyarrow as pa
+
+            return pa.ipc.open_stream(frames[content]).read_all().to_pandas()
+    return {k: _from_json(v, frames) for k, v in value.items()}
+
+
+def _encode(value) -> bytes:
+    """``_FORMAT``, tamanho do cabeçalho JSON, cabeçalho e os DataFrames em Arrow IPC."""
+    frames = []
+    header = json.dumps(
+        {"value": _to_json(value, frames), "frames": [len(frame) for frame in frames]},
+        separators=(",", ":"),
+    ).encode()
+    return b"".join([_FORMAT, _HEADER.pack(len(header)), header, *frames])
+
+
+def _decode(data: bytes):
+    if not data.startswith(_FORMAT):
+        raise ValueError("Entrada do cache em formato desconhecido")
+    offset = len(_FORMAT) + _HEADER.size
+    (size,) = _HEADER.unpack_from(data, len(_FORMAT))
+    header = json.loads(data[offset:offset + size])
+    offset += size
+    frames = []
+    for length in header["frames"]:
+        frames.append(data[offset:offset + length])
+        offset += length
+    return _from_json(header["value"], frames)
+
+
+def _get(conn: sqlite3.Connection, key: str, mark: str, accept=None):
+    """Lê a entrada se a marca bater; ``accept(marca_guardada)`` aceita marcas antigas.
+
+    Devolve ``(valor, marca_guardada)`` ou ``(None, None)``.
+    """
+    row = conn.execute("SELECT watermark, value FROM entries WHERE key = ?", (key,)).fetchone()
+    if row is None or (row[0] != mark and not (accept and accept(row[0]))):
+        _bump(conn, "misses")
+        return None, None
+    try:
+        value = _decode(row[1])
+    except (ValueError, KeyError, TypeError, struct.error):
+        logger.warning("Entrada ilegível no cache de consultas: %s", key, exc_info=True)
+        _bump(conn, "misses")
+        return None, None
+    with conn:
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        _bump(conn, "hits" if row[0] == mark else "refreshes")
+    return value, row[0]
+
+
+def _put(conn: sqlite3.Connection, key: str, mark: str, value):
+    data = _encode(value)
+    max_bytes = settings.QUERY_CACHE_MAX_BYTES
+    # Um resultado que ocuparia boa parte do cache expulsaria todo o resto
+    if len(data) > max_bytes // 4:
+        return
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (key, mark, data, len(data), time.time()),
+        )
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= max_bytes:
+            return
+        evicted = 0
+        for old_key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+            total -= size
+            evicted += 1
+        _bump(conn, "evictions", evicted)
+
+
+def _same_generation(mark: str):
+    generation = mark.split(":")[0]
+    return lambda stored: stored.split(":")[0] == generation
+
+
+def cached(name: str, key_extra=None, incremental=None):
+    """Decorador para funções ``fn(db, *filtros)`` do repositório.
+
+    ``key_extra`` devolve partes da chave que não estão nos argumentos (por
+    exemplo, o mês corrente usado nos KPIs). ``incremental`` é um
+    ``app.incremental.Incremental`` usado quando só chegaram linhas novas.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(db: Session, *args, **kwargs):
+            if not settings.QUERY_CACHE_ENABLED:
+                return fn(db, *args, **kwargs)
+            extra = key_extra() if key_extra else None
+            key = make_key(name, extra, *args, **kwargs)
+            use_incremental = incremental is not None and settings.QUERY_CACHE_INCREMENTAL
+            try:
+                conn = _connect()
+                # A marca é lida antes da consulta: linhas gravadas durante o
+                # cálculo só invalidam a entrada, nunca ficam de fora dela
+                mark = watermark(db, conn)
+                accept = _same_generation(mark) if use_incremental else None
+                value, stored_mark = _get(conn, key, mark, accept)
+            except sqlite3.Error:
+                logger.warning("Cache de consultas indisponível", exc_info=True)
+                return fn(db, *args, **kwargs)
+
+            if not use_incremental:
+                if stored_mark is not None:
+                    return value
+                value = fn(db, *args, **kwargs)
+                result = value
+            elif stored_mark == mark:
+                return value["value"]
+            else:
+                if stored_mark is None:
+                    value = incremental.build(db, fn, *args, **kwargs)
+                else:
+                    value = incremental.refresh(db, value, *args, **kwargs)
+                result = value["value"]
+            try:
+                _put(conn, key, mark, value)
+            except (sqlite3.Error, TypeError, ValueError):
+                # ValueError/TypeError: valor sem formato em _encode (ou recusado pelo Arrow)
+                logger.warning("Falha ao gravar no cache de consultas", exc_info=True)
+            return result
+        return wrapper
+    return decorator
+
+
+def invalidate_all():
+    """Invalida todas as entradas; usado após manutenções que removem ou reescrevem dados.
+
+    A geração avança mesmo com o cache desligado, porque também compõe os ETags
+    de ``app.analytics``.
+    """
+    try:
+        conn = _connect()
+        with conn:
+            _bump(conn, "generation")
+            conn.execute("DELETE FROM entries")
+    except sqlite3.Error:
+        logger.warning("Falha ao invalidar o cache de consultas", exc_info=True)
+
+
+def stats() -> dict:
+    conn = _connect()
+    counters = dict(conn.execute("SELECT name, value FROM counters"))
+    entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+    lookups = counters["hits"] + counters["refreshes"] + counters["misses"]
+    return {
+        "enabled": settings.QUERY_CACHE_ENABLED,
+        "entries": entries,
+        "bytes": size,
+        "max_bytes": settings.QUERY_CACHE_MAX_BYTES,
+        "hits": counters["hits"],
+        "misses": counters["misses"],
+        "refreshes": counters["refreshes"],
+        "hit_ratio": counters["hits"] / lookups if lookups else 0.0,
+        "evictions": counters["evictions"],
+        "generation": counters["generation"],
+    }
@@ -1,10 +1,12 @@
 import os
+import tempfile
 from functools import lru_cache
 from pathlib import Path
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-ENV_PATH = Path(__file__).resolve().parent.parent.parent / ".env"
+ROOT_PATH = Path(__file__).resolve().parent.parent.parent
+ENV_PATH = ROOT_PATH / ".env"
 
 
 class Settings(BaseSettings):
@@ -16,6 +18,14 @@ class Settings(BaseSettings):
 
     # Application
     LOG_LEVEL: str = "INFO"
+    # GET /metrics e a instrumentação de requisições e consultas (ver app.metrics)
+    METRICS_ENABLED: bool = True
+    # Registro de consultas lentas com EXPLAIN no PostgreSQL (ver app.profiler)
+    SLOW_QUERY_PROFILER: bool = False
+    SLOW_QUERY_THRESHOLD_MS: int = 500
+    SLOW_QUERY_LOG_PATH: str = str(Path(tempfile.gettempdir()) / "data_lake_slow_queries.jsonl")
+    SLOW_QUERY_EXPLAIN: bool = True
+    SLOW_QUERY_EXPLAIN_INTERVAL_S: int = 600
     APP_NAME: str = "Integração Estapar - Data Lake"
     APP_VERSION: str = "0.1.6"
 
@@ -25,6 +35,63 @@ class Settings(BaseSettings):
     # Database
     # DATABASE_URL: str = 'sqlite:///db.sqlite3'
     DATABASE_URL: str = 'postgresql+psycopg2://postgres:postgres@db:5432/dashboard'
+    # Endpoints de /items com sessão assíncrona (asyncpg/aiosqlite, extra "async")
+    DATABASE_ASYNC: bool = False
+    # Padrão: DATABASE_URL com o driver assíncrono do mesmo banco
+    ASYNC_DATABASE_URL: str | None = None
+    # Schema na subida da API (ver app.migrations): "check" compara a revisão do
+    # banco com os heads do Alembic, "create_all" cria as tabelas que faltam,
+    # "off" não faz nada
+    SCHEMA_STARTUP: str = "check"
+    ALEMBIC_SCRIPT_LOCATION: str = str(ROOT_PATH / "alembic")
+    # Pool de conexões da ingestão (ver database.engine_options; ignorado no SQLite)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Pool separado e menor para as consultas do dashboard, /analytics e exportação
+    ANALYTICS_POOL_SIZE: int = 3
+    ANALYTICS_MAX_OVERFLOW: int = 2
+    # statement_timeout por papel, em ms (0 desliga)
+    INGEST_STATEMENT_TIMEOUT_MS: int = 30000
+    ANALYTICS_STATEMENT_TIMEOUT_MS: int = 120000
+    MAINTENANCE_STATEMENT_TIMEOUT_MS: int = 0
+
+    # Ingest
+    BULK_MAX_ITEMS: int = 50000
+    # "direct" grava cada POST /items/ na hora; "batched" agrupa em group commits
+    INGEST_MODE: str = "direct"
+    INGEST_BATCH_MAX_ROWS: int = 500
+    INGEST_BATCH_MAX_WAIT_MS: int = 20
+    INGEST_QUEUE_MAX_SIZE: int = 10000
+    INGEST_REQUEST_TIMEOUT_S: float = 5.0
+    # Chaves recentes mantidas em memória por processo para responder retentativas
+    # sem ir ao banco (ver app.dedup; 0 desliga)
+    INGEST_DEDUP_CACHE_SIZE: int = 50000
+    # Rótulo -> id das tabelas de dicionário mantidos em memória, por tabela;
+    # acima do limite saem os menos usados (ver app.dictionary)
+    DICTIONARY_CACHE_SIZE: int = 100000
+    # Intervalo da compactação dos sketches diários dos dias recentes, feita por
+    # uma thread de cada worker da API (ver app.ingest.SketchCompactor; 0 desliga)
+    SKETCH_COMPACT_INTERVAL_S: float = 60.0
+
+    # Dashboard
+    # Lê os agregados de items_daily_rollup em vez de varrer items
+    DASHBOARD_USE_ROLLUP: bool = True
+    # Cache de resultados compartilhado entre processos (ver app.cache)
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_CACHE_PATH: str = str(Path(tempfile.gettempdir()) / "data_lake_query_cache.sqlite3")
+    QUERY_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # Soma só as linhas novas aos resultados em cache (ver app.incremental)
+    QUERY_CACHE_INCREMENTAL: bool = True
+    INCREMENTAL_SETTLE_SECONDS: int = 60
+
+    # Arquivo Parquet de meses fechados (desligado quando vazio)
+    ARCHIVE_PATH: str | None = None
+
+    # Exportação
+    EXPORT_CHUNK_SIZE: int = 50000
 
 
 class DevelopmentSettings(Settings):
@@ -51,4 +118,4 @@ def get_settings() -> Settings:
     return config_dict[config_name]()
 
 
-settings = get_settings()
\ No newline at end of file
+settings = get_settings()
@@ -1,23 +1,260 @@
+import base64
+import json
 from datetime import datetime
 
-from sqlalchemy import func, or_, String
+from sqlalchemy import and_, delete, func, insert, or_, select, String
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import pandas as pd
 
-from app import models, schemas
+from app import dedup, dictionary, incremental, metrics, models, rollup, schemas
 
 
-def get_item(db: Session, item_id: int):
-    return db.query(models.ItemModel).filter(models.ItemModel.id == item_id).first()
+def parse_fields(fields: str | None) -> tuple[str, ...]:
+    """Campos de ``schemas.Item`` pedidos em ``fields=`` (separados por vírgula).
 
+    Sem ``fields`` devolve todos, na ordem do schema; levanta ValueError se
+    algum campo não existir.
+    """
+    names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+    if not names:
+        return schemas.ITEM_FIELDS
+    unknown = [name for name in names if name not in schemas.ITEM_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos inválidos: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(names))
 
-def get_items(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.ItemModel).offset(skip).limit(limit).all()
 
+def _select_fields(fields: tuple[str, ...]):
+    """``select`` só das colunas de ``fields``, com id e created_at para o cursor.
 
+    As linhas já foram validadas na ingestão: saem como tuplas, sem montar a
+    entidade nem passar de novo pelos validadores de ``schemas.Item``. Só as
+    tabelas de dicionário dos rótulos pedidos entram na junção.
+    """
+    item = models.ItemModel
+    labels = {entry.column: entry for entry in dictionary.DICTIONARIES}
+    columns = [labels[name].label if name in labels else getattr(item, name) for name in fields]
+    # Depois dos campos pedidos, para encode_cursor; o id só se não foi pedido
+    extra = [item.created_at] if "id" in fields else [item.id, item.created_at]
+    stmt = select(*columns, *extra)
+    joined = [labels[name] for name in fields if name in labels]
+    return dictionary.with_labels(stmt, *joined) if joined else stmt.select_from(item)
+
+
+@metrics.track
+def get_item(db: Session, item_id: int, fields: tuple[str, ...] = schemas.ITEM_FIELDS):
+    """Linha com os ``fields`` do item (ver ``_select_fields``), ou None."""
+    return db.execute(_select_fields(fields).where(models.ItemModel.id == item_id)).first()
+
+
+def encode_cursor(item) -> str:
+    """Gera o token opaco de paginação a partir de (created_at, id) do último item."""
+    payload = json.dumps([item.created_at.isoformat(), item.id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[datetime, int]:
+    """Decodifica o token de ``encode_cursor``; levanta ValueError se for inválido."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Cursor inválido") from exc
+
+
+def _items_statement(
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[datetime, int] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    operation_types: list[str] | None = None,
+    fields: tuple[str, ...] = schemas.ITEM_FIELDS,
+):
+    item = models.ItemModel
+    stmt = _select_fields(fields)
+    if start_date is not None:
+        stmt = stmt.where(item.created_at >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(item.created_at <= end_date)
+    if operation_types:
+        # Sem sessão síncrona na versão assíncrona: o banco resolve os ids
+        operation_type = models.OperationTypeModel
+        stmt = stmt.where(item.operation_type_id.in_(
+            select(operation_type.id).where(operation_type.name.in_(operation_types))
+        ))
+    if after is not None:
+        created_at, item_id = after
+        # O primeiro termo deixa o planner usar o índice de created_at
+        stmt = stmt.where(
+            item.created_at >= created_at,
+            or_(item.created_at > created_at, and_(item.created_at == created_at, item.id > item_id)),
+        )
+    return stmt.order_by(item.created_at, item.id).offset(skip).limit(limit)
+
+
+@metrics.track
+def get_items(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[datetime, int] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    operation_types: list[str] | None = None,
+    fields: tuple[str, ...] = schemas.ITEM_FIELDS,
+):
+    """Lista itens em ordem estável de (created_at, id).
+
+    Com ``after`` a página começa logo após o item do cursor (keyset), com custo
+    constante independente da profundidade; ``skip`` continua aceito por
+    compatibilidade. Cada linha traz os ``fields`` na ordem pedida, seguidos de
+    id e created_at (ver ``_select_fields``).
+    """
+    stmt = _items_statement(skip, limit, after, start_date, end_date, operation_types, fields)
+    return db.execute(stmt).all()
+
+
+def _insert_statement():
+    return insert(models.ItemModel).returning(models.ItemModel.id, models.ItemModel.created_at)
+
+
+def _bulk_insert_statement():
+    return insert(models.ItemModel).returning(
+        models.ItemModel.id, models.ItemModel.created_at, sort_by_parameter_order=True
+    )
+
+
+def _create_item(db: Session, item: schemas.ItemCreate) -> tuple[models.ItemModel | schemas.Item, bool]:
+    # Importado na primeira gravação: traz numpy e pandas, que a API não
+    # precisa para subir nem para ler itens
+    from app import sketches
+
+    row = item.model_dump()
+    item_id = dedup.recent.lookup(row)
+    if item_id is not None:
+        dedup.stats.record("memory")
+        return schemas.Item(id=item_id, **row), True
+
+    item_id, created_at = db.execute(_insert_statement(), dictionary.encode_rows(db, [row])[0]).one()
+    if not dedup.claim(db, [row], [item_id], [created_at]):
+        # Retentativa: descarta este insert e devolve o item gravado antes
+        db.rollback()
+        db_item = dedup.existing_items(db, [dedup.item_key(row)])[dedup.item_key(row)]
+        dedup.stats.record("database")
+        dedup.recent.remember([row], [db_item.id])
+        return db_item, True
+    rollup.apply_items(db, [{**row, "created_at": created_at}])
+    sketches.apply_items(db, [{**row, "created_at": created_at}])
+    incremental.commit_items(db)
+    dedup.recent.remember([row], [item_id])
+    return schemas.Item(id=item_id, **row), False
+
+
+@metrics.track
 def create_item(db: Session, item: schemas.ItemCreate):
-    db_item = models.ItemModel(**item.model_dump())
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return db_item
+    """Grava o item; retorna (item, duplicata).
+
+    Se a chave já foi gravada (ver ``app.dedup``), nada é inserido e o item
+    devolvido é o original.
+    """
+    return _create_item(db, item)
+
+
+def _create_items_bulk(db: Session, items: list[schemas.ItemCreate]) -> tuple[list[int], list[bool]]:
+    from app import sketches
+
+    rows = [item.model_dump() for item in items]
+    ids = [dedup.recent.lookup(row) for row in rows]
+    duplicates = [item_id is not None for item_id in ids]
+    dedup.stats.record("memory", sum(duplicates))
+
+    # Só a primeira ocorrência de cada chave no lote vai ao banco
+    first = {}
+    for index, row in enumerate(rows):
+        if ids[index] is None:
+            first.setdefault(dedup.item_key(row), index)
+    pending = sorted(first.values())
+    written = [rows[index] for index in pending]
+
+    if written:
+        inserted = db.execute(_bulk_insert_statement(), dictionary.encode_rows(db, written)).all()
+        claimed = dedup.claim(db, written, *zip(*inserted))
+        kept, lost = [], []
+        for index, row, (item_id, created_at) in zip(pending, written, inserted):
+            ids[index] = item_id
+            if dedup.item_key(row) in claimed:
+                kept.append({**row, "created_at": created_at})
+            else:
+                lost.append(index)
+        if lost:
+            # Chaves já gravadas: remove as cópias deste lote e aponta para os originais
+            db.execute(delete(models.ItemModel).where(models.ItemModel.id.in_([ids[index] for index in lost])))
+            found = dedup.existing_items(db, [dedup.item_key(rows[index]) for index in lost])
+            for index in lost:
+                ids[index] = found[dedup.item_key(rows[index])].id
+                duplicates[index] = True
+            dedup.stats.record("database", len(lost))
+        rollup.apply_items(db, kept)
+        sketches.apply_items(db, kept)
+        incremental.commit_items(db)
+        dedup.recent.remember(written, [ids[index] for index in pending])
+
+    repeated = 0
+    for index, row in enumerate(rows):
+        if ids[index] is None:
+            ids[index] = ids[first[dedup.item_key(row)]]
+            duplicates[index] = True
+            repeated += 1
+    dedup.stats.record("batch", repeated)
+    return ids, duplicates
+
+
+@metrics.track
+def create_items_bulk(db: Session, items: list[schemas.ItemCreate]) -> tuple[list[int], list[bool]]:
+    """Insere vários itens com INSERT multi-linha em uma única transação.
+
+    Retorna os ids na mesma ordem de ``items`` e, para cada um, se era uma
+    duplicata (chave já gravada ou repetida no lote), caso em que o id é o do
+    item original e nada é inserido.
+    """
+    if not items:
+        return [], []
+    return _create_items_bulk(db, items)
+
+
+# --- Versões assíncronas (DATABASE_ASYNC) ---
+# Mesmas consultas; a gravação, que usa o rollup e a deduplicação síncronos,
+# roda via run_sync na mesma conexão e transação.
+
+@metrics.track
+async def get_item_async(db: AsyncSession, item_id: int, fields: tuple[str, ...] = schemas.ITEM_FIELDS):
+    return (await db.execute(_select_fields(fields).where(models.ItemModel.id == item_id))).first()
+
+
+@metrics.track
+async def get_items_async(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[datetime, int] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    operation_types: list[str] | None = None,
+    fields: tuple[str, ...] = schemas.ITEM_FIELDS,
+):
+    stmt = _items_statement(skip, limit, after, start_date, end_date, operation_types, fields)
+    return (await db.execute(stmt)).all()
+
+
+@metrics.track
+async def create_item_async(db: AsyncSession, item: schemas.ItemCreate):
+    return await db.run_sync(_create_item, item)
+
+
+@metrics.track
+async def create_items_bulk_async(db: AsyncSession, items: list[schemas.ItemCreate]) -> tuple[list[int], list[bool]]:
+    if not items:
+        return [], []
+    return await db.run_sync(_create_items_bulk, items)
@@ -1,16 +1,22 @@
 # app.py
 
 import locale
+import math
 from datetime import datetime
 import altair as alt
 import streamlit as st
 import pandas as pd
-from app.database import SessionLocal
+from app import frames
+from app.database import AnalyticsSessionLocal
 from app.repository import (
-    get_items_by_date, 
+    COLUMN_MAP,
+    count_items_by_date,
+    get_items_page,
     get_kpi_data,
     get_daily_counts,
-    get_hostname_caixa_distribution
+    get_daily_sketch_stats,
+    get_hostname_caixa_distribution,
+    get_hostname_caixa_sketch_stats,
 )
 
 # --- Configurações Iniciais e Constantes ---
@@ -22,46 +28,53 @@ except locale.Error:
 
 MANUAL_VALIDATION = "MANUAL_VALIDATION"
 AUTOMATIC_VALIDATION = "AUTOMATIC_VALIDATION"
-PAGE_SIZE = 1000000
+PAGE_SIZES = [50, 100, 500, 1000]
 
-# --- Funções de Busca de Dados Cacheadas ---
+# --- Funções de Busca de Dados ---
+# O cache fica no repositório (app.cache): é compartilhado entre processos e
+# invalidado quando chegam dados novos, sem TTL.
 
-@st.cache_data(ttl=1200, show_spinner="Calculando KPIs...")
 def fetch_kpi_data(start_date, end_date, operation_types):
     types_tuple = tuple(sorted(operation_types))
-    with SessionLocal() as db:
+    with st.spinner("Calculando KPIs..."), AnalyticsSessionLocal() as db:
         return get_kpi_data(db, start_date, end_date, types_tuple)
 
-@st.cache_data(ttl=1200, show_spinner="Gerando gráfico de contagem...")
 def fetch_daily_counts_data(start_date, end_date, operation_types):
     types_tuple = tuple(sorted(operation_types))
-    with SessionLocal() as db:
+    with st.spinner("Gerando gráfico de contagem..."), AnalyticsSessionLocal() as db:
         data = get_daily_counts(db, start_date, end_date, types_tuple)
         return pd.DataFrame(data)
 
-@st.cache_data(ttl=1200, show_spinner="Gerando gráfico de distribuição...")
 def fetch_hostname_caixa_distribution_data(start_date, end_date, operation_types):
     types_tuple = tuple(sorted(operation_types))
-    with SessionLocal() as db:
+    with st.spinner("Gerando gráfico de distribuição..."), AnalyticsSessionLocal() as db:
         return get_hostname_caixa_distribution(db, start_date, end_date, types_tuple)
 
+def fetch_caixa_sketch_stats(start_date, end_date, operation_types):
+    types_tuple = tuple(sorted(operation_types))
+    with st.spinner("Calculando tickets distintos e percentis..."), AnalyticsSessionLocal() as db:
+        return get_hostname_caixa_sketch_stats(db, start_date, end_date, types_tuple)
 
-@st.cache_data(ttl=1200, show_spinner="Buscando dados da tabela...")
-def fetch_table_data(start_date, end_date, operation_types):
+def fetch_daily_sketch_stats(start_date, end_date, operation_types):
     types_tuple = tuple(sorted(operation_types))
-    with SessionLocal() as db:
-        items = get_items_by_date(
-            db, start_date, end_date, types_tuple
+    with AnalyticsSessionLocal() as db:
+        return get_daily_sketch_stats(db, start_date, end_date, types_tuple)
+
+
+def fetch_table_page(start_date, end_date, operation_types, search_term, sort_by, sort_order, page_size, page):
+    types_tuple = tuple(sorted(operation_types))
+    with st.spinner("Buscando dados da tabela..."), AnalyticsSessionLocal() as db:
+        rows = get_items_page(
+            db, start_date, end_date, types_tuple, search_term, sort_by, sort_order,
+            limit=page_size, offset=(page - 1) * page_size,
         )
+        # Mesmos rótulos e tipos category da carga colunar (ver app.frames)
+        return frames.rows_to_frame(rows)
 
-        df = pd.DataFrame(items, columns=[
-            "Ticket Code", "Num Cupom", "Num Caixa", "Hostname", "Num Ped ECF", "Valor Total",
-            "Validação Manual", "Status", "Criado em"
-        ])
-        df['Validação Manual'] = df['Validação Manual'].apply(lambda x: "Sim" if x == MANUAL_VALIDATION else "Não")
-        df['Status'] = df['Status'].apply(lambda x: "Sucesso" if x else "Falha")
-        
-        return df
+def fetch_table_count(start_date, end_date, operation_types, search_term):
+    types_tuple = tuple(sorted(operation_types))
+    with AnalyticsSessionLocal() as db:
+        return count_items_by_date(db, start_date, end_date, types_tuple, search_term)
 
 
 # --- Início da Aplicação ---
@@ -151,12 +164,69 @@ if not df_combinado.empty:
     )
     st.altair_chart(grafico_final, use_container_width=True)
 
+# Estimativas dos sketches diários (ver app.sketches): erro típico de ~1,6% nos
+# tickets distintos e bem menor nos percentis
+st.subheader("Tickets Distintos e Percentis de Desconto")
+df_caixa_stats = fetch_caixa_sketch_stats(start_date, end_date, operation_types_to_fetch)
+if not df_caixa_stats.empty:
+    df_caixa_stats['Caixa'] = df_caixa_stats['Hostname'].astype(str) + " - " + df_caixa_stats['Num Caixa'].astype(str)
+    percentis = df_caixa_stats.melt(
+        id_vars=['Caixa', 'Tickets Distintos'], value_vars=['P50', 'P95', 'P99'],
+        var_name='Percentil', value_name='Valor',
+    )
+    grafico_percentis = alt.Chart(percentis).mark_tick(thickness=3).encode(
+        x=alt.X('Caixa:N', title='Caixa (Hostname - Num Caixa)', sort=None),
+        y=alt.Y('Valor:Q', title='Valor do desconto (R$)'),
+        color=alt.Color('Percentil:N', title='Percentil'),
+        tooltip=[
+            alt.Tooltip('Caixa'),
+            alt.Tooltip('Percentil'),
+            alt.Tooltip('Valor', format='.2f', title='Valor (R$)'),
+            alt.Tooltip('Tickets Distintos', format=',d'),
+        ]
+    ).properties(title="Percentis do Valor por Caixa")
+    st.altair_chart(grafico_percentis, use_container_width=True)
+
+df_daily_stats = fetch_daily_sketch_stats(start_date, end_date, operation_types_to_fetch)
+if not df_daily_stats.empty:
+    col_tickets, col_percentis = st.columns(2)
+    grafico_tickets = alt.Chart(df_daily_stats).mark_line(point=True).encode(
+        x=alt.X('Data:T', title='Data', axis=alt.Axis(format="%d %b")),
+        y=alt.Y('Tickets Distintos:Q', title='Tickets distintos'),
+        tooltip=[alt.Tooltip('Data:T', format='%d/%m/%Y'), alt.Tooltip('Tickets Distintos', format=',d')]
+    ).properties(title='Tickets Distintos por Dia')
+    col_tickets.altair_chart(grafico_tickets, use_container_width=True)
+    grafico_percentis_dia = alt.Chart(df_daily_stats).transform_fold(
+        ['P50', 'P95', 'P99'], as_=['Percentil', 'Valor']
+    ).mark_line().encode(
+        x=alt.X('Data:T', title='Data', axis=alt.Axis(format="%d %b")),
+        y=alt.Y('Valor:Q', title='Valor do desconto (R$)'),
+        color=alt.Color('Percentil:N', title='Percentil'),
+        tooltip=[alt.Tooltip('Data:T', format='%d/%m/%Y'), 'Percentil:N', alt.Tooltip('Valor:Q', format='.2f')]
+    ).properties(title='Percentis do Valor por Dia')
+    col_percentis.altair_chart(grafico_percentis_dia, use_container_width=True)
+
 st.divider()
 
 # --- Tabela Analítica ---
 st.subheader("Tabela Analítica de Registros")
 
-df_table = fetch_table_data(start_date, end_date, operation_types_to_fetch)
+col_busca, col_ordem, col_sentido, col_tamanho = st.columns([3, 2, 1, 1])
+search_term = col_busca.text_input("Buscar", placeholder="Ticket code, Num Cupom ou Num Caixa").strip() or None
+sort_by = col_ordem.selectbox("Ordenar por", list(COLUMN_MAP), index=list(COLUMN_MAP).index("Criado em"))
+sort_order = col_sentido.radio(
+    "Ordem", ["desc", "asc"], format_func=lambda order: "Decrescente" if order == "desc" else "Crescente"
+)
+page_size = col_tamanho.selectbox("Linhas por página", PAGE_SIZES, index=1)
+
+total_items = fetch_table_count(start_date, end_date, operation_types_to_fetch, search_term)
+total_pages = max(1, math.ceil(total_items / page_size))
+# O max_value faz parte da identidade do widget: quando o total de páginas muda, volta para a página 1
+page = st.number_input("Página", min_value=1, max_value=total_pages, value=1, step=1)
+
+df_table = fetch_table_page(
+    start_date, end_date, operation_types_to_fetch, search_term, sort_by, sort_order, page_size, page
+)
 
 st.dataframe(
     data=df_table,
@@ -167,3 +237,4 @@ st.dataframe(
         "Criado em": st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm")
     }
 )
+st.caption(f"{total_items:,} registros · página {page} de {total_pages}".replace(",", "."))
@@ -1,22 +1,88 @@
 from contextlib import contextmanager
+from functools import lru_cache
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker, Session
 
+from app import metrics, profiler
 from app.config import settings
 
+
+def engine_options(url: str, role: str, pool_size: int, max_overflow: int, statement_timeout_ms: int) -> dict:
+    """Pool e ``statement_timeout`` de um papel (ingest, analytics, maintenance).
+
+    Cada papel tem sua engine, e portanto seu pool: varreduras do dashboard
+    esgotam no máximo o pool de analytics, nunca as conexões da ingestão. No
+    SQLite, local e sem servidor compartilhado, valem os padrões do SQLAlchemy.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "postgresql":
+        return {}
+    application_name = f"data_lake-{role}"
+    if parsed.get_driver_name() == "asyncpg":
+        server_settings = {"application_name": application_name}
+        if statement_timeout_ms:
+            server_settings["statement_timeout"] = str(statement_timeout_ms)
+        connect_args = {"server_settings": server_settings}
+    else:
+        connect_args = {"application_name": application_name}
+        if statement_timeout_ms:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+    return {
+        "poolclass": metrics.TimedAsyncQueuePool if parsed.get_driver_name() == "asyncpg" else metrics.TimedQueuePool,
+        "pool_logging_name": role,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def _sessionmaker(bind) -> sessionmaker:
+    return sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=bind,
+    )
+
+
+# API: POST /items e leituras pontuais de /items
 engine = create_engine(
     settings.DATABASE_URL,
-    # connect_args={'check_same_thread': False},
+    **engine_options(
+        settings.DATABASE_URL, "ingest",
+        settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.INGEST_STATEMENT_TIMEOUT_MS,
+    ),
 )
-
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    expire_on_commit=False,
-    bind=engine,
+# Dashboard, /analytics e exportação
+analytics_engine = create_engine(
+    settings.DATABASE_URL,
+    **engine_options(
+        settings.DATABASE_URL, "analytics",
+        settings.ANALYTICS_POOL_SIZE, settings.ANALYTICS_MAX_OVERFLOW, settings.ANALYTICS_STATEMENT_TIMEOUT_MS,
+    ),
+)
+# Comandos de manutenção (rollup, partições, arquivo), sem limite de tempo por padrão
+maintenance_engine = create_engine(
+    settings.DATABASE_URL,
+    **engine_options(settings.DATABASE_URL, "maintenance", 1, 1, settings.MAINTENANCE_STATEMENT_TIMEOUT_MS),
 )
 
+for role, role_engine in (("ingest", engine), ("analytics", analytics_engine), ("maintenance", maintenance_engine)):
+    metrics.register_engine(role, role_engine)
+
+# Eventos no nível da classe Engine: cobrem API, dashboard e comandos de manutenção
+if settings.SLOW_QUERY_PROFILER:
+    profiler.install()
+
+SessionLocal = _sessionmaker(engine)
+AnalyticsSessionLocal = _sessionmaker(analytics_engine)
+MaintenanceSessionLocal = _sessionmaker(maintenance_engine)
+
 class Base(DeclarativeBase):
     pass
 
@@ -36,3 +102,51 @@ def get_or_create_session(session: Session | None = None):
         yield session
 
 db_context = contextmanager(get_db)
+
+
+def get_analytics_db():
+    session = AnalyticsSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+analytics_db_context = contextmanager(get_analytics_db)
+
+
+_ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Troca o driver de ``url`` pelo equivalente assíncrono."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"Sem driver assíncrono configurado para {backend}")
+    return parsed.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+@lru_cache
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """Engine assíncrona criada no primeiro uso; os drivers só são exigidos com DATABASE_ASYNC."""
+    url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+    async_engine = create_async_engine(
+        url,
+        **engine_options(
+            url, "ingest", settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.INGEST_STATEMENT_TIMEOUT_MS,
+        ),
+    )
+    metrics.register_engine("ingest_async", async_engine.sync_engine)
+    return async_sessionmaker(
+        bind=async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as session:
+        yield session
@@ -0,0 +1,282 @@
+# datagen.py
+"""Gerador de dados sintéticos de ``items`` para testes de carga.
+
+Cada bloco de ``--batch-size`` linhas é gerado de forma vetorizada (numpy e
+Arrow, sem um objeto Python por célula) em um processo do pool, com semente
+própria derivada de ``--seed``: o resultado não depende de ``--workers``.
+
+- PostgreSQL: o próprio worker grava o bloco com ``COPY ... FROM STDIN`` em CSV,
+  em paralelo com os demais; partições mensais que faltarem são criadas antes.
+- Outros bancos: os blocos voltam ao processo principal, que os insere em
+  lotes (multi-row) em uma única conexão.
+
+No máximo ``2 * workers`` blocos ficam em memória ao mesmo tempo. Ao final as
+chaves de ``item_keys`` do período são gravadas (``dedup.rebuild``), o rollup e
+os sketches reconstruídos e o cache de consultas invalidado::
+
+    python -m app.datagen --rows 100000000 --days 730 [--workers 8] [--url ...]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from io import BytesIO
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from sqlalchemy import create_engine, insert, make_url, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app import cache, dedup, dictionary, models, partitions, rollup, sketches
+from app.config import settings
+
+OPERATION_TYPES = ("MANUAL_VALIDATION", "AUTOMATIC_VALIDATION")
+MESSAGES = ("Desconto aplicado", "Cupom não encontrado", "Desconto já utilizado")
+# Colunas gravadas, já com os ids dos dicionários (ver _encode)
+COLUMNS = (
+    "ticket_code", "num_ped_ecf", "num_cupom", "num_caixa", "hostname_id", "vl_total",
+    "operation_type_id", "success", "message_id", "created_at", "updated_at",
+)
+# Peso relativo de cada hora do dia com business_hours
+HOUR_WEIGHTS = np.array([1, 1, 1, 1, 1, 1, 2, 4, 8, 10, 11, 12, 14, 13, 11, 10, 10, 11, 13, 14, 12, 8, 4, 2])
+_HEX = np.array([f"{byte:02x}".encode() for byte in range(256)], dtype="S2")
+
+_connection = None
+
+
+def _ticket_codes(rng: np.random.Generator, rows: int) -> pa.Array:
+    """UUIDs v4 em texto, montados byte a byte sem ``uuid.UUID``."""
+    raw = rng.integers(0, 256, size=(rows, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    digits = _HEX[raw].view("S1").reshape(rows, 32)
+    chars = np.full((rows, 36), b"-", dtype="S1")
+    for start, end, offset in ((0, 8, 0), (8, 12, 1), (12, 16, 2), (16, 20, 3), (20, 32, 4)):
+        chars[:, start + offset:end + offset] = digits[:, start:end]
+    return pa.array(chars.view("S36").ravel(), pa.binary(36)).cast(pa.string())
+
+
+def generate_chunk(index: int, rows: int, options: dict) -> pa.Table:
+    """Bloco ``index`` do conjunto descrito por ``options`` (ver ``generate``)."""
+    rng = np.random.default_rng([options["seed"], index])
+    days = options["days"]
+
+    if options["growth"]:
+        # Densidade linear decrescente com a idade: o volume cresce ao longo do período
+        day = np.floor(days * (1 - np.sqrt(rng.random(rows)))).astype(np.int64)
+    else:
+        day = rng.integers(0, days, rows)
+    if options["business_hours"]:
+        hour = rng.choice(24, rows, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+        seconds = hour * 3600 + rng.integers(0, 3600, rows)
+    else:
+        seconds = rng.integers(0, 86400, rows)
+    end = np.datetime64(options["end"], "s")
+    created_at = end.astype("datetime64[D]") - day + seconds.astype("timedelta64[s]")
+    # Hoje só até o horário de end
+    created_at = np.where(created_at > end, created_at - np.timedelta64(1, "D"), created_at)
+
+    hostnames = options["hostnames"]
+    ranks = np.arange(1, hostnames + 1)
+    weights = 1 / ranks ** options["hostname_skew"]
+    hostname = rng.choice(hostnames, rows, p=weights / weights.sum())
+    manual = rng.random(rows) < options["manual_ratio"]
+    success = rng.random(rows) < options["success_ratio"]
+    message = np.where(success, 0, rng.integers(1, len(MESSAGES), rows))
+
+    created = pa.array(created_at.astype("datetime64[s]"), pa.timestamp("s"))
+    return pa.table({
+        "ticket_code": _ticket_codes(rng, rows),
+        "num_ped_ecf": pa.array(rng.integers(0, 10000, rows)).cast(pa.string()),
+        "num_cupom": pa.array(rng.integers(0, 10000, rows)),
+        "num_caixa": pa.array(rng.integers(1, options["caixas"] + 1, rows), mask=manual),
+        "hostname": pa.array(_hostnames(hostnames)).take(pa.array(hostname)),
+        "vl_total": pa.array(np.round(rng.lognormal(3.5, 0.8, rows), 2)),
+        "operation_type": pa.array(OPERATION_TYPES).take(pa.array(np.where(manual, 0, 1))),
+        "success": pa.array(success),
+        "message": pa.array(MESSAGES).take(pa.array(message)),
+        "created_at": created,
+        "updated_at": created,
+    })
+
+
+def _hostnames(count: int) -> list[str]:
+    return [str(n).zfill(4) for n in range(1, count + 1)]
+
+
+def _encode(table: pa.Table, ids: dict[str, dict[str, int]]) -> pa.Table:
+    """Troca as colunas de rótulos pelos ids de ``app.dictionary``."""
+    for column, mapping in ids.items():
+        index = pc.index_in(table[column], value_set=pa.array(list(mapping)))
+        position = table.schema.get_field_index(column)
+        table = table.set_column(position, f"{column}_id", pa.array(list(mapping.values())).take(index))
+    return table
+
+
+def _copy_chunk(url: str, table: pa.Table):
+    global _connection
+    if _connection is None:
+        _connection = create_engine(url, poolclass=NullPool).raw_connection()
+    buffer = BytesIO()
+    # Nulos saem como campo vazio sem aspas, que o COPY em CSV lê como NULL
+    pacsv.write_csv(table, buffer, pacsv.WriteOptions(include_header=False))
+    buffer.seek(0)
+    cursor = _connection.cursor()
+    cursor.copy_expert(f"COPY items ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    _connection.commit()
+
+
+def _work(index: int, rows: int, options: dict, url: str | None):
+    """Gera um bloco; com ``url`` (PostgreSQL) já o grava e devolve só a contagem."""
+    table = _encode(generate_chunk(index, rows, options), options["ids"])
+    if url is None:
+        return table
+    _copy_chunk(url, table)
+    return table.num_rows
+
+
+def _insert_chunk(db: Session, table: pa.Table, batch_size: int = 5000):
+    rows = table.to_pylist()
+    for start in range(0, len(rows), batch_size):
+        db.execute(insert(models.ItemModel), rows[start:start + batch_size])
+    db.commit()
+
+
+def _ensure_partitions(db: Session, start: date, end: date):
+    if not partitions.is_partitioned(db):
+        return
+    existing = partitions.list_partitions(db)
+    month = start.replace(day=1)
+    while month <= end:
+        if month not in existing:
+            partitions.create_partition(db, month)
+        month = partitions._add_months(month, 1)
+    db.commit()
+
+
+def _progress(done: int, total: int, started: float):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0.0
+    remaining = (total - done) / rate if rate else 0.0
+    print(
+        f"\r{done:>14,}/{total:,} linhas ({done / total:>4.0%}) | {rate:>10,.0f} linhas/s | restam ~{remaining:,.0f}s",
+        end="", file=sys.stderr, flush=True,
+    )
+
+
+def generate(
+    rows: int,
+    url: str | None = None,
+    days: int = 365,
+    end: datetime | None = None,
+    hostnames: int = 32,
+    caixas: int = 32,
+    success_ratio: float = 0.95,
+    manual_ratio: float = 0.3,
+    hostname_skew: float = 1.1,
+    business_hours: bool = True,
+    growth: bool = True,
+    workers: int | None = None,
+    batch_size: int = 200_000,
+    seed: int = 42,
+    rebuild_rollup: bool = True,
+    rebuild_sketches: bool = True,
+) -> int:
+    """Insere ``rows`` itens sintéticos em ``url`` (padrão: ``DATABASE_URL``).
+
+    ``hostname_skew`` é o expoente da distribuição de Zipf entre os hostnames
+    (0 = uniforme); ``growth`` concentra o volume nos dias recentes e
+    ``business_hours`` no horário comercial.
+    """
+    url = url or settings.DATABASE_URL
+    end = end or datetime.now()
+    options = {
+        "seed": seed, "days": days, "end": end.replace(microsecond=0), "hostnames": hostnames,
+        "caixas": caixas, "success_ratio": success_ratio, "manual_ratio": manual_ratio,
+        "hostname_skew": hostname_skew, "business_hours": business_hours, "growth": growth,
+    }
+    engine = create_engine(url)
+    copy = make_url(url).get_driver_name() == "psycopg2"
+    first_day = (end - timedelta(days=days)).date()
+
+    with Session(engine) as db:
+        _ensure_partitions(db, first_day, end.date())
+        # Os rótulos são poucos e conhecidos: os ids vão prontos para os workers
+        options["ids"] = {
+            "operation_type": dictionary.operation_types.encode(db, OPERATION_TYPES),
+            "hostname": dictionary.hostnames.encode(db, _hostnames(hostnames)),
+            "message": dictionary.messages.encode(db, MESSAGES),
+        }
+        db.commit()
+        sizes = [min(batch_size, rows - start) for start in range(0, rows, batch_size)]
+        workers = workers or os.cpu_count() or 1
+        done = 0
+        started = time.perf_counter()
+        pending = deque()
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            for index, size in enumerate(sizes):
+                pending.append(pool.apply_async(_work, (index, size, options, url if copy else None)))
+                # Limita os blocos em memória, gerados ou aguardando gravação
+                while len(pending) >= 2 * workers or (index == len(sizes) - 1 and pending):
+                    result = pending.popleft().get()
+                    if copy:
+                        done += result
+                    else:
+                        _insert_chunk(db, result)
+                        done += result.num_rows
+                    _progress(done, rows, started)
+        print(file=sys.stderr)
+
+        # Sem elas a ingestão aceitaria de novo um item gerado
+        dedup.rebuild(db, first_day, end.date())
+        if rebuild_rollup:
+            rollup.rebuild(db, first_day, end.date())
+        if rebuild_sketches:
+            sketches.rebuild(db, first_day, end.date())
+        if engine.dialect.name == "postgresql":
+            db.execute(text("ANALYZE items"))
+            db.commit()
+    cache.invalidate_all()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera itens sintéticos em massa")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--url", default=None, help="Padrão: DATABASE_URL")
+    parser.add_argument("--days", type=int, default=365, help="Dias até --end cobertos pelos itens")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="Padrão: agora")
+    parser.add_argument("--hostnames", type=int, default=32)
+    parser.add_argument("--caixas", type=int, default=32)
+    parser.add_argument("--success-ratio", type=float, default=0.95)
+    parser.add_argument("--manual-ratio", type=float, default=0.3)
+    parser.add_argument("--hostname-skew", type=float, default=1.1, help="Expoente de Zipf (0 = uniforme)")
+    parser.add_argument("--uniform", action="store_true",
+                        help="Datas e horários uniformes, sem crescimento nem horário comercial")
+    parser.add_argument("--workers", type=int, default=None, help="Padrão: número de CPUs")
+    parser.add_argument("--batch-size", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-rollup", action="store_true", help="Não reconstrói o rollup ao final")
+    parser.add_argument("--skip-sketches", action="store_true", help="Não reconstrói os sketches ao final")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    done = generate(
+        args.rows, url=args.url, days=args.days, end=args.end, hostnames=args.hostnames,
+        caixas=args.caixas, success_ratio=args.success_ratio, manual_ratio=args.manual_ratio,
+        hostname_skew=args.hostname_skew, business_hours=not args.uniform, growth=not args.uniform,
+        workers=args.workers, batch_size=args.batch_size, seed=args.seed,
+        rebuild_rollup=not args.skip_rollup, rebuild_sketches=not args.skip_sketches,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"{done:,} linhas em {elapsed:.1f}s ({done / elapsed:,.0f} linhas/s)")
+
+
+if __name__ == "__main__":
+    main()
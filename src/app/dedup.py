@@ -0,0 +1,161 @@
+# dedup.py
+"""Ingestão idempotente de ``items``.
+
+Um item é identificado por ``(ticket_code, num_cupom, operation_type)``. A
+chave é gravada em ``item_keys`` na mesma transação do item, com ``ON CONFLICT
+DO NOTHING``: quem perde a corrida (retentativa do PDV após timeout) descarta o
+próprio insert e responde com o item já gravado.
+
+Na frente do banco, ``recent`` guarda as últimas chaves aceitas por este
+processo (LRU limitada por ``INGEST_DEDUP_CACHE_SIZE``); uma retentativa com o
+mesmo corpo é respondida sem ir ao banco. O banco continua sendo a referência
+entre processos.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import metrics, models
+from app.config import settings
+
+NULL_NUM_CUPOM = -1
+
+_KEY_COLUMNS = ('ticket_code', 'num_cupom', 'operation_type')
+
+
+def item_key(row: dict) -> tuple:
+    num_cupom = row['num_cupom'] if row['num_cupom'] is not None else NULL_NUM_CUPOM
+    return row['ticket_code'], num_cupom, row['operation_type']
+
+
+class RecentKeys:
+    """LRU de chave -> (id, impressão do corpo) dos itens aceitos por este processo."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, row: dict) -> int | None:
+        """Id do item já aceito com a mesma chave e o mesmo corpo, ou None."""
+        if not self.max_size:
+            return None
+        fingerprint = hash(tuple(row.values()))
+        with self._lock:
+            entry = self._entries.get(item_key(row))
+            if entry is None or entry[1] != fingerprint:
+                return None
+            self._entries.move_to_end(item_key(row))
+            return entry[0]
+
+    def remember(self, rows: list[dict], ids: list[int]):
+        if not self.max_size:
+            return
+        with self._lock:
+            for row, item_id in zip(rows, ids):
+                key = item_key(row)
+                self._entries[key] = (item_id, hash(tuple(row.values())))
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DedupStats:
+    """Duplicatas suprimidas por origem: ``memory`` (LRU), ``batch`` (repetidas no
+    mesmo lote) e ``database`` (chave já gravada)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.suppressed = {"memory": 0, "batch": 0, "database": 0}
+
+    def record(self, source: str, count: int = 1):
+        if not count:
+            return
+        with self._lock:
+            self.suppressed[source] += count
+        metrics.record_duplicates(source, count)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "duplicates_suppressed": dict(self.suppressed),
+                "dedup_cache_size": len(recent),
+            }
+
+
+recent = RecentKeys(settings.INGEST_DEDUP_CACHE_SIZE)
+stats = DedupStats()
+
+
+def claim(db: Session, rows: list[dict], ids: list[int], created: list[datetime]) -> set[tuple]:
+    """Grava as chaves de itens recém-inseridos; retorna as que eram novas.
+
+    Linhas cuja chave não volta já existiam (ou foram gravadas por uma
+    transação concorrente, que o banco faz esperar até o commit).
+    """
+    dialect = db.get_bind().dialect.name
+    insert_fn = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    key = models.ItemKeyModel
+    stmt = insert_fn(key).on_conflict_do_nothing(index_elements=list(_KEY_COLUMNS)).returning(
+        key.ticket_code, key.num_cupom, key.operation_type
+    )
+    values = [
+        {**dict(zip(_KEY_COLUMNS, item_key(row))), 'item_id': item_id, 'created_at': created_at}
+        for row, item_id, created_at in zip(rows, ids, created)
+    ]
+    # Ordem estável das chaves evita deadlock entre lotes concorrentes
+    values.sort(key=lambda value: (value['ticket_code'], value['num_cupom'], value['operation_type']))
+    return {tuple(claimed) for claimed in db.execute(stmt, values)}
+
+
+def rebuild(db: Session, start: date, end: date) -> int:
+    """Grava as chaves que faltam dos itens com ``created_at`` em ``[start, end]``.
+
+    Para cargas que gravam ``items`` sem passar por ``claim`` (``app.datagen``).
+    Chaves já existentes são mantidas; entre itens repetidos do período fica
+    um deles. Retorna o número de chaves gravadas.
+    """
+    dialect = db.get_bind().dialect.name
+    insert_fn = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    key = models.ItemKeyModel
+    item = models.ItemModel
+    rows = (
+        select(
+            item.ticket_code,
+            func.coalesce(item.num_cupom, NULL_NUM_CUPOM),
+            models.OperationTypeModel.name,
+            item.id,
+            item.created_at,
+        )
+        .join(models.OperationTypeModel, models.OperationTypeModel.id == item.operation_type_id)
+        # O WHERE também evita a ambiguidade do SQLite entre o SELECT e o ON CONFLICT
+        .where(
+            item.created_at >= datetime.combine(start, time.min),
+            item.created_at < datetime.combine(end + timedelta(days=1), time.min),
+        )
+    )
+    stmt = insert_fn(key).from_select([*_KEY_COLUMNS, 'item_id', 'created_at'], rows)
+    stmt = stmt.on_conflict_do_nothing(index_elements=list(_KEY_COLUMNS))
+    count = db.execute(stmt).rowcount
+    db.commit()
+    return count
+
+
+def existing_items(db: Session, keys: list[tuple]) -> dict[tuple, models.ItemModel]:
+    """Itens já gravados para ``keys``."""
+    key = models.ItemKeyModel
+    item = models.ItemModel
+    stmt = (
+        select(key.ticket_code, key.num_cupom, key.operation_type, item)
+        # created_at na junção deixa o PostgreSQL podar as partições
+        .join(item, (item.id == key.item_id) & (item.created_at == key.created_at))
+        .where(tuple_(key.ticket_code, key.num_cupom, key.operation_type).in_(keys))
+    )
+    return {tuple(row[:3]): row[3] for row in db.execute(stmt)}
@@ -0,0 +1,170 @@
+# dictionary.py
+"""Codificação por dicionário das colunas repetitivas de ``items``.
+
+``operation_type``, ``hostname`` e ``message`` são gravados em ``items`` como
+ids (``smallint`` nos dois primeiros) de ``operation_types``, ``hostnames`` e
+``messages``; cada rótulo aparece uma única vez, na tabela de dicionário.
+
+- Ingestão: ``encode_rows`` troca os rótulos pelos ids consultando um cache em
+  memória por banco. Rótulos novos são inseridos com ``ON CONFLICT DO NOTHING``
+  na transação da própria ingestão e só entram no cache depois do commit.
+- Filtros: ``ids`` traduz os rótulos antes da consulta, sem junção.
+- Agregações agrupam pelos ids e traduzem só as linhas do resultado com
+  ``labels``; consultas que devolvem itens fazem a junção (``with_labels``).
+"""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+
+_PENDING = "dictionary_pending"
+
+
+def _bind_key(db: Session) -> Engine:
+    # Ids valem por banco; a engine identifica o banco sem formatar a URL a cada chamada
+    return db.get_bind().engine
+
+
+class Dictionary:
+    """Rótulo <-> id de uma tabela de dicionário, com cache por banco."""
+
+    def __init__(self, model, column: str):
+        self.model = model
+        self.column = column
+        self.id_column = getattr(models.ItemModel, f"{column}_id")
+        # Rótulo na posição e com o nome da antiga coluna de items
+        self.label = model.name.label(column)
+        # LRU por banco, com até DICTIONARY_CACHE_SIZE entradas em cada sentido
+        self._ids: dict[Engine, OrderedDict[str, int]] = {}
+        self._labels: dict[Engine, OrderedDict[int, str]] = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, key: Engine, pairs):
+        with self._lock:
+            ids = self._ids.setdefault(key, OrderedDict())
+            labels = self._labels.setdefault(key, OrderedDict())
+            for item_id, name in pairs:
+                ids[name] = item_id
+                ids.move_to_end(name)
+                labels[item_id] = name
+                labels.move_to_end(item_id)
+            # Descarta só os menos usados: rótulos frequentes continuam no cache
+            while len(ids) > settings.DICTIONARY_CACHE_SIZE:
+                ids.popitem(last=False)
+            while len(labels) > settings.DICTIONARY_CACHE_SIZE:
+                labels.popitem(last=False)
+
+    def _cached(self, cache: dict, key: Engine, values) -> dict:
+        """Entradas de ``values`` presentes em ``cache``, marcadas como recém-usadas."""
+        with self._lock:
+            entries = cache.get(key)
+            if not entries:
+                return {}
+            found = {}
+            for value in values:
+                if value in entries:
+                    entries.move_to_end(value)
+                    found[value] = entries[value]
+            return found
+
+    def _fetch(self, db: Session, condition) -> list[tuple[int, str]]:
+        return [tuple(row) for row in db.execute(select(self.model.id, self.model.name).where(condition))]
+
+    def ids(self, db: Session, labels) -> list[int]:
+        """Ids de ``labels`` já gravados; rótulos desconhecidos não casam com nenhum item."""
+        key = _bind_key(db)
+        known = self._cached(self._ids, key, labels)
+        missing = [label for label in labels if label not in known]
+        if missing:
+            # Ids nunca mudam: só os rótulos ainda não vistos vão ao banco
+            fetched = self._fetch(db, self.model.name.in_(missing))
+            self._remember(key, fetched)
+            known.update((name, item_id) for item_id, name in fetched)
+        return [known[label] for label in labels if label in known]
+
+    def labels(self, db: Session, ids) -> dict[int, str]:
+        """Rótulo de cada id de ``ids`` (nulos e ids inexistentes ficam de fora)."""
+        key = _bind_key(db)
+        known = self._cached(self._labels, key, {item_id for item_id in ids if item_id is not None})
+        missing = {item_id for item_id in ids if item_id is not None and item_id not in known}
+        if missing:
+            fetched = self._fetch(db, self.model.id.in_(missing))
+            self._remember(key, fetched)
+            known.update(fetched)
+        return {item_id: known[item_id] for item_id in ids if item_id in known}
+
+    def encode(self, db: Session, labels) -> dict[str, int]:
+        """Id de cada rótulo, inserindo os que ainda não existem (sem commit)."""
+        key = _bind_key(db)
+        pending = db.info.get(_PENDING, {}).get((self, key), {})
+        wanted = {label for label in labels if label is not None}
+        cached = self._cached(self._ids, key, wanted)
+        encoded = {}
+        for label in wanted:
+            item_id = cached.get(label, pending.get(label))
+            if item_id is not None:
+                encoded[label] = item_id
+        missing = sorted(wanted - encoded.keys())
+        if not missing:
+            return encoded
+
+        dialect = db.get_bind().dialect.name
+        insert_fn = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        # Ordem estável evita deadlock entre ingestões que criam os mesmos rótulos
+        db.execute(
+            insert_fn(self.model).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': label} for label in missing],
+        )
+        created = self._fetch(db, self.model.name.in_(missing))
+        # Um rótulo inserido aqui só existe para os outros após o commit
+        db.info.setdefault(_PENDING, {}).setdefault((self, key), {}).update(
+            {name: item_id for item_id, name in created}
+        )
+        encoded.update({name: item_id for item_id, name in created})
+        return encoded
+
+
+operation_types = Dictionary(models.OperationTypeModel, 'operation_type')
+hostnames = Dictionary(models.HostnameModel, 'hostname')
+messages = Dictionary(models.MessageModel, 'message')
+DICTIONARIES = (operation_types, hostnames, messages)
+
+
+def encode_rows(db: Session, rows: list[dict]) -> list[dict]:
+    """Linhas prontas para ``insert(ItemModel)``: rótulos trocados pelos ids."""
+    rows = [dict(row) for row in rows]
+    for dictionary in DICTIONARIES:
+        column = dictionary.column
+        encoded = dictionary.encode(db, {row[column] for row in rows})
+        id_column = dictionary.id_column.key
+        for row in rows:
+            label = row.pop(column)
+            row[id_column] = encoded[label] if label is not None else None
+    return rows
+
+
+def with_labels(stmt, *dictionaries):
+    """Junta ``stmt`` (sobre ``items``) às tabelas de ``dictionaries`` (padrão: todas)."""
+    stmt = stmt.select_from(models.ItemModel)
+    for dictionary in dictionaries or DICTIONARIES:
+        stmt = stmt.outerjoin(dictionary.model, dictionary.model.id == dictionary.id_column)
+    return stmt
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session):
+    for (dictionary, key), created in session.info.pop(_PENDING, {}).items():
+        dictionary._remember(key, ((item_id, name) for name, item_id in created.items()))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session: Session, transaction):
+    # Rollback ou close sem commit: os rótulos inseridos deixaram de existir
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
@@ -0,0 +1,176 @@
+# export.py
+"""Exportação de itens em streaming (CSV, Parquet ou Arrow IPC).
+
+O resultado é lido com cursor do lado do servidor em blocos de tamanho fixo e
+cada bloco é serializado e enviado antes de buscar o próximo, de modo que a
+memória fica constante independente do tamanho da exportação.
+"""
+import csv
+import io
+import itertools
+from datetime import datetime
+from typing import Iterator
+
+from app import archive, dictionary, models
+from app.database import analytics_db_context
+
+EXPORT_COLUMNS = {
+    "ticket_code": models.ItemModel.ticket_code,
+    "num_cupom": models.ItemModel.num_cupom,
+    "num_caixa": models.ItemModel.num_caixa,
+    "hostname": dictionary.hostnames.label,
+    "num_ped_ecf": models.ItemModel.num_ped_ecf,
+    "vl_total": models.ItemModel.vl_total,
+    "operation_type": dictionary.operation_types.label,
+    "success": models.ItemModel.success,
+    "created_at": models.ItemModel.created_at,
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class _DrainableBuffer(io.RawIOBase):
+    """Destino de escrita do pyarrow que entrega o que foi escrito a cada bloco."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _CsvWriter:
+    def __init__(self):
+        self._header_written = False
+
+    def write(self, rows) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not self._header_written:
+            writer.writerow(EXPORT_COLUMNS)
+            self._header_written = True
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+
+    def close(self) -> bytes:
+        # Exportação vazia ainda devolve o cabeçalho
+        return self.write([]) if not self._header_written else b""
+
+
+class _ArrowWriter:
+    def __init__(self, fmt: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.schema = pa.schema([
+            ("ticket_code", pa.string()),
+            ("num_cupom", pa.int64()),
+            ("num_caixa", pa.int64()),
+            ("hostname", pa.string()),
+            ("num_ped_ecf", pa.string()),
+            ("vl_total", pa.float64()),
+            ("operation_type", pa.string()),
+            ("success", pa.bool_()),
+            ("created_at", pa.timestamp("us")),
+        ])
+        self._sink = _DrainableBuffer()
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(self._sink, self.schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def write_batch(self, batch) -> bytes:
+        self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def write(self, rows) -> bytes:
+        columns = list(zip(*rows))
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+def _make_writer(fmt: str):
+    if fmt == "csv":
+        return _CsvWriter()
+    return _ArrowWriter(fmt)
+
+
+def iter_export(
+    fmt: str,
+    start_date: datetime,
+    end_date: datetime,
+    operation_types: tuple[str, ...],
+    search_term: str | None = None,
+    sort_by: str | None = None,
+    sort_order: str = 'desc',
+    chunk_size: int = 50_000,
+) -> Iterator[bytes]:
+    """Gera os bytes da exportação bloco a bloco.
+
+    A sessão é aberta dentro do gerador porque precisa viver enquanto a resposta
+    é transmitida, depois que as dependências da requisição já foram encerradas.
+    O trecho anterior ao cutoff do arquivo sai do Parquet (ver
+    ``app.archive.table_rows``), junto das linhas do banco na mesma ordem.
+    """
+    # app.repository traz o pandas; a API só o importa quando precisa
+    from app.repository import _apply_filters_and_sorting, _archived_rows, _merge_tiers
+
+    writer = _make_writer(fmt)
+    archived, hot = archive.split_tiers(start_date, end_date)
+    with analytics_db_context() as db:
+        query = None
+        if hot is not None:
+            columns = list(EXPORT_COLUMNS.values())
+            if archived is not None:
+                # O id vai no fim de cada linha para o desempate de _merge_tiers
+                columns.append(models.ItemModel.id)
+            query = _apply_filters_and_sorting(
+                dictionary.with_labels(db.query(*columns), dictionary.hostnames, dictionary.operation_types),
+                *hot, operation_types, search_term, sort_by, sort_order,
+            )
+            if archived is not None:
+                query = query.order_by(models.ItemModel.id.desc())
+        if archived is None and fmt != "csv":
+            # Blocos do cursor direto em RecordBatches, sem um Row por linha (ver app.frames)
+            from app import frames
+
+            chunks = frames.iter_batches(db, query.statement, chunk_size)
+            write = writer.write_batch
+        else:
+            result = [] if query is None else db.execute(query.statement, execution_options={"yield_per": chunk_size})
+            if archived is None:
+                chunks = result.partitions()
+            else:
+                archived_rows = _archived_rows(db, archived, operation_types, search_term, sort_by, sort_order)
+                merged = _merge_tiers(db, iter(result), archived_rows, sort_by, sort_order)
+                chunks = iter(lambda: list(itertools.islice(merged, chunk_size)), [])
+            write = writer.write
+        for chunk in chunks:
+            data = write(chunk)
+            if data:
+                yield data
+    data = writer.close()
+    if data:
+        yield data
@@ -0,0 +1,184 @@
+# frames.py
+"""Carga da tabela analítica direto em colunas Arrow, sem um objeto Python por célula.
+
+- PostgreSQL: ``COPY (consulta) TO STDOUT`` em CSV para um arquivo temporário,
+  lido pelo parser multithread do pyarrow.
+- Outros bancos: cursor DBAPI em blocos de ``chunk_size`` linhas; cada bloco
+  vira um RecordBatch e as tuplas do bloco são descartadas em seguida.
+
+A exportação em Parquet e Arrow IPC lê os mesmos blocos (``iter_batches``), em
+qualquer banco, e os grava sem passar por tuplas.
+
+Os rótulos ("Sim"/"Não", "Sucesso"/"Falha") são calculados de forma vetorizada
+e, junto com o hostname, ficam como ``category``; os demais textos ficam nos
+buffers do Arrow (``string[pyarrow]``).
+"""
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+from app import profiler
+
+MANUAL_VALIDATION = "MANUAL_VALIDATION"
+
+# Colunas de repository.TABLE_COLUMNS, na mesma ordem
+_FIELDS = (
+    "ticket_code", "num_cupom", "num_caixa", "hostname", "num_ped_ecf",
+    "vl_total", "operation_type", "success", "created_at",
+)
+
+FRAME_COLUMNS = {
+    "ticket_code": "Ticket Code",
+    "num_cupom": "Num Cupom",
+    "num_caixa": "Num Caixa",
+    "hostname": "Hostname",
+    "num_ped_ecf": "Num Ped ECF",
+    "vl_total": "Valor Total",
+    "operation_type": "Validação Manual",
+    "success": "Status",
+    "created_at": "Criado em",
+}
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("ticket_code", pa.string()),
+        ("num_cupom", pa.int64()),
+        ("num_caixa", pa.int64()),
+        ("hostname", pa.string()),
+        ("num_ped_ecf", pa.string()),
+        ("vl_total", pa.float64()),
+        ("operation_type", pa.string()),
+        ("success", pa.bool_()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+
+def _batch(rows, schema):
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) or [()] * len(schema)
+    # cast converte os tipos crus do driver (texto ISO no created_at, 0/1 no success do SQLite)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column).cast(field.type) for column, field in zip(columns, schema)], schema=schema
+    )
+
+
+def _copy_table(db: Session, stmt: Select):
+    import pyarrow.csv as pacsv
+
+    schema = _schema()
+    compiled = stmt.compile(dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    connection = db.connection()
+    cursor = connection.connection.driver_connection.cursor()
+    # COPY não aceita parâmetros; o psycopg2 os interpola já escapados
+    sql = cursor.mogrify(str(compiled), compiled.params).decode()
+    with tempfile.TemporaryFile() as buffer:
+        start = time.perf_counter()
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", buffer)
+        # O COPY vai direto ao driver, sem os eventos da engine
+        profiler.observe(connection, str(compiled), compiled.params, (time.perf_counter() - start) * 1000)
+        buffer.seek(0)
+        return pacsv.read_csv(
+            buffer,
+            read_options=pacsv.ReadOptions(column_names=list(schema.names)),
+            # Campos de texto livres podem ter quebra de linha entre aspas
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(
+                column_types=schema,
+                # Vazio sem aspas é NULL no COPY; "" entre aspas é string vazia
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+                true_values=["t"],
+                false_values=["f"],
+            ),
+        )
+
+
+def iter_batches(db: Session, stmt: Select, chunk_size: int = 10_000):
+    """RecordBatches de ``stmt`` (colunas de ``repository.TABLE_COLUMNS``) lidos em blocos.
+
+    Tuplas cruas do cursor DBAPI, sem Row nem conversão de tipos por célula no
+    SQLAlchemy; no PostgreSQL o cursor é nomeado (do lado do servidor). Só um
+    bloco de tuplas existe por vez.
+    """
+    schema = _schema()
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+        # stream_results do SQLAlchemy já buscaria a primeira linha no cursor
+        cursor = connection.connection.driver_connection.cursor(name=f"frames_{id(stmt):x}")
+        start = time.perf_counter()
+        cursor.execute(str(compiled), compiled.params)
+        # Execução direta no driver, sem os eventos da engine
+        profiler.observe(connection, str(compiled), compiled.params, (time.perf_counter() - start) * 1000)
+        close = cursor.close
+    else:
+        result = connection.execute(stmt)
+        cursor, close = result.cursor, result.close
+    try:
+        while rows := cursor.fetchmany(chunk_size):
+            yield _batch(rows, schema)
+    finally:
+        close()
+
+
+def _fetch_table(db: Session, stmt: Select, chunk_size: int):
+    import pyarrow as pa
+
+    return pa.Table.from_batches(list(iter_batches(db, stmt, chunk_size)), schema=_schema())
+
+
+def to_frame(table) -> pd.DataFrame:
+    """DataFrame com os nomes e rótulos exibidos no dashboard."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    manual = pc.fill_null(pc.equal(table["operation_type"], MANUAL_VALIDATION), False)
+    success = pc.fill_null(table["success"], False)
+    table = table.drop_columns(["operation_type", "success"])
+    # O hostname vira category já no Arrow, sem um objeto Python por linha
+    position = table.schema.get_field_index("hostname")
+    table = table.set_column(position, "hostname", pc.dictionary_encode(table["hostname"]))
+    # Int64 em vez do float que o pandas usaria para colunas inteiras com nulos;
+    # textos ficam nos buffers do Arrow (string[pyarrow]) em vez de um str por célula
+    frame = table.to_pandas(types_mapper={
+        pa.int64(): pd.Int64Dtype(), pa.string(): pd.StringDtype("pyarrow"),
+    }.get)
+    frame["operation_type"] = pd.Categorical.from_codes(
+        np.where(manual.to_numpy(zero_copy_only=False), 0, 1), categories=["Sim", "Não"]
+    )
+    frame["success"] = pd.Categorical.from_codes(
+        np.where(success.to_numpy(zero_copy_only=False), 0, 1), categories=["Sucesso", "Falha"]
+    )
+    return frame[list(_FIELDS)].rename(columns=FRAME_COLUMNS)
+
+
+def load_frame(db: Session, stmt: Select, chunk_size: int = 10_000) -> pd.DataFrame:
+    """Executa ``stmt`` (colunas de ``repository.TABLE_COLUMNS``) e monta o DataFrame."""
+    if db.get_bind().dialect.name == "postgresql":
+        table = _copy_table(db, stmt)
+    else:
+        table = _fetch_table(db, stmt, chunk_size)
+    return to_frame(table)
+
+
+def rows_to_frame(rows) -> pd.DataFrame:
+    """Mesmo DataFrame de ``load_frame`` a partir de linhas já lidas."""
+    import pyarrow as pa
+
+    schema = _schema()
+    return to_frame(pa.Table.from_batches([_batch(rows, schema)], schema=schema))
+
+
+def concat(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatena preservando os tipos ``category``."""
+    frame = pd.concat(frames, ignore_index=True)
+    # Categorias diferentes viram object no concat
+    return frame.astype({FRAME_COLUMNS["hostname"]: "category"})
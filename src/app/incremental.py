@@ -0,0 +1,132 @@
+# incremental.py
+"""Atualização incremental dos resultados em cache a partir das linhas novas de ``items``.
+
+O estado guardado no cache tem o resultado, o ``settled_id`` e os ids acima
+dele já somados ao resultado:
+
+- ``settled_id`` é o maior id entre as linhas criadas há mais de
+  ``INCREMENTAL_SETTLE_SECONDS``. Abaixo dele não se espera mais nenhum commit
+  atrasado.
+- Acima dele, um id menor pode ficar visível depois de um maior (transações
+  concorrentes). Por isso os ids já somados são lembrados.
+
+Cada atualização lê só as linhas com ``id > settled_id`` que passam no filtro
+e ainda não foram somadas. Assim o custo acompanha o volume novo, não o
+intervalo consultado.
+
+``created_at`` é a hora do insert (no PostgreSQL, o início da transação), não
+a do commit. Uma ingestão que fica aberta além da janela (presa atrás do
+``LOCK TABLE`` de um rebuild, um lote lento) pode fazer commit com ids abaixo
+de um ``settled_id`` já usado; ``commit_items`` detecta esse caso e avança a
+geração do cache, e os resultados são recalculados do zero.
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+
+from app import dictionary, models
+from app.config import settings
+
+
+@contextmanager
+def snapshot_session(db: Session):
+    """Sessão separada em que todas as consultas enxergam o mesmo instante dos dados."""
+    bind = db.get_bind()
+    with Session(bind=bind) as snapshot:
+        if bind.dialect.name == "postgresql":
+            snapshot.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        else:
+            # O pysqlite só abre transação em escrita; o BEGIN explícito fixa o snapshot de leitura
+            snapshot.execute(text("BEGIN"))
+        yield snapshot
+
+
+_BEGAN = "incremental_began"
+
+
+@event.listens_for(Session, "after_begin")
+def _remember_begin(session: Session, transaction, connection):
+    # Relógio local, lido antes do BEGIN: a duração medida nunca é menor que a do banco
+    session.info.setdefault(_BEGAN, time.monotonic())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_begin(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_BEGAN, None)
+
+
+def commit_items(db: Session) -> None:
+    """Commit de uma transação que inseriu em ``items``.
+
+    Se ela durou metade de ``INCREMENTAL_SETTLE_SECONDS`` ou mais, as linhas
+    podem ter ficado abaixo de um ``settled_id`` calculado antes do commit:
+    invalida o cache em vez de deixá-las fora dos resultados incrementais.
+    """
+    began = db.info.get(_BEGAN)
+    db.commit()
+    if began is not None and time.monotonic() - began >= settings.INCREMENTAL_SETTLE_SECONDS / 2:
+        # app.cache importa este módulo
+        from app import cache
+
+        cache.invalidate_all()
+
+
+def settled_id(db: Session) -> int:
+    item = models.ItemModel
+    seconds = settings.INCREMENTAL_SETTLE_SECONDS
+    # created_at usa o relógio do banco (server_default); a comparação também
+    if db.get_bind().dialect.name == "postgresql":
+        boundary = func.localtimestamp() - text(f"interval '{int(seconds)} seconds'")
+    else:
+        boundary = func.datetime("now", f"-{int(seconds)} seconds")
+    # ORDER BY id DESC LIMIT 1 percorre a PK de trás para frente e para na primeira linha antiga
+    stmt = select(item.id).where(item.created_at <= boundary).order_by(item.id.desc()).limit(1)
+    return db.scalar(stmt) or 0
+
+
+class Incremental:
+    """Como somar linhas novas de ``items`` a um resultado já calculado.
+
+    ``columns`` são as colunas de ``items`` (ou rótulos de ``app.dictionary``)
+    lidas para as linhas novas e ``merge(db, value, rows, *args)`` devolve o
+    resultado atualizado. Os três primeiros argumentos da função em cache
+    precisam ser ``start_date``, ``end_date`` e ``operation_types``.
+    """
+
+    def __init__(self, columns, merge):
+        self.columns = columns
+        self.merge = merge
+
+    def _rows(self, db: Session, after_id: int, start_date: datetime, end_date: datetime,
+              operation_types: tuple[str, ...], *args):
+        item = models.ItemModel
+        stmt = (
+            dictionary.with_labels(select(item.id, *self.columns))
+            .where(
+                item.id > after_id,
+                item.created_at.between(start_date, end_date),
+                item.operation_type_id.in_(dictionary.operation_types.ids(db, operation_types)),
+            )
+            .order_by(item.id)
+        )
+        return db.execute(stmt).all()
+
+    def build(self, db: Session, compute, *args) -> dict:
+        """Cálculo completo, com o estado incremental lido no mesmo snapshot."""
+        with snapshot_session(db) as snapshot:
+            value = compute(snapshot, *args)
+            settled = settled_id(snapshot)
+            seen = {row.id for row in self._rows(snapshot, settled, *args)}
+        return {"value": value, "settled_id": settled, "seen": seen}
+
+    def refresh(self, db: Session, state: dict, *args) -> dict:
+        settled = max(settled_id(db), state["settled_id"])
+        seen = state["seen"]
+        rows = [row for row in self._rows(db, state["settled_id"], *args) if row.id not in seen]
+        value = self.merge(db, state["value"], rows, *args) if rows else state["value"]
+        seen = {row_id for row_id in seen | {row.id for row in rows} if row_id > settled}
+        return {"value": value, "settled_id": settled, "seen": seen}
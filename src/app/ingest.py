@@ -0,0 +1,320 @@
+# ingest.py
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, timedelta
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+from app import crud, metrics, schemas
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class _InvalidRecord:
+    def __init__(self, error: str):
+        self.error = error
+
+
+def _format_errors(exc: ValidationError) -> list[str]:
+    return [
+        f"{'.'.join(str(part) for part in error['loc']) or 'body'}: {error['msg']}"
+        for error in exc.errors(include_url=False)
+    ]
+
+
+def _check_size(count: int):
+    if count > settings.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lote excede o limite de {settings.BULK_MAX_ITEMS} itens",
+        )
+
+
+async def _read_ndjson(request: Request) -> list:
+    """Lê o corpo NDJSON em streaming, decodificando uma linha por vez."""
+    records = []
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                records.append(_decode_line(line))
+        _check_size(len(records))
+    if buffer.strip():
+        records.append(_decode_line(buffer))
+        _check_size(len(records))
+    return records
+
+
+def _decode_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        # Linha inválida vira um registro rejeitado, sem derrubar o lote inteiro
+        return _InvalidRecord(f"body: JSON inválido ({exc})")
+
+
+async def read_bulk_payload(request: Request) -> list:
+    """Retorna a lista de registros brutos de um corpo JSON (array) ou NDJSON."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        return await _read_ndjson(request)
+
+    body = await request.body()
+    try:
+        records = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corpo JSON inválido")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Esperado um array JSON de itens")
+    _check_size(len(records))
+    return records
+
+
+def validate_records(
+    records: list,
+) -> tuple[list[schemas.ItemCreate], list[schemas.BulkItemResult]]:
+    """Valida todos os registros de uma vez.
+
+    Retorna os itens válidos e um resultado por registro, na ordem original. Os
+    resultados aceitos ainda não têm ``id``; ele é preenchido após a gravação.
+    """
+    valid = []
+    results = []
+    for index, record in enumerate(records):
+        if isinstance(record, _InvalidRecord):
+            results.append(schemas.BulkItemResult(index=index, accepted=False, errors=[record.error]))
+            continue
+        try:
+            item = schemas.ItemCreate.model_validate(record)
+        except ValidationError as exc:
+            results.append(schemas.BulkItemResult(index=index, accepted=False, errors=_format_errors(exc)))
+            continue
+        valid.append(item)
+        results.append(schemas.BulkItemResult(index=index, accepted=True))
+    return valid, results
+
+
+_STOP = object()
+
+
+class BatchStats:
+    """Contadores do escritor em lote, lidos pelo endpoint de estatísticas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+        self.max_batch_size = 0
+        self.total_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.last_flush_seconds = 0.0
+
+    def record(self, size: int, elapsed: float):
+        with self._lock:
+            self.batches += 1
+            self.rows += size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.total_flush_seconds += elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.last_flush_seconds = elapsed
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            batches = self.batches or 1
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "errors": self.errors,
+                "avg_batch_size": self.rows / batches,
+                "max_batch_size": self.max_batch_size,
+                "avg_flush_ms": self.total_flush_seconds / batches * 1000,
+                "max_flush_ms": self.max_flush_seconds * 1000,
+                "last_flush_ms": self.last_flush_seconds * 1000,
+            }
+
+
+class BatchWriter:
+    """Write-behind para ``POST /items/``.
+
+    Os itens entram em uma fila em memória e uma thread de fundo grava a fila em
+    group commits assim que acumula ``max_rows`` itens ou ``max_wait_ms`` passa
+    desde o primeiro item do lote. Cada requisição só é respondida depois do
+    commit do lote em que entrou; se o lote falha, os itens são regravados um a
+    um e só a requisição do item com problema recebe o erro.
+    """
+
+    def __init__(self, session_factory, max_rows: int, max_wait_ms: int, max_queue_size: int,
+                 flush_timeout_s: float = 30.0):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self.flush_timeout = flush_timeout_s
+        self.stats = BatchStats()
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ingest-batch-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Grava o que ainda está na fila e encerra a thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, item: schemas.ItemCreate) -> Future:
+        future = Future()
+        self._queue.put_nowait((item, future))
+        return future
+
+    async def write(self, item: schemas.ItemCreate, timeout: float) -> schemas.Item:
+        """Enfileira o item e aguarda o commit do lote.
+
+        ``timeout`` só vale enquanto o item está na fila: o 503 garante que ele
+        não será gravado. Se a thread já o tirou da fila, a resposta espera o
+        commit por mais ``flush_timeout`` segundos e depois responde 504: o item
+        ainda pode ser gravado, e uma nova tentativa do cliente cai na
+        deduplicação (ver app.dedup).
+        """
+        try:
+            future = self.submit(item)
+        except queue.Full:
+            raise HTTPException(status_code=503, detail="Fila de ingestão cheia")
+        result = asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), timeout=timeout)
+        except TimeoutError:
+            # Só cancela o que ainda não saiu da fila (ver _claim)
+            if future.cancel():
+                raise HTTPException(status_code=503, detail="Tempo de gravação esgotado")
+        try:
+            return await asyncio.wait_for(result, timeout=self.flush_timeout)
+        except TimeoutError:
+            raise HTTPException(status_code=504, detail="Gravação do lote sem resposta")
+
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    @staticmethod
+    def _claim(entry) -> bool:
+        """Marca o item como em gravação ao sair da fila; False se a requisição já desistiu."""
+        return entry[1].set_running_or_notify_cancel()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            if not self._claim(entry):
+                continue
+            batch = [entry]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                if self._claim(entry):
+                    batch.append(entry)
+            self._write(batch)
+
+        # Esvazia a fila no desligamento para não perder itens já aceitos
+        leftover = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP and self._claim(entry):
+                leftover.append(entry)
+        for i in range(0, len(leftover), self.max_rows):
+            self._write(leftover[i:i + self.max_rows])
+
+    def _write(self, batch: list[tuple[schemas.ItemCreate, Future]]):
+        start = time.perf_counter()
+        try:
+            with self.session_factory() as db:
+                ids, duplicates = crud.create_items_bulk(db, [item for item, _ in batch])
+        except Exception as exc:
+            logger.exception("Falha ao gravar lote de %d itens", len(batch))
+            self.stats.record_error()
+            if len(batch) == 1:
+                batch[0][1].set_exception(exc)
+                return
+            # Um item ruim não derruba o lote: cada item vai em sua própria
+            # transação e só a requisição dele recebe o erro
+            for entry in batch:
+                self._write([entry])
+            return
+        self.stats.record(len(batch), time.perf_counter() - start)
+        metrics.record_ingest("batched", duplicates.count(False))
+        for (item, future), item_id in zip(batch, ids):
+            future.set_result(schemas.Item(id=item_id, **item.model_dump()))
+
+
+class SketchCompactor:
+    """Thread que junta as linhas de ``items_daily_sketches`` gravadas pela
+    ingestão (uma por chave a cada lote), a cada ``interval_s`` segundos.
+
+    Só olha os ``days`` dias mais recentes, os únicos que a ingestão ainda
+    escreve; os demais ficam com ``python -m app.sketches compact``.
+    """
+
+    def __init__(self, session_factory, interval_s: float, days: int = 2):
+        self.session_factory = session_factory
+        self.interval = interval_s
+        self.days = days
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sketch-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def run_once(self) -> int:
+        # pandas só é carregado na primeira compactação, não na subida
+        from app import sketches
+
+        with self.session_factory() as db:
+            return sketches.compact(db, date.today() - timedelta(days=self.days - 1))
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Falha ao compactar os sketches diários")
@@ -1,18 +1,52 @@
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Literal
 import logging
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app import crud, models, schemas
+from app import analytics, cache, crud, dedup, export, ingest, metrics, migrations, schemas
 from app.config import settings
-from app.database import engine, get_db
-
-models.Base.metadata.create_all(bind=engine)
+from app.database import MaintenanceSessionLocal, SessionLocal, engine, get_async_db, get_db
 
 logger = logging.getLogger(__name__)
 
+batch_writer = None
+if settings.INGEST_MODE == "batched":
+    batch_writer = ingest.BatchWriter(
+        SessionLocal,
+        max_rows=settings.INGEST_BATCH_MAX_ROWS,
+        max_wait_ms=settings.INGEST_BATCH_MAX_WAIT_MS,
+        max_queue_size=settings.INGEST_QUEUE_MAX_SIZE,
+        # Cada comando do lote é limitado pelo statement_timeout da ingestão
+        flush_timeout_s=settings.INGEST_STATEMENT_TIMEOUT_MS / 1000 + settings.INGEST_REQUEST_TIMEOUT_S,
+    )
+
+sketch_compactor = None
+if settings.SKETCH_COMPACT_INTERVAL_S > 0:
+    sketch_compactor = ingest.SketchCompactor(MaintenanceSessionLocal, settings.SKETCH_COMPACT_INTERVAL_S)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Na subida do worker, não ao importar o módulo (ver app.migrations)
+    await run_in_threadpool(migrations.prepare, engine)
+    if batch_writer is not None:
+        batch_writer.start()
+    if sketch_compactor is not None:
+        sketch_compactor.start()
+    yield
+    if batch_writer is not None:
+        await run_in_threadpool(batch_writer.stop)
+    if sketch_compactor is not None:
+        await run_in_threadpool(sketch_compactor.stop)
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title=settings.APP_NAME,
     description="",
     summary="API REST - Swagger Documentation",
@@ -28,6 +62,16 @@ app = FastAPI(
     },
 )
 
+app.include_router(analytics.router)
+
+if settings.METRICS_ENABLED:
+    metrics.install(app)
+
+# Rotas de /items que usam sessão do banco. Só um dos dois routers é incluído,
+# conforme DATABASE_ASYNC (ver o fim do módulo).
+items_router = APIRouter(tags=["items"])
+async_items_router = APIRouter(tags=["items"])
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -56,25 +100,253 @@ async def root():
     return {"message": "Hello World"}
 
 
-@app.post("/items/", response_model=schemas.Item)
-def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db)):
-    return crud.create_item(db=db, item=item)
+async def create_item_batched(item: schemas.ItemCreate):
+    return await batch_writer.write(item, timeout=settings.INGEST_REQUEST_TIMEOUT_S)
+
+
+async def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db)):
+    db_item, duplicate = await run_in_threadpool(crud.create_item, db=db, item=item)
+    if not duplicate:
+        metrics.record_ingest("single", 1)
+    return db_item
+
+
+# No modo batched quem grava é a thread do BatchWriter: a rota não abre sessão
+items_router.add_api_route(
+    "/items/", create_item_batched if batch_writer is not None else create_item,
+    methods=["POST"], response_model=schemas.Item,
+)
+
+
+_BULK_ITEMS_SCHEMA = {
+    "type": "array",
+    "items": {"$ref": "#/components/schemas/ItemCreate"},
+}
+
+
+_BULK_OPENAPI_EXTRA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": _BULK_ITEMS_SCHEMA},
+            "application/x-ndjson": {"schema": {"$ref": "#/components/schemas/ItemCreate"}},
+        },
+    }
+}
+
+
+def _bulk_response(
+    items: list, results: list, ids: list[int], duplicates: list[bool],
+) -> schemas.BulkItemsResponse:
+    accepted = (result for result in results if result.accepted)
+    for result, item_id, duplicate in zip(accepted, ids, duplicates):
+        result.id = item_id
+        result.duplicate = duplicate
+
+    return schemas.BulkItemsResponse(
+        accepted=len(items),
+        rejected=len(results) - len(items),
+        duplicates=sum(duplicates),
+        results=results,
+    )
+
+
+@items_router.post(
+    "/items/bulk",
+    response_model=schemas.BulkItemsResponse,
+    openapi_extra=_BULK_OPENAPI_EXTRA,
+)
+async def create_items_bulk(request: Request, db: Session = Depends(get_db)):
+    """Recebe um array JSON ou NDJSON de itens e grava os válidos em uma única transação."""
+    records = await ingest.read_bulk_payload(request)
+    items, results = ingest.validate_records(records)
+
+    ids, duplicates = await run_in_threadpool(crud.create_items_bulk, db, items)
+    metrics.record_ingest("bulk", duplicates.count(False))
+    return _bulk_response(items, results, ids, duplicates)
+
+
+def _decode_after(after: str | None) -> tuple[datetime, int] | None:
+    try:
+        return crud.decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _parse_fields(fields: str | None) -> tuple[str, ...]:
+    try:
+        return crud.parse_fields(fields)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+_FIELDS_QUERY = Query(None, description="Campos de Item separados por vírgula (padrão: todos)")
 
 
-@app.get("/items/", response_model=List[schemas.Item])
-def read_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    items = crud.get_items(db, skip=skip, limit=limit)
-    return items
+def _items_response(rows: list, fields: tuple[str, ...], limit: int) -> ORJSONResponse:
+    """Página de itens em JSON via orjson, sem passar as linhas por ``schemas.Item``.
 
+    Devolver a resposta pronta dispensa a validação do ``response_model``, que
+    fica só na documentação.
+    """
+    headers = {}
+    if rows and len(rows) == limit:
+        headers["X-Next-Cursor"] = crud.encode_cursor(rows[-1])
+    return ORJSONResponse([dict(zip(fields, row)) for row in rows], headers=headers)
 
-@app.get("/items/{item_id}", response_model=schemas.Item)
-def read_item(item_id: int, db: Session = Depends(get_db)):
-    db_item = crud.get_item(db, item_id=item_id)
-    if db_item is None:
+
+def _item_response(row, fields: tuple[str, ...]) -> ORJSONResponse:
+    if row is None:
         raise HTTPException(status_code=404, detail="Item not found")
+    return ORJSONResponse(dict(zip(fields, row)))
+
+
+@items_router.get("/items/", response_model=List[schemas.Item])
+def read_items(
+    skip: int = 0,
+    limit: int = 100,
+    after: str | None = Query(None, description="Cursor devolvido em X-Next-Cursor pela página anterior"),
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    operation_type: List[str] | None = Query(None),
+    fields: str | None = _FIELDS_QUERY,
+    db: Session = Depends(get_db),
+):
+    cursor = _decode_after(after)
+    selected = _parse_fields(fields)
+    rows = crud.get_items(
+        db,
+        skip=skip,
+        limit=limit,
+        after=cursor,
+        start_date=start_date,
+        end_date=end_date,
+        operation_types=operation_type,
+        fields=selected,
+    )
+    return _items_response(rows, selected, limit)
+
+
+# Declarada antes de /items/{item_id} para que "export" não seja lido como id
+@app.get("/items/export")
+def export_items(
+    start_date: datetime,
+    end_date: datetime,
+    format: Literal["csv", "parquet", "arrow"] = "csv",
+    operation_type: List[str] = Query(["MANUAL_VALIDATION", "AUTOMATIC_VALIDATION"]),
+    search_term: str | None = None,
+    sort_by: str | None = None,
+    sort_order: Literal["asc", "desc"] = "desc",
+):
+    """Exporta os itens filtrados em streaming, sem carregar o resultado em memória."""
+    filename = f"items_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{format}"
+    return StreamingResponse(
+        export.iter_export(
+            format,
+            start_date,
+            end_date,
+            tuple(sorted(operation_type)),
+            search_term=search_term,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            chunk_size=settings.EXPORT_CHUNK_SIZE,
+        ),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@items_router.get("/items/{item_id}", response_model=schemas.Item)
+def read_item(item_id: int, fields: str | None = _FIELDS_QUERY, db: Session = Depends(get_db)):
+    selected = _parse_fields(fields)
+    return _item_response(crud.get_item(db, item_id=item_id, fields=selected), selected)
+
+
+# --- Versões assíncronas (DATABASE_ASYNC=true) ---
+# Não ocupam o threadpool do Starlette enquanto esperam o banco.
+
+async def create_item_async(item: schemas.ItemCreate, db: AsyncSession = Depends(get_async_db)):
+    db_item, duplicate = await crud.create_item_async(db, item)
+    if not duplicate:
+        metrics.record_ingest("single", 1)
     return db_item
 
 
+async_items_router.add_api_route(
+    "/items/", create_item_batched if batch_writer is not None else create_item_async,
+    methods=["POST"], response_model=schemas.Item,
+)
+
+
+@async_items_router.post(
+    "/items/bulk",
+    response_model=schemas.BulkItemsResponse,
+    openapi_extra=_BULK_OPENAPI_EXTRA,
+)
+async def create_items_bulk_async(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Recebe um array JSON ou NDJSON de itens e grava os válidos em uma única transação."""
+    records = await ingest.read_bulk_payload(request)
+    items, results = ingest.validate_records(records)
+
+    ids, duplicates = await crud.create_items_bulk_async(db, items)
+    metrics.record_ingest("bulk", duplicates.count(False))
+    return _bulk_response(items, results, ids, duplicates)
+
+
+@async_items_router.get("/items/", response_model=List[schemas.Item])
+async def read_items_async(
+    skip: int = 0,
+    limit: int = 100,
+    after: str | None = Query(None, description="Cursor devolvido em X-Next-Cursor pela página anterior"),
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    operation_type: List[str] | None = Query(None),
+    fields: str | None = _FIELDS_QUERY,
+    db: AsyncSession = Depends(get_async_db),
+):
+    cursor = _decode_after(after)
+    selected = _parse_fields(fields)
+    rows = await crud.get_items_async(
+        db,
+        skip=skip,
+        limit=limit,
+        after=cursor,
+        start_date=start_date,
+        end_date=end_date,
+        operation_types=operation_type,
+        fields=selected,
+    )
+    return _items_response(rows, selected, limit)
+
+
+@async_items_router.get("/items/{item_id}", response_model=schemas.Item)
+async def read_item_async(item_id: int, fields: str | None = _FIELDS_QUERY, db: AsyncSession = Depends(get_async_db)):
+    selected = _parse_fields(fields)
+    return _item_response(await crud.get_item_async(db, item_id=item_id, fields=selected), selected)
+
+
+@app.get("/ingest/stats")
+async def ingest_stats():
+    if batch_writer is None:
+        return {"mode": settings.INGEST_MODE, **dedup.stats.snapshot()}
+    return {
+        "mode": settings.INGEST_MODE,
+        "queue_size": batch_writer.queue_size(),
+        **batch_writer.stats.snapshot(),
+        **dedup.stats.snapshot(),
+    }
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return await run_in_threadpool(cache.stats)
+
+
 @app.get("/health", status_code=200)
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+# Incluído depois de /items/export, declarada direto no app, para que "export"
+# não seja lido como id em /items/{item_id}
+app.include_router(async_items_router if settings.DATABASE_ASYNC else items_router)
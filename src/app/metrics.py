@@ -0,0 +1,178 @@
+# metrics.py
+"""Métricas Prometheus da API, expostas em ``GET /metrics``.
+
+- ``http_request_duration_seconds``: latência por método, rota (o template,
+  não a URL) e status.
+- ``db_query_duration_seconds``: tempo de cada execução no cursor, pela função
+  do repositório/crud em curso (``track``); o resto aparece como ``other``.
+- ``db_pool_*``: espera no checkout, timeouts e ocupação de cada pool (por papel,
+  ver ``database.engine_options``).
+- ``ingest_rows_total`` / ``ingest_batches_total``: por caminho de ingestão;
+  ``ingest_duplicates_total``: retentativas descartadas (ver ``app.dedup``).
+
+Tudo é contador ou histograma em memória, atualizado com poucas operações por
+requisição ou consulta; a ocupação dos pools só é lida na coleta.
+"""
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP", ["method", "route", "status"]
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Tempo de execução das consultas no banco", ["operation"]
+)
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Espera por uma conexão do pool", ["role"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts que esgotaram pool_timeout", ["role"]
+)
+INGEST_ROWS = Counter("ingest_rows_total", "Itens gravados", ["path"])
+INGEST_BATCHES = Counter("ingest_batches_total", "Transações de gravação de itens", ["path"])
+INGEST_DUPLICATES = Counter(
+    "ingest_duplicates_total", "Itens repetidos descartados pela ingestão idempotente", ["source"]
+)
+
+_operation: ContextVar[str] = ContextVar("db_operation", default="other")
+_engines: list[tuple[str, Engine]] = []
+
+
+def track(fn):
+    """Marca as consultas feitas dentro de ``fn`` com o nome da função."""
+    name = fn.__name__
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            token = _operation.set(name)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _operation.reset(token)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _operation.set(name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _operation.reset(token)
+    return wrapper
+
+
+def current_operation() -> str:
+    """Função marcada por ``track`` em curso, ou ``other``."""
+    return _operation.get()
+
+
+def record_ingest(path: str, rows: int):
+    INGEST_ROWS.labels(path).inc(rows)
+    INGEST_BATCHES.labels(path).inc()
+
+
+def record_duplicates(source: str, count: int):
+    INGEST_DUPLICATES.labels(source).inc(count)
+
+
+class _TimedCheckout:
+    """Mede a espera por conexão; o papel vem do ``pool_logging_name`` da engine."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        role = self._orig_logging_name or "default"
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.labels(role).inc()
+            raise
+        finally:
+            POOL_WAIT.labels(role).observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def register_engine(role: str, engine: Engine):
+    """Inclui o pool da engine nos gauges de ``db_pool_connections``."""
+    _engines.append((role, engine))
+
+
+class _PoolCollector:
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "db_pool_connections", "Conexões de cada pool por estado", labels=["role", "state"]
+        )
+        for role, engine in _engines:
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue
+            connections.add_metric([role, "checked_out"], pool.checkedout())
+            connections.add_metric([role, "idle"], pool.checkedin())
+            connections.add_metric([role, "overflow"], max(pool.overflow(), 0))
+            connections.add_metric([role, "size"], pool.size())
+        yield connections
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is not None:
+        DB_QUERY_LATENCY.labels(current_operation()).observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI puro: não envolve o corpo da resposta como o BaseHTTPMiddleware."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # O template da rota limita a cardinalidade; URLs sem rota ficam agrupadas
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
+
+
+def install(app):
+    """Liga a instrumentação na aplicação FastAPI e registra ``GET /metrics``."""
+    from fastapi import Response
+
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    REGISTRY.register(_PoolCollector())
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,241 @@
+# migrations.py
+"""Schema do banco na subida da API, conforme ``SCHEMA_STARTUP``.
+
+- ``check`` (padrão): compara a revisão gravada em ``alembic_version`` com os
+  heads de ``alembic/versions`` e interrompe a subida se forem diferentes
+  (``python -m app.migrations upgrade`` resolve). É uma consulta por worker,
+  contra uma por tabela do ``create_all``. Um banco vazio recebe as migrações
+  desde a primeira (``upgrade``), uma vez só mesmo com vários workers subindo
+  juntos: o ``create_all`` não cria o particionamento mensal nem os índices de
+  busca do PostgreSQL. A primeira revisão parte do ``items`` que o
+  ``create_all`` das versões anteriores às migrações criava; em um banco
+  vazio o ``upgrade`` cria essa tabela antes de migrar.
+- ``create_all``: só cria as tabelas que faltam, sem olhar as migrações.
+- ``off``: nada; para quando as migrações rodam antes do deploy.
+
+Fora da API, as migrações rodam contra ``DATABASE_URL`` com::
+
+    python -m app.migrations upgrade
+    python -m app.migrations stamp 03ee80d94e80
+
+É o que o serviço ``migrate`` do docker-compose faz antes de subir a API e o
+dashboard. Um banco criado pelo ``create_all`` de versões anteriores não tem
+``alembic_version``: marque-o uma vez com ``stamp 03ee80d94e80`` (a revisão
+que ele já tem) e o ``upgrade`` aplica o restante, inclusive as migrações de
+dados (codificação por dicionário, particionamento e sketches).
+
+A verificação não importa o Alembic (~40 ms por worker, mais que a própria
+consulta): os heads saem de ``revision``/``down_revision`` dos arquivos de
+``versions`` e a revisão do banco de ``alembic_version``. O Alembic só entra
+para migrar um banco novo.
+"""
+import argparse
+import ast
+import logging
+from pathlib import Path
+
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from app import models
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ("check", "create_all", "off")
+# Chave do advisory lock da criação do schema em um banco vazio
+BOOTSTRAP_LOCK = 0x6461_7461_6C61_6B65
+
+
+def _revision_ids(value) -> tuple[str, ...]:
+    if value is None:
+        return ()
+    return (value,) if isinstance(value, str) else tuple(value)
+
+
+def _identifiers(path: Path) -> dict:
+    """``revision`` e ``down_revision`` de um arquivo de migração, sem executá-lo."""
+    found = {}
+    for node in ast.parse(path.read_text(encoding="utf-8")).body:
+        if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name) and node.value is not None:
+            found[node.target.id] = node.value
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            found[node.targets[0].id] = node.value
+    return {
+        name: ast.literal_eval(found[name])
+        for name in ("revision", "down_revision") if name in found
+    }
+
+
+def heads() -> set[str]:
+    """Heads das migrações em ``ALEMBIC_SCRIPT_LOCATION``: revisões que nenhuma outra revisa."""
+    revisions, revised = set(), set()
+    for path in (Path(settings.ALEMBIC_SCRIPT_LOCATION) / "versions").glob("*.py"):
+        identifiers = _identifiers(path)
+        if "revision" in identifiers:
+            revisions.add(identifiers["revision"])
+            revised.update(_revision_ids(identifiers.get("down_revision")))
+    return revisions - revised
+
+
+def current(connection: Connection) -> set[str]:
+    """Revisões gravadas no banco (vazio se ``alembic_version`` não existe)."""
+    try:
+        return set(connection.scalars(text("SELECT version_num FROM alembic_version")))
+    except exc.DBAPIError:
+        # No PostgreSQL o erro invalida a transação
+        connection.rollback()
+        return set()
+
+
+def _config(connection: Connection):
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", settings.ALEMBIC_SCRIPT_LOCATION)
+    config.attributes["connection"] = connection
+    return config
+
+
+def _create_base(connection: Connection) -> None:
+    """``items`` como o ``create_all`` anterior às migrações a criava.
+
+    É o schema de onde parte a primeira revisão (``03ee80d94e80``), que só
+    acrescenta índices; fica fora do histórico, já aplicado nos bancos antigos.
+    """
+    import sqlalchemy as sa
+    from alembic.operations import Operations
+    from alembic.runtime.migration import MigrationContext
+
+    op = Operations(MigrationContext.configure(connection))
+    op.create_table(
+        "items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("ticket_code", sa.String(length=120), nullable=False),
+        sa.Column("num_ped_ecf", sa.String(length=60), nullable=True),
+        sa.Column("num_cupom", sa.BigInteger(), nullable=True),
+        sa.Column("num_caixa", sa.Integer(), nullable=True),
+        sa.Column("hostname", sa.String(length=120), nullable=True),
+        sa.Column("vl_total", sa.Float(), nullable=False),
+        sa.Column("operation_type", sa.String(length=120), nullable=False),
+        sa.Column("success", sa.Boolean(), nullable=False),
+        sa.Column("message", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    for column in ("ticket_code", "num_ped_ecf", "num_cupom", "hostname", "vl_total",
+                   "operation_type", "success", "created_at"):
+        op.create_index(f"ix_items_{column}", "items", [column])
+    op.create_index("ix_items_date_success_operation", "items", ["created_at", "success", "operation_type"])
+    op.create_index("ix_items_caixa_date_operation", "items", ["num_caixa", "created_at", "operation_type"])
+    op.create_index("ix_items_hostname_date_operation", "items", ["hostname", "created_at", "operation_type"])
+    if connection.dialect.name == "postgresql":
+        # No SQLite 8e2f4a6c1b37 os removeria de qualquer forma
+        op.create_index("ix_items_success_year_operation", "items",
+                        [sa.text("success, EXTRACT(year FROM created_at), operation_type")])
+        op.create_index("ix_items_success_year_month_operation", "items",
+                        [sa.text("success, EXTRACT(year FROM created_at), EXTRACT(month FROM created_at), "
+                                 "operation_type")])
+    op.create_index("ix_items_date_only", "items", [sa.text("DATE(created_at)")])
+    op.create_index("ix_items_created_at_desc", "items", [sa.text("created_at DESC")])
+    op.create_index("ix_items_value_date", "items", ["vl_total", "created_at"])
+    op.create_index("ix_items_ticket_date", "items", ["ticket_code", "created_at"])
+
+
+def upgrade(connection: Connection, revision: str = "heads") -> None:
+    """``alembic upgrade`` até ``revision`` em ``connection`` (sem commit).
+
+    Em um banco vazio cria antes o ``items`` de onde a primeira revisão parte.
+    """
+    from alembic import command
+
+    if not inspect(connection).get_table_names():
+        _create_base(connection)
+    command.upgrade(_config(connection), revision)
+
+
+def stamp(connection: Connection, revision: str) -> None:
+    """``alembic stamp``: grava ``revision`` em ``alembic_version`` sem migrar (sem commit)."""
+    from alembic import command
+
+    command.stamp(_config(connection), revision)
+
+
+def _bootstrap(connection: Connection) -> set[str]:
+    """Migra um banco vazio; devolve as revisões gravadas ao fim.
+
+    No PostgreSQL os workers que sobem juntos se revezam em um advisory lock:
+    o primeiro migra e os demais encontram o schema pronto.
+    """
+    postgresql = connection.dialect.name == "postgresql"
+    if postgresql:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": BOOTSTRAP_LOCK})
+        connection.commit()
+    try:
+        found = current(connection)
+        if not found and not inspect(connection).get_table_names():
+            logger.info("Banco vazio: criando o schema na revisão %s", ", ".join(sorted(heads())))
+            upgrade(connection)
+            connection.commit()
+            found = current(connection)
+        return found
+    finally:
+        if postgresql:
+            connection.rollback()
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": BOOTSTRAP_LOCK})
+            connection.commit()
+
+
+def check(engine: Engine) -> None:
+    """Levanta RuntimeError se o banco não estiver nos heads do Alembic."""
+    expected = heads()
+    with engine.connect() as connection:
+        found = current(connection)
+        if not found and not inspect(connection).get_table_names():
+            found = _bootstrap(connection)
+    if found == expected:
+        return
+    if not found:
+        raise RuntimeError(
+            "Banco sem alembic_version: se ele foi criado pelo create_all, marque-o com "
+            "`python -m app.migrations stamp 03ee80d94e80` e rode "
+            "`python -m app.migrations upgrade` antes de subir a API"
+        )
+    raise RuntimeError(
+        f"Schema na revisão {', '.join(sorted(found))}, esperado {', '.join(sorted(expected))}: "
+        "rode `python -m app.migrations upgrade` antes de subir a API"
+    )
+
+
+def prepare(engine: Engine, mode: str | None = None) -> None:
+    """Aplica ``SCHEMA_STARTUP`` (ou ``mode``) a ``engine``."""
+    mode = mode or settings.SCHEMA_STARTUP
+    if mode == "check":
+        check(engine)
+    elif mode == "create_all":
+        models.Base.metadata.create_all(bind=engine)
+    elif mode != "off":
+        raise ValueError(f"SCHEMA_STARTUP inválido: {mode!r} (use {', '.join(MODES)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrações do banco em DATABASE_URL")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("upgrade", help="Aplica as migrações até os heads")
+    stamp_parser = subparsers.add_parser("stamp", help="Marca a revisão do banco sem migrar")
+    stamp_parser.add_argument("revision", help="Revisão já presente no banco (ex.: 03ee80d94e80)")
+    args = parser.parse_args()
+
+    from app.database import maintenance_engine
+
+    with maintenance_engine.begin() as connection:
+        if args.command == "upgrade":
+            upgrade(connection)
+        else:
+            stamp(connection, args.revision)
+    with maintenance_engine.connect() as connection:
+        print(f"Banco na revisão {', '.join(sorted(current(connection))) or '(nenhuma)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,48 @@
 # models.py
-from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, Index, Text, text
-from sqlalchemy import Integer, String, func, Boolean, Float
-from sqlalchemy.orm import Mapped, mapped_column
+from datetime import date, datetime
+from sqlalchemy import BigInteger, Date, DateTime, DDL, ForeignKey, Index, SmallInteger, Text, event, text
+from sqlalchemy import Integer, LargeBinary, String, func, Boolean, Float
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
 
+# O default CURRENT_TIMESTAMP do SQLite não grava microssegundos; sem o truncamento
+# os parâmetros seriam comparados como texto em outro formato e as igualdades
+# em created_at (cursor de paginação) falhariam.
+TimestampType = DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), 'sqlite')
+
+# No SQLite só INTEGER PRIMARY KEY é autoincremento (alias do rowid)
+SmallIdType = SmallInteger().with_variant(Integer, 'sqlite')
+
+
+# Dicionários das colunas repetitivas de items (ver app.dictionary)
+class OperationTypeModel(Base):
+    __tablename__ = 'operation_types'
+
+    id: Mapped[int] = mapped_column(SmallIdType, primary_key=True)
+    name: Mapped[str] = mapped_column(String(120), unique=True)
+
+
+class HostnameModel(Base):
+    __tablename__ = 'hostnames'
+
+    id: Mapped[int] = mapped_column(SmallIdType, primary_key=True)
+    name: Mapped[str] = mapped_column(String(120), unique=True)
+
+
+class MessageModel(Base):
+    __tablename__ = 'messages'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(Text, unique=True)  # schemas.ItemBase trunca em 200
+
+
 class ItemModel(Base):
+    # No PostgreSQL a tabela é particionada por mês em created_at (migração
+    # c4d9e1f7a2b6, manutenção em app.partitions); a PK física é (id, created_at).
+    # operation_type, hostname e message são ids dos dicionários acima (migração
+    # f3a5c7e9b1d4); os rótulos chegam por junção ou por app.dictionary.
     __tablename__ = 'items'
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -14,37 +50,137 @@ class ItemModel(Base):
     num_ped_ecf: Mapped[str] = mapped_column(String(60), nullable=True, index=True)
     num_cupom: Mapped[int] = mapped_column(BigInteger, nullable=True, index=True)  # era Integer
     num_caixa: Mapped[int] = mapped_column(Integer, nullable=True, index=True)
-    hostname: Mapped[str] = mapped_column(String(120), nullable=True, index=True)
+    hostname_id: Mapped[int] = mapped_column(
+        SmallInteger, ForeignKey('hostnames.id'), nullable=True, index=True
+    )
     vl_total: Mapped[float] = mapped_column(Float, index=True)
-    operation_type: Mapped[str] = mapped_column(String(120), index=True)
-    success: Mapped[bool] = mapped_column(Boolean, index=True)
-    message: Mapped[str] = mapped_column(Text)  # era String(200)
+    operation_type_id: Mapped[int] = mapped_column(SmallInteger, ForeignKey('operation_types.id'), index=True)
+    success: Mapped[bool] = mapped_column(Boolean)
+    message_id: Mapped[int] = mapped_column(Integer, ForeignKey('messages.id'))
     created_at: Mapped[datetime] = mapped_column(
-        DateTime, server_default=func.now(), index=True
+        TimestampType, server_default=func.now(), index=True
     )
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, server_default=func.now(), onupdate=func.now()
+        TimestampType, server_default=func.now(), onupdate=func.now()
     )
 
+    # Carregados na mesma consulta do item, também na sessão assíncrona
+    operation_type_entry: Mapped[OperationTypeModel] = relationship(lazy='joined', innerjoin=True)
+    hostname_entry: Mapped[HostnameModel | None] = relationship(lazy='joined')
+    message_entry: Mapped[MessageModel] = relationship(lazy='joined', innerjoin=True)
+
     __table_args__ = (
-        Index('ix_items_created_at_operation_type', 'created_at', 'operation_type'),
-        Index('ix_items_date_success_operation', 'created_at', 'success', 'operation_type'),
-        Index('ix_items_caixa_date_operation', 'num_caixa', 'created_at', 'operation_type'),
-        Index('ix_items_hostname_date_operation', 'hostname', 'created_at', 'operation_type'),
-        Index('ix_items_success_year_operation',
-              text('success, EXTRACT(year FROM created_at), operation_type')),
-        Index('ix_items_success_year_month_operation',
-              text('success, EXTRACT(year FROM created_at), EXTRACT(month FROM created_at), operation_type')),
+        Index('ix_items_created_at_operation_type', 'created_at', 'operation_type_id'),
+        Index('ix_items_date_success_operation', 'created_at', 'success', 'operation_type_id'),
+        Index('ix_items_caixa_date_operation', 'num_caixa', 'created_at', 'operation_type_id'),
+        Index('ix_items_hostname_date_operation', 'hostname_id', 'created_at', 'operation_type_id'),
         Index('ix_items_date_only', text('DATE(created_at)')),
-        Index('ix_items_created_at_desc', text('created_at DESC')),
         Index('ix_items_value_date', 'vl_total', 'created_at'),
         Index('ix_items_ticket_date', 'ticket_code', 'created_at'),
     )
 
+    @property
+    def operation_type(self) -> str:
+        return self.operation_type_entry.name
+
+    @property
+    def hostname(self) -> str | None:
+        return self.hostname_entry.name if self.hostname_entry is not None else None
+
+    @property
+    def message(self) -> str:
+        return self.message_entry.name
+
     def __repr__(self) -> str:
         return (
             f"Item(id={self.id!r}, ticket_code={self.ticket_code!r}, "
             f"num_ped_ecf={self.num_ped_ecf!r}, vl_total={self.vl_total!r}, "
             f"operation_type={self.operation_type!r}, success={self.success!r}, "
             f"message={self.message!r})"
-        )
\ No newline at end of file
+        )
+
+
+# Índice de substring de ticket_code, num_cupom e num_caixa no SQLite (usado por
+# app.search). No PostgreSQL o equivalente são os GIN de trigramas das migrações
+# d7a3b5c9e1f2 e b6d8f0a2c4e7.
+ITEMS_FTS_TABLE = 'items_ticket_fts'
+
+_FTS_COLUMNS = 'ticket_code, num_cupom, num_caixa'
+ITEMS_FTS_SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {ITEMS_FTS_TABLE} USING fts5("
+    f"{_FTS_COLUMNS}, content='items', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_ai AFTER INSERT ON items BEGIN "
+    f"INSERT INTO {ITEMS_FTS_TABLE}(rowid, {_FTS_COLUMNS}) "
+    "VALUES (new.id, new.ticket_code, new.num_cupom, new.num_caixa); END",
+    "CREATE TRIGGER IF NOT EXISTS items_ticket_fts_ad AFTER DELETE ON items BEGIN "
+    f"INSERT INTO {ITEMS_FTS_TABLE}({ITEMS_FTS_TABLE}, rowid, {_FTS_COLUMNS}) "
+    "VALUES ('delete', old.id, old.ticket_code, old.num_cupom, old.num_caixa); END",
+    f"CREATE TRIGGER IF NOT EXISTS items_ticket_fts_au AFTER UPDATE OF {_FTS_COLUMNS} ON items BEGIN "
+    f"INSERT INTO {ITEMS_FTS_TABLE}({ITEMS_FTS_TABLE}, rowid, {_FTS_COLUMNS}) "
+    "VALUES ('delete', old.id, old.ticket_code, old.num_cupom, old.num_caixa); "
+    f"INSERT INTO {ITEMS_FTS_TABLE}(rowid, {_FTS_COLUMNS}) "
+    "VALUES (new.id, new.ticket_code, new.num_cupom, new.num_caixa); END",
+)
+
+for _statement in ITEMS_FTS_SQLITE_DDL:
+    event.listen(ItemModel.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(
+    ItemModel.__table__, 'before_drop',
+    DDL(f'DROP TABLE IF EXISTS {ITEMS_FTS_TABLE}').execute_if(dialect='sqlite'),
+)
+
+
+class ItemDailyRollupModel(Base):
+    """Agregado diário de ``items`` mantido a cada ingestão (ver ``app.rollup``).
+
+    Como colunas de chave primária não aceitam NULL, ``hostname`` e ``num_caixa``
+    nulos são gravados como ``''`` e ``-1``.
+    """
+    __tablename__ = 'items_daily_rollup'
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    operation_type: Mapped[str] = mapped_column(String(120), primary_key=True)
+    success: Mapped[bool] = mapped_column(Boolean, primary_key=True)
+    hostname: Mapped[str] = mapped_column(String(120), primary_key=True)
+    num_caixa: Mapped[int] = mapped_column(Integer, primary_key=True)
+    item_count: Mapped[int] = mapped_column(BigInteger, default=0)
+    vl_total_sum: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+class ItemDailySketchModel(Base):
+    """Sketches diários de ``items`` (ver ``app.sketches``): HyperLogLog dos
+    ``ticket_code`` e t-digest de ``vl_total``.
+
+    Cada ingestão grava linhas novas em vez de atualizar as existentes; uma
+    chave pode ter várias linhas até a compactação. ``hostname`` e
+    ``num_caixa`` nulos seguem a convenção de ``items_daily_rollup``.
+    """
+    __tablename__ = 'items_daily_sketches'
+    __table_args__ = (
+        Index('ix_items_daily_sketches_key', 'day', 'operation_type', 'hostname', 'num_caixa'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    day: Mapped[date] = mapped_column(Date)
+    operation_type: Mapped[str] = mapped_column(String(120))
+    hostname: Mapped[str] = mapped_column(String(120))
+    num_caixa: Mapped[int] = mapped_column(Integer)
+    item_count: Mapped[int] = mapped_column(BigInteger)
+    tickets: Mapped[bytes] = mapped_column(LargeBinary)
+    vl_total: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class ItemKeyModel(Base):
+    """Chave de idempotência de ``items`` (ver ``app.dedup``).
+
+    Tabela à parte porque, particionada, ``items`` só aceita chaves únicas que
+    incluam ``created_at``. ``num_cupom`` nulo é gravado como ``-1``.
+    """
+    __tablename__ = 'item_keys'
+
+    ticket_code: Mapped[str] = mapped_column(String(120), primary_key=True)
+    num_cupom: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    operation_type: Mapped[str] = mapped_column(String(120), primary_key=True)
+    item_id: Mapped[int] = mapped_column(Integer)
+    # Mesmo created_at do item: localiza a partição e permite expirar as chaves
+    created_at: Mapped[datetime] = mapped_column(TimestampType, index=True)
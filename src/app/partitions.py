@@ -0,0 +1,185 @@
+# partitions.py
+"""Manutenção das partições mensais de ``items`` (somente PostgreSQL).
+
+A migração ``c4d9e1f7a2b6`` converte ``items`` em tabela particionada por
+``RANGE (created_at)`` com uma partição por mês (``items_pAAAA_MM``) e uma
+partição ``items_default``. Este módulo cria as partições futuras e remove as
+que saíram da janela de retenção::
+
+    python -m app.partitions maintain --ahead 3 [--retain-months 24 [--drop]]
+
+Com ``ARCHIVE_PATH`` configurado, os meses expirados são arquivados em Parquet
+(``app.archive``) antes de sair do banco.
+"""
+import argparse
+import re
+from datetime import date, datetime
+
+from sqlalchemy import delete, text
+from sqlalchemy.orm import Session
+
+from app import archive, cache, models
+from app.database import MaintenanceSessionLocal
+
+PARENT = "items"
+DEFAULT_PARTITION = "items_default"
+_NAME_RE = re.compile(r"^items_p(\d{4})_(\d{2})$")
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y_%m}"
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(db.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:parent))"
+    ), {"parent": PARENT}))
+
+
+def list_partitions(db: Session) -> dict[date, str]:
+    """Partições mensais anexadas, indexadas pelo primeiro dia do mês."""
+    names = db.scalars(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:parent)"
+    ), {"parent": PARENT})
+    partitions = {}
+    for name in names:
+        match = _NAME_RE.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partition(db: Session, month: date) -> str:
+    """Cria a partição do mês, movendo para ela linhas que caíram na partição default."""
+    name = partition_name(month)
+    lower, upper = month.isoformat(), _add_months(month, 1).isoformat()
+    stray = db.scalar(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+        "WHERE created_at >= :lower AND created_at < :upper)"
+    ), {"lower": lower, "upper": upper})
+
+    if not stray:
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        ))
+        return name
+
+    # O PostgreSQL recusa criar a partição enquanto a default tiver linhas do intervalo
+    db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}"))
+    db.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    ))
+    moved = {"lower": lower, "upper": upper}
+    db.execute(text(
+        f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} "
+        "WHERE created_at >= :lower AND created_at < :upper"
+    ), moved)
+    db.execute(text(
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :lower AND created_at < :upper"
+    ), moved)
+    db.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    return name
+
+
+def maintain(
+    db: Session,
+    ahead: int = 3,
+    retain_months: int | None = None,
+    drop: bool = False,
+    today: date | None = None,
+) -> dict:
+    """Garante partições até ``ahead`` meses à frente e aplica a retenção.
+
+    Partições inteiramente anteriores a ``retain_months`` meses são desanexadas
+    (e apagadas com ``drop``) e as linhas desse período que estão na partição
+    default são apagadas; o rollup desses dias também é removido para que os
+    agregados continuem batendo com as linhas brutas, assim como as chaves de
+    idempotência em ``item_keys``. Os sketches só são apagados sem arquivo
+    configurado: com ``ARCHIVE_PATH`` eles continuam servindo os meses
+    arquivados.
+    """
+    if not is_partitioned(db):
+        raise RuntimeError("items não é uma tabela particionada (PostgreSQL)")
+
+    current = (today or date.today()).replace(day=1)
+    existing = list_partitions(db)
+    report = {"created": [], "detached": [], "dropped": [], "default_rows_deleted": 0}
+
+    for offset in range(ahead + 1):
+        month = _add_months(current, offset)
+        if month not in existing:
+            report["created"].append(create_partition(db, month))
+    db.commit()
+
+    if retain_months is None:
+        return report
+
+    boundary = _add_months(current, -retain_months)
+    expired = sorted(month for month in existing if month < boundary)
+    # Linhas antigas que caíram na default antes de a partição do mês existir
+    stray = db.scalar(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at < :boundary)"
+    ), {"boundary": boundary})
+    if not expired and not stray:
+        return report
+
+    root = archive.archive_root()
+    if root is not None:
+        archive.run(db, root, datetime.combine(boundary, datetime.min.time()))
+
+    for month in expired:
+        name = existing[month]
+        db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        report["detached"].append(name)
+        if drop:
+            db.execute(text(f"DROP TABLE {name}"))
+            report["dropped"].append(name)
+    if stray:
+        report["default_rows_deleted"] = db.execute(text(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :boundary"
+        ), {"boundary": boundary}).rowcount
+    db.execute(
+        delete(models.ItemDailyRollupModel).where(models.ItemDailyRollupModel.day < boundary)
+    )
+    if root is None:
+        db.execute(
+            delete(models.ItemDailySketchModel).where(models.ItemDailySketchModel.day < boundary)
+        )
+    db.execute(delete(models.ItemKeyModel).where(models.ItemKeyModel.created_at < boundary))
+    db.commit()
+    cache.invalidate_all()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção das partições mensais de items")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    maintain_parser = subparsers.add_parser("maintain", help="Cria partições futuras e aplica a retenção")
+    maintain_parser.add_argument("--ahead", type=int, default=3, help="Meses futuros a pré-criar")
+    maintain_parser.add_argument("--retain-months", type=int, default=None,
+                                 help="Meses fechados mantidos no banco (padrão: sem retenção)")
+    maintain_parser.add_argument("--drop", action="store_true",
+                                 help="Apaga as partições expiradas em vez de só desanexar")
+    args = parser.parse_args()
+
+    with MaintenanceSessionLocal() as db:
+        report = maintain(db, ahead=args.ahead, retain_months=args.retain_months, drop=args.drop)
+    deleted = report.pop("default_rows_deleted")
+    for action, names in report.items():
+        for name in names:
+            print(f"{action}: {name}")
+    if deleted:
+        print(f"deleted: {deleted} linhas antigas de {DEFAULT_PARTITION}")
+
+
+if __name__ == "__main__":
+    main()
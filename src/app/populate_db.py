@@ -1,39 +1,10 @@
-from datetime import datetime, timedelta
-
-from sqlalchemy import insert
-from app import models
-from app.database import SessionLocal, engine
-from faker import Faker
-
-models.Base.metadata.create_all(bind=engine)
-
-fake = Faker()
-
-items = []
-for _ in range(100000):
-    date_interval = fake.random_int(min=1, max=30)
-    num_caixa_interval = fake.random_int(min=1, max=32)
-    hostname = str(fake.random_int(min=1, max=32)).zfill(4)
-    operation_type = fake.random_element(elements=("MANUAL_VALIDATION", "AUTOMATIC_VALIDATION"))
-    item = {
-        "ticket_code": fake.uuid4(),
-        "num_ped_ecf": str(fake.random_int()),
-        "num_cupom": fake.random_int(),
-        "num_caixa": num_caixa_interval if operation_type == "AUTOMATIC_VALIDATION" else None,
-        "hostname": hostname,
-        "vl_total": fake.random_int(),
-        "operation_type": operation_type,
-        "success": fake.boolean(chance_of_getting_true=95),
-        "message": fake.sentence(),
-        "created_at": datetime.now() - timedelta(days=date_interval),
-        "updated_at": datetime.now() - timedelta(days=date_interval)
-    }
-    items.append(item)
-
-chunks = [items[i:i+100] for i in range(0, len(items), 100)]
-
-for chunk in chunks:
-    with SessionLocal() as db:
-        stmt = insert(models.ItemModel).values(chunk)
-        db.execute(stmt)
-        db.commit()
+# Atalho para app.datagen com a distribuição original deste script: 100 mil
+# itens nos últimos 30 dias, lojas e horários uniformes
+from app import migrations
+from app.database import engine
+from app.datagen import generate
+
+if __name__ == "__main__":
+    # Banco vazio: cria o schema já marcado no head, como a API
+    migrations.prepare(engine, "check")
+    generate(100_000, days=30, manual_ratio=0.5, hostname_skew=0, business_hours=False, growth=False)
@@ -0,0 +1,237 @@
+# profiler.py
+"""Registro de consultas lentas, com ``EXPLAIN (ANALYZE, BUFFERS)`` no PostgreSQL.
+
+Ligado por ``SLOW_QUERY_PROFILER``; vale para todas as engines do processo
+(API, dashboard e comandos de manutenção). Cada execução acima de
+``SLOW_QUERY_THRESHOLD_MS`` é registrada no log e em ``SLOW_QUERY_LOG_PATH``
+(JSONL) com o SQL, os parâmetros, a função do repositório (``metrics.track``),
+a linha de código que a disparou e o tempo.
+
+No PostgreSQL (psycopg2), SELECTs lentos são reexecutados com ``EXPLAIN
+(ANALYZE, BUFFERS)`` em uma thread de fundo e conexão própria, no máximo uma
+vez por ``SLOW_QUERY_EXPLAIN_INTERVAL_S`` para o mesmo SQL, sem atrasar a
+requisição original. O relatório agrupa o arquivo::
+
+    python -m app.profiler report [--top 20]
+"""
+import argparse
+import json
+import logging
+import queue
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+from app import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_EXPLAIN_TIMEOUT_MS = 60000
+_MAX_PARAMETER_CHARS = 2000
+
+_queue: queue.Queue = queue.Queue(maxsize=1000)
+_explained_at: dict[str, float] = {}
+_explain_engines: dict[str, Engine] = {}
+_worker: threading.Thread | None = None
+
+
+def _call_site() -> str:
+    """Primeiro quadro da pilha dentro de ``app`` fora da infraestrutura de banco."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.") and module not in ("app.profiler", "app.metrics", "app.frames"):
+            return f"{module}:{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "?"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profiler_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_profiler_start", None)
+    if start is not None:
+        observe(conn, statement, parameters, (time.perf_counter() - start) * 1000, executemany)
+
+
+def observe(conn, statement: str, parameters, elapsed_ms: float, executemany: bool = False):
+    """Registra ``statement`` se passou do limite; também para execuções fora dos eventos (COPY)."""
+    if _worker is None or elapsed_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+    record = {
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_ms": round(elapsed_ms, 1),
+        "operation": metrics.current_operation(),
+        "call_site": _call_site(),
+        "statement": statement,
+        "parameters": repr(parameters)[:_MAX_PARAMETER_CHARS],
+        "dialect": conn.dialect.name,
+    }
+    logger.warning(
+        "Consulta lenta (%.0f ms) em %s [%s]: %s",
+        elapsed_ms, record["operation"], record["call_site"], " ".join(statement.split())[:300],
+    )
+    explain = None
+    if _should_explain(conn, statement, executemany):
+        explain = (conn.engine.url, parameters)
+    try:
+        _queue.put_nowait((record, explain))
+    except queue.Full:
+        logger.warning("Fila do profiler cheia; consulta lenta descartada do relatório")
+
+
+def _should_explain(conn, statement: str, executemany: bool) -> bool:
+    # ANALYZE executa a consulta de novo: só SELECT, nunca escrita
+    if not settings.SLOW_QUERY_EXPLAIN or executemany or conn.dialect.driver != "psycopg2":
+        return False
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return False
+    now = time.monotonic()
+    if now - _explained_at.get(statement, -float("inf")) < settings.SLOW_QUERY_EXPLAIN_INTERVAL_S:
+        return False
+    _explained_at[statement] = now
+    return True
+
+
+def _explain(url, statement: str, parameters) -> dict:
+    engine = _explain_engines.get(str(url))
+    if engine is None:
+        # NullPool: a conexão do EXPLAIN não ocupa o pool da aplicação
+        engine = _explain_engines[str(url)] = create_engine(url, poolclass=NullPool)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"SET statement_timeout = {_EXPLAIN_TIMEOUT_MS}")
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+        plan = cursor.fetchone()[0]
+        connection.rollback()
+    finally:
+        connection.close()
+    return plan[0] if isinstance(plan, list) else plan
+
+
+def _run_worker():
+    path = Path(settings.SLOW_QUERY_LOG_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        record, explain = _queue.get()
+        if explain is not None:
+            url, parameters = explain
+            try:
+                record["plan"] = _explain(url, record["statement"], parameters)
+            except Exception as exc:
+                record["plan_error"] = str(exc)
+        with path.open("a", encoding="utf-8") as output:
+            output.write(json.dumps(record, default=str) + "\n")
+
+
+def install():
+    """Registra os eventos em todas as engines e inicia a thread de gravação."""
+    global _worker
+    if _worker is not None:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _worker = threading.Thread(target=_run_worker, name="slow-query-profiler", daemon=True)
+    _worker.start()
+
+
+# --- Relatório ---
+
+def _walk(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def plan_findings(plan: dict) -> dict:
+    """Resumo do plano: índices usados, varreduras sequenciais e blocos lidos."""
+    nodes = list(_walk(plan["Plan"]))
+    return {
+        "execution_ms": plan.get("Execution Time"),
+        "indexes": sorted({node["Index Name"] for node in nodes if "Index Name" in node}),
+        "seq_scans": sorted({
+            node.get("Relation Name", "?") for node in nodes if node["Node Type"] == "Seq Scan"
+        }),
+        "shared_hit_blocks": plan["Plan"].get("Shared Hit Blocks", 0),
+        "shared_read_blocks": plan["Plan"].get("Shared Read Blocks", 0),
+        "temp_written_blocks": plan["Plan"].get("Temp Written Blocks", 0),
+    }
+
+
+def build_report(path: Path, top: int = 20) -> list[dict]:
+    """Agrupa o JSONL por (função, SQL), do maior tempo total para o menor."""
+    groups = defaultdict(list)
+    with path.open(encoding="utf-8") as source:
+        for line in source:
+            record = json.loads(line)
+            groups[(record["operation"], record["statement"])].append(record)
+    report = []
+    for (operation, statement), records in groups.items():
+        elapsed = [record["elapsed_ms"] for record in records]
+        planned = [record for record in records if "plan" in record]
+        report.append({
+            "operation": operation,
+            "call_sites": sorted({record["call_site"] for record in records}),
+            "count": len(records),
+            "total_ms": round(sum(elapsed), 1),
+            "median_ms": round(statistics.median(elapsed), 1),
+            "max_ms": max(elapsed),
+            "last_seen": records[-1]["at"],
+            "statement": " ".join(statement.split()),
+            "findings": plan_findings(planned[-1]["plan"]) if planned else None,
+        })
+    report.sort(key=lambda entry: entry["total_ms"], reverse=True)
+    return report[:top]
+
+
+def _print_report(report: list[dict]):
+    for entry in report:
+        print(
+            f"{entry['total_ms']:>10.0f} ms total | {entry['count']:>5}x | mediana {entry['median_ms']:.0f} ms"
+            f" | máx {entry['max_ms']:.0f} ms | {entry['operation']}"
+        )
+        print(f"    {', '.join(entry['call_sites'])}")
+        print(f"    {entry['statement'][:200]}")
+        findings = entry["findings"]
+        if findings:
+            print(
+                f"    índices: {', '.join(findings['indexes']) or '-'}"
+                f" | seq scan: {', '.join(findings['seq_scans']) or '-'}"
+                f" | blocos lidos/cache: {findings['shared_read_blocks']}/{findings['shared_hit_blocks']}"
+                f" | temp: {findings['temp_written_blocks']}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de consultas lentas")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Agrupa as consultas lentas registradas")
+    report_parser.add_argument("--path", type=Path, default=None, help="Padrão: SLOW_QUERY_LOG_PATH")
+    report_parser.add_argument("--top", type=int, default=20)
+    report_parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = parser.parse_args()
+
+    path = args.path or Path(settings.SLOW_QUERY_LOG_PATH)
+    if not path.exists():
+        parser.error(f"Nenhuma consulta lenta registrada em {path}")
+    report = build_report(path, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
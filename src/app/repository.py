@@ -1,10 +1,14 @@
 # crud.py
 
-from datetime import datetime
-from sqlalchemy import func, or_, String
+import heapq
+import itertools
+from datetime import date, datetime
+from sqlalchemy import and_, BigInteger, case, cast, func
 from sqlalchemy.orm import Session, Query
 import pandas as pd
-from app import models
+from app import archive, cache, dictionary, frames, metrics, models, rollup, search, sketches
+from app.incremental import Incremental
+from app.config import settings
 
 # ... (COLUMN_MAP and _apply_filters_and_sorting remain the same) ...
 # Mapeia os nomes das colunas que o usuário vê para os atributos do modelo SQLAlchemy.
@@ -13,12 +17,31 @@ COLUMN_MAP = {
     "Ticket Code": models.ItemModel.ticket_code,
     "Num Cupom": models.ItemModel.num_cupom,
     "Num Caixa": models.ItemModel.num_caixa,
-    "Hostname": models.ItemModel.hostname,
+    "Hostname": dictionary.hostnames.label,
     "Num Ped ECF": models.ItemModel.num_ped_ecf,
     "Valor Total": models.ItemModel.vl_total,
     "Criado em": models.ItemModel.created_at,
 }
 
+# Colunas da tabela analítica do dashboard, na ordem exibida; os rótulos
+# exigem a junção de table_query
+TABLE_COLUMNS = (
+    models.ItemModel.ticket_code,
+    models.ItemModel.num_cupom,
+    models.ItemModel.num_caixa,
+    dictionary.hostnames.label,
+    models.ItemModel.num_ped_ecf,
+    models.ItemModel.vl_total,
+    dictionary.operation_types.label,
+    models.ItemModel.success,
+    models.ItemModel.created_at,
+)
+
+
+def table_query(db: Session) -> Query:
+    """Consulta das colunas de ``TABLE_COLUMNS``, com os dicionários já juntados."""
+    return dictionary.with_labels(db.query(*TABLE_COLUMNS), dictionary.hostnames, dictionary.operation_types)
+
 
 def _apply_filters_and_sorting(
     query: Query,
@@ -34,18 +57,14 @@ def _apply_filters_and_sorting(
     # Filtros de data e tipo de operação (sempre aplicados)
     query = query.filter(
         models.ItemModel.created_at.between(start_date, end_date),
-        models.ItemModel.operation_type.in_(operation_types)
+        models.ItemModel.operation_type_id.in_(dictionary.operation_types.ids(query.session, operation_types))
     )
 
     # Filtro de busca (se um termo for fornecido)
     if search_term:
-        # Busca em várias colunas. Converte colunas numéricas para String para usar 'ilike'.
-        search_filter = or_(
-            models.ItemModel.ticket_code.ilike(f"%{search_term}%"),
-            models.ItemModel.num_cupom.cast(String).ilike(f"%{search_term}%"),
-            models.ItemModel.num_caixa.cast(String).ilike(f"%{search_term}%")
-        )
-        query = query.filter(search_filter)
+        # Substring em ticket_code, num_cupom e num_caixa, com índice (ver app.search)
+        dialect = query.session.get_bind().dialect.name
+        query = query.filter(search.search_filter(dialect, search_term))
 
     # Apply sorting only if requested
     if apply_sorting:
@@ -62,32 +81,129 @@ def _apply_filters_and_sorting(
     return query
 
 
+def _table_order(db: Session, sort_by: str | None, sort_order: str) -> tuple[str, bool, bool]:
+    """Campo, ordem decrescente e NULLs por último de ``_apply_filters_and_sorting``."""
+    column = COLUMN_MAP.get(sort_by) if sort_by else None
+    field = column.key if column is not None else "created_at"
+    descending = column is None or sort_order != 'asc'
+    # NULL é o maior valor no PostgreSQL e o menor no SQLite
+    null_largest = db.get_bind().dialect.name == 'postgresql'
+    return field, descending, null_largest != descending
+
+
+def _archived_rows(db: Session, archived, operation_types, search_term, sort_by, sort_order):
+    """Linhas do trecho arquivado com o id no fim, na ordem da tabela (ver archive.table_rows)."""
+    if archived is None:
+        return iter(())
+    return archive.table_rows(
+        *archived, operation_types, search_term, *_table_order(db, sort_by, sort_order), with_id=True,
+    )
+
+
+def _merge_tiers(db: Session, hot_rows, archived_rows, sort_by: str | None = None, sort_order: str = 'desc'):
+    """Junta as linhas do banco e as do arquivo, cada parte já ordenada e com o id no fim.
+
+    Empates são desfeitos pelo id decrescente, como no banco; o id sai das linhas devolvidas.
+    """
+    field, descending, nulls_last = _table_order(db, sort_by, sort_order)
+    if field == "created_at":
+        # Os trechos não se sobrepõem no tempo: o arquivo é todo anterior ao cutoff
+        merged = itertools.chain(hot_rows, archived_rows) if descending else itertools.chain(archived_rows, hot_rows)
+    else:
+        key = archive.sort_key(field, descending, nulls_last)
+        merged = heapq.merge(hot_rows, archived_rows, key=key, reverse=descending)
+    return (tuple(row)[:-1] for row in merged)
+
+
+def _merge_table_rows(db: Session, rows: list, new_rows: list, *args):
+    # Mesma ordem de _apply_filters_and_sorting sem sort_by: created_at decrescente
+    added = [tuple(row)[1:] for row in new_rows]
+    return sorted(added + list(rows), key=lambda row: row[-1], reverse=True)
+
+
+def _merge_table_frame(db: Session, frame: pd.DataFrame, new_rows: list, *args):
+    added = frames.rows_to_frame([tuple(row)[1:] for row in new_rows])
+    merged = frames.concat([added, frame])
+    # Mesma ordem de _apply_filters_and_sorting sem sort_by: created_at decrescente
+    return merged.sort_values("Criado em", ascending=False, kind="stable", ignore_index=True)
+
+
+@metrics.track
+@cache.cached("items", incremental=Incremental(TABLE_COLUMNS, _merge_table_rows))
 def get_items_by_date(
     db: Session, 
     start_date: datetime, 
     end_date: datetime, 
     operation_types: tuple[str, ...],
 ):
-    """Busca itens de forma paginada, com busca e ordenação."""
-    base_query = db.query(
-        models.ItemModel.ticket_code,
-        models.ItemModel.num_cupom,
-        models.ItemModel.num_caixa,
-        models.ItemModel.hostname,
-        models.ItemModel.num_ped_ecf,
-        models.ItemModel.vl_total,
-        models.ItemModel.operation_type,
-        models.ItemModel.success,
-        models.ItemModel.created_at
-    )
-    
-    query = _apply_filters_and_sorting(
-        base_query, start_date, end_date, operation_types,
-    )
-    
-    return query.all()
+    """Itens do filtro, do mais novo ao mais antigo; antes do cutoff, do arquivo Parquet."""
+    archived, hot = archive.split_tiers(start_date, end_date)
+    if archived is None:
+        return _apply_filters_and_sorting(table_query(db), *hot, operation_types).all()
+    query = table_query(db).add_columns(models.ItemModel.id)
+    rows = _apply_filters_and_sorting(query, *hot, operation_types).all() if hot else []
+    return list(_merge_tiers(db, rows, _archived_rows(db, archived, operation_types, None, None, 'desc')))
+
+
+@metrics.track
+@cache.cached("items_frame", incremental=Incremental(TABLE_COLUMNS, _merge_table_frame))
+def get_items_frame(
+    db: Session,
+    start_date: datetime,
+    end_date: datetime,
+    operation_types: tuple[str, ...],
+) -> pd.DataFrame:
+    """Mesmos itens de ``get_items_by_date`` já como DataFrame colunar (ver app.frames)."""
+    archived, hot = archive.split_tiers(start_date, end_date)
+    parts = []
+    if hot is not None:
+        query = _apply_filters_and_sorting(table_query(db), *hot, operation_types)
+        parts.append(frames.load_frame(db, query.statement))
+    if archived is not None:
+        # Do mais novo ao mais antigo, como o trecho do banco, em blocos de tuplas
+        rows = archive.table_rows(*archived, operation_types, None, *_table_order(db, None, 'desc'))
+        parts.extend(frames.rows_to_frame(chunk) for chunk in iter(lambda: list(itertools.islice(rows, 50_000)), []))
+    if not parts:
+        return frames.rows_to_frame([])
+    return parts[0] if len(parts) == 1 else frames.concat(parts)
+
+
+@metrics.track
+@cache.cached("items_page")
+def get_items_page(
+    db: Session,
+    start_date: datetime,
+    end_date: datetime,
+    operation_types: tuple[str, ...],
+    search_term: str | None = None,
+    sort_by: str | None = None,
+    sort_order: str = 'desc',
+    limit: int = 1000,
+    offset: int = 0,
+):
+    """Uma página da tabela analítica, com busca e ordenação no banco.
+
+    Se o intervalo começa antes do cutoff do arquivo, a página sai da junção
+    ordenada das duas partes (ver ``_merge_tiers``).
+    """
+    archived, hot = archive.split_tiers(start_date, end_date)
+    rows = []
+    if hot is not None:
+        query = _apply_filters_and_sorting(
+            table_query(db), *hot, operation_types, search_term, sort_by, sort_order,
+        )
+        # Desempate pelo id para que as páginas não repitam nem pulem linhas
+        query = query.order_by(models.ItemModel.id.desc())
+        if archived is None:
+            return query.offset(offset).limit(limit).all()
+        # Até offset + limit linhas de cada parte bastam para a página
+        rows = query.add_columns(models.ItemModel.id).limit(offset + limit).all()
+    archived_rows = _archived_rows(db, archived, operation_types, search_term, sort_by, sort_order)
+    return list(itertools.islice(_merge_tiers(db, rows, archived_rows, sort_by, sort_order), offset, offset + limit))
 
 
+@metrics.track
+@cache.cached("count")
 def count_items_by_date(
     db: Session, 
     start_date: datetime, 
@@ -96,60 +212,165 @@ def count_items_by_date(
     search_term: str | None = None
 ) -> int:
     """Conta o total de itens para os filtros, incluindo o de busca."""
+    archived, hot = archive.split_tiers(start_date, end_date)
+    total = archive.count_items(*archived, operation_types, search_term) if archived else 0
+    if hot is None:
+        return total
+
     base_query = db.query(func.count(models.ItemModel.id))
     
     # Apply filters but NOT sorting for the count query
     query = _apply_filters_and_sorting(
-        base_query, start_date, end_date, operation_types, search_term, apply_sorting=False
+        base_query, *hot, operation_types, search_term, apply_sorting=False
     )
     
     # O scalar() retorna um único valor, que é o resultado do COUNT
     result = query.scalar()
-    return result if result is not None else 0
+    return total + (result if result is not None else 0)
     
 # ... (rest of the file remains the same) ...
-def get_kpi_data(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
-    """Calcula os KPIs diretamente no banco de dados."""
-    current_year = datetime.now().year
-    current_month = datetime.now().month
+KPI_KEYS = ("desconto_ano", "desconto_mes_atual", "validacao_manual", "validacao_automatica")
 
-    base_query = db.query(models.ItemModel).filter(
-        models.ItemModel.created_at.between(start_date, end_date),
-        models.ItemModel.operation_type.in_(operation_types),
-        models.ItemModel.success == True
+
+def _as_date(value) -> date:
+    # func.date() devolve str no SQLite e date no PostgreSQL
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _merge_grouped(rows, key_size: int) -> dict:
+    """Soma as colunas de valor de linhas agrupadas vindas de fontes diferentes."""
+    merged = {}
+    for row in rows:
+        key, values = tuple(row[:key_size]), row[key_size:]
+        if key in merged:
+            merged[key] = [a + b for a, b in zip(merged[key], values)]
+        else:
+            merged[key] = list(values)
+    return merged
+
+
+def _plan_sources(start_date: datetime, end_date: datetime) -> list[tuple[str, object, object]]:
+    """Decide de onde ler cada trecho do intervalo.
+
+    Retorna tuplas ``(fonte, início, fim)``: ``archive`` para o que está antes do
+    cutoff do arquivo Parquet, ``rollup`` para dias inteiros da parte quente e
+    ``items`` para as pontas parciais (ou tudo, com o rollup desligado).
+    """
+    archived, hot = archive.split_tiers(start_date, end_date)
+    plan = [("archive", *archived)] if archived else []
+    if hot is None:
+        return plan
+    if not settings.DASHBOARD_USE_ROLLUP:
+        return plan + [("items", *hot)]
+    segments, full_days = rollup.split_range(*hot)
+    plan.extend(("items", start, end) for start, end in segments)
+    if full_days:
+        plan.append(("rollup", *full_days))
+    return plan
+
+
+def _current_periods(now: datetime) -> tuple[datetime, datetime, datetime, datetime]:
+    """Limites [início, fim) do ano e do mês correntes, para filtros sargáveis."""
+    year_start = datetime(now.year, 1, 1)
+    year_end = datetime(now.year + 1, 1, 1)
+    month_start = datetime(now.year, now.month, 1)
+    month_end = datetime(now.year + (now.month == 12), now.month % 12 + 1, 1)
+    return year_start, year_end, month_start, month_end
+
+
+def _kpi_from_items(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    year_start, year_end, month_start, month_end = _current_periods(datetime.now())
+    item = models.ItemModel
+    operation_type_ids = dictionary.operation_types.ids
+
+    # Uma única varredura com agregação condicional no lugar de quatro COUNTs
+    row = (
+        db.query(
+            func.count(),
+            func.count(case((and_(item.created_at >= month_start, item.created_at < month_end), 1))),
+            func.count(case((item.operation_type_id.in_(operation_type_ids(db, ['MANUAL_VALIDATION'])), 1))),
+            func.count(case((item.operation_type_id.in_(operation_type_ids(db, ['AUTOMATIC_VALIDATION'])), 1))),
+        )
+        .filter(
+            item.created_at.between(start_date, end_date),
+            item.created_at >= year_start,
+            item.created_at < year_end,
+            item.operation_type_id.in_(operation_type_ids(db, operation_types)),
+            item.success == True
+        )
+        .one()
     )
-    
-    # Usamos .with_entities para especificar o que contar, o que pode ser mais eficiente
-    desconto_ano_total = base_query.filter(
-        func.extract('year', models.ItemModel.created_at) == current_year
-    ).with_entities(func.count()).scalar() or 0
-
-    desconto_mes_atual = base_query.filter(
-        func.extract('year', models.ItemModel.created_at) == current_year,
-        func.extract('month', models.ItemModel.created_at) == current_month
-    ).with_entities(func.count()).scalar() or 0
-
-    validacao_manual = base_query.filter(
-        func.extract('year', models.ItemModel.created_at) == current_year,
-        models.ItemModel.operation_type == 'MANUAL_VALIDATION'
-    ).with_entities(func.count()).scalar() or 0
-    
-    validacao_automatica = base_query.filter(
-        func.extract('year', models.ItemModel.created_at) == current_year,
-        models.ItemModel.operation_type == 'AUTOMATIC_VALIDATION'
-    ).with_entities(func.count()).scalar() or 0
+    return dict(zip(KPI_KEYS, row))
 
-    return {
-        "desconto_ano": desconto_ano_total,
-        "desconto_mes_atual": desconto_mes_atual,
-        "validacao_manual": validacao_manual,
-        "validacao_automatica": validacao_automatica
-    }
 
+def _kpi_from_rollup(db: Session, start_day: date, end_day: date, operation_types: tuple[str, ...]):
+    year_start, year_end, month_start, month_end = _current_periods(datetime.now())
+    rollup_model = models.ItemDailyRollupModel
 
-def get_daily_counts(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
-    """Retorna a contagem de sucessos e falhas agrupadas por dia."""
-    result = (
+    # sum(bigint) no PostgreSQL devolve numeric; o cast mantém as contagens inteiras
+    def conditional_sum(condition):
+        return cast(func.sum(case((condition, rollup_model.item_count), else_=0)), BigInteger)
+
+    row = (
+        db.query(
+            cast(func.sum(rollup_model.item_count), BigInteger),
+            conditional_sum(and_(rollup_model.day >= month_start.date(), rollup_model.day < month_end.date())),
+            conditional_sum(rollup_model.operation_type == 'MANUAL_VALIDATION'),
+            conditional_sum(rollup_model.operation_type == 'AUTOMATIC_VALIDATION'),
+        )
+        .filter(
+            rollup_model.day.between(start_day, end_day),
+            rollup_model.day >= year_start.date(),
+            rollup_model.day < year_end.date(),
+            rollup_model.operation_type.in_(operation_types),
+            rollup_model.success == True
+        )
+        .one()
+    )
+    return {key: value or 0 for key, value in zip(KPI_KEYS, row)}
+
+
+def _kpi_from_archive(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    counts = archive.kpi_counts(start_date, end_date, operation_types, *_current_periods(datetime.now()))
+    return dict(zip(KPI_KEYS, counts))
+
+
+_KPI_READERS = {"items": _kpi_from_items, "rollup": _kpi_from_rollup, "archive": _kpi_from_archive}
+
+
+def _merge_kpi(db: Session, kpi: dict, new_rows: list, *args):
+    year_start, year_end, month_start, month_end = _current_periods(datetime.now())
+    kpi = dict(kpi)
+    for row in new_rows:
+        if not row.success or not year_start <= row.created_at < year_end:
+            continue
+        kpi["desconto_ano"] += 1
+        kpi["desconto_mes_atual"] += month_start <= row.created_at < month_end
+        kpi["validacao_manual"] += row.operation_type == 'MANUAL_VALIDATION'
+        kpi["validacao_automatica"] += row.operation_type == 'AUTOMATIC_VALIDATION'
+    return kpi
+
+
+# Os KPIs dependem do ano e do mês correntes, além dos filtros
+@metrics.track
+@cache.cached(
+    "kpi",
+    key_extra=lambda: f"{datetime.now():%Y-%m}",
+    incremental=Incremental(
+        (models.ItemModel.created_at, dictionary.operation_types.label, models.ItemModel.success), _merge_kpi
+    ),
+)
+def get_kpi_data(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    """Calcula os KPIs diretamente no banco de dados."""
+    parts = [
+        _KPI_READERS[source](db, start, end, operation_types)
+        for source, start, end in _plan_sources(start_date, end_date)
+    ]
+    return {key: sum(part[key] for part in parts) for key in KPI_KEYS}
+
+
+def _daily_counts_from_items(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    return (
         db.query(
             func.date(models.ItemModel.created_at).label('data'),
             models.ItemModel.success,
@@ -157,33 +378,245 @@ def get_daily_counts(db: Session, start_date: datetime, end_date: datetime, oper
         )
         .filter(
             models.ItemModel.created_at.between(start_date, end_date),
-            models.ItemModel.operation_type.in_(operation_types)
+            models.ItemModel.operation_type_id.in_(dictionary.operation_types.ids(db, operation_types))
         )
         .group_by('data', models.ItemModel.success)
         .order_by('data')
         .all()
     )
+
+
+def _daily_counts_from_rollup(db: Session, start_day: date, end_day: date, operation_types: tuple[str, ...]):
+    rollup_model = models.ItemDailyRollupModel
+    return (
+        db.query(
+            rollup_model.day,
+            rollup_model.success,
+            cast(func.sum(rollup_model.item_count), BigInteger)
+        )
+        .filter(
+            rollup_model.day.between(start_day, end_day),
+            rollup_model.operation_type.in_(operation_types)
+        )
+        .group_by(rollup_model.day, rollup_model.success)
+        .all()
+    )
+
+
+def _daily_rows_from_items(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
     return [
-        {"Data": row.data, "Status": "Sucesso" if row.success else "Falha", "Quantidade": row.quantidade}
-        for row in result
+        (_as_date(row.data), row.success, row.quantidade)
+        for row in _daily_counts_from_items(db, start_date, end_date, operation_types)
+    ]
+
+
+def _daily_counts_from_archive(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    return archive.daily_counts(start_date, end_date, operation_types)
+
+
+_DAILY_READERS = {
+    "items": _daily_rows_from_items,
+    "rollup": _daily_counts_from_rollup,
+    "archive": _daily_counts_from_archive,
+}
+
+
+def _merge_daily_counts(db: Session, counts: list[dict], new_rows: list, *args):
+    merged = {(_as_date(row["Data"]), row["Status"] == "Sucesso"): row["Quantidade"] for row in counts}
+    for row in new_rows:
+        key = (row.created_at.date(), row.success)
+        merged[key] = merged.get(key, 0) + 1
+    return [
+        {"Data": data, "Status": "Sucesso" if success else "Falha", "Quantidade": quantidade}
+        for (data, success), quantidade in sorted(merged.items())
+    ]
+
+
+@metrics.track
+@cache.cached(
+    "daily_counts",
+    incremental=Incremental((models.ItemModel.created_at, models.ItemModel.success), _merge_daily_counts),
+)
+def get_daily_counts(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    """Retorna a contagem de sucessos e falhas agrupadas por dia."""
+    plan = _plan_sources(start_date, end_date)
+    if plan == [("items", start_date, end_date)]:
+        result = _daily_counts_from_items(db, start_date, end_date, operation_types)
+    else:
+        rows = [
+            row
+            for source, start, end in plan
+            for row in _DAILY_READERS[source](db, start, end, operation_types)
+        ]
+        merged = _merge_grouped(rows, key_size=2)
+        result = [(data, success, quantidade) for (data, success), (quantidade,) in sorted(merged.items())]
+    return [
+        {"Data": data, "Status": "Sucesso" if success else "Falha", "Quantidade": quantidade}
+        for data, success, quantidade in result
     ]
     
-    
-def get_hostname_caixa_distribution(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
-    """Retorna a contagem e a soma do valor total por junção de hostname e num_caixa."""
-    result = (
+
+def _distribution_from_items(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    # Agrupa pelos ids e traduz só as linhas do resultado
+    rows = (
         db.query(
-            models.ItemModel.hostname,
+            models.ItemModel.hostname_id,
             models.ItemModel.num_caixa,
             func.count(models.ItemModel.id).label('contagem'),
             func.sum(models.ItemModel.vl_total).label('valor_total')
         )
         .filter(
             models.ItemModel.created_at.between(start_date, end_date),
-            models.ItemModel.operation_type.in_(operation_types)
+            models.ItemModel.operation_type_id.in_(dictionary.operation_types.ids(db, operation_types))
         )
-        .group_by(models.ItemModel.hostname, models.ItemModel.num_caixa)
-        .order_by(models.ItemModel.hostname, models.ItemModel.num_caixa)
+        .group_by(models.ItemModel.hostname_id, models.ItemModel.num_caixa)
         .all()
     )
+    labels = dictionary.hostnames.labels(db, {row.hostname_id for row in rows})
+    return [
+        (labels.get(hostname_id), num_caixa, contagem, valor_total)
+        for hostname_id, num_caixa, contagem, valor_total in rows
+    ]
+
+
+def _distribution_from_rollup(db: Session, start_day: date, end_day: date, operation_types: tuple[str, ...]):
+    rollup_model = models.ItemDailyRollupModel
+    rows = (
+        db.query(
+            rollup_model.hostname,
+            rollup_model.num_caixa,
+            cast(func.sum(rollup_model.item_count), BigInteger),
+            func.sum(rollup_model.vl_total_sum)
+        )
+        .filter(
+            rollup_model.day.between(start_day, end_day),
+            rollup_model.operation_type.in_(operation_types)
+        )
+        .group_by(rollup_model.hostname, rollup_model.num_caixa)
+        .all()
+    )
+    return [
+        (
+            None if hostname == rollup.NULL_HOSTNAME else hostname,
+            None if num_caixa == rollup.NULL_NUM_CAIXA else num_caixa,
+            contagem,
+            valor_total,
+        )
+        for hostname, num_caixa, contagem, valor_total in rows
+    ]
+
+
+def _null_aware_key(nulls_first: bool):
+    """Reproduz a ordenação de NULLs do banco: primeiro no SQLite, por último no PostgreSQL."""
+    def key(row):
+        return tuple(((value is None) != nulls_first, value if value is not None else 0) for value in row[:2])
+    return key
+
+
+def _distribution_from_archive(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    return archive.distribution(start_date, end_date, operation_types)
+
+
+_DISTRIBUTION_READERS = {
+    "items": _distribution_from_items,
+    "rollup": _distribution_from_rollup,
+    "archive": _distribution_from_archive,
+}
+
+
+def _merge_distribution(db: Session, frame: pd.DataFrame, new_rows: list, *args):
+    rows = [
+        (hostname, None if pd.isna(num_caixa) else int(num_caixa), contagem, valor_total)
+        for hostname, num_caixa, contagem, valor_total in frame.itertuples(index=False)
+    ]
+    rows.extend((row.hostname, row.num_caixa, 1, row.vl_total) for row in new_rows)
+    merged = _merge_grouped(rows, key_size=2)
+    nulls_first = db.get_bind().dialect.name == 'sqlite'
+    result = sorted(((*key, *values) for key, values in merged.items()), key=_null_aware_key(nulls_first))
+    return pd.DataFrame(result, columns=['Hostname', 'Num Caixa', 'Contagem', 'Valor Total'])
+
+
+@metrics.track
+@cache.cached(
+    "distribution",
+    incremental=Incremental(
+        (dictionary.hostnames.label, models.ItemModel.num_caixa, models.ItemModel.vl_total), _merge_distribution
+    ),
+)
+def get_hostname_caixa_distribution(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    """Retorna a contagem e a soma do valor total por junção de hostname e num_caixa."""
+    plan = _plan_sources(start_date, end_date)
+    nulls_first = db.get_bind().dialect.name == 'sqlite'
+    if plan == [("items", start_date, end_date)]:
+        rows = _distribution_from_items(db, start_date, end_date, operation_types)
+        result = sorted(rows, key=_null_aware_key(nulls_first))
+    else:
+        rows = [
+            tuple(row)
+            for source, start, end in plan
+            for row in _DISTRIBUTION_READERS[source](db, start, end, operation_types)
+        ]
+        merged = _merge_grouped(rows, key_size=2)
+        result = sorted(((*key, *values) for key, values in merged.items()), key=_null_aware_key(nulls_first))
     return pd.DataFrame(result, columns=['Hostname', 'Num Caixa', 'Contagem', 'Valor Total'])
+
+
+SKETCH_COLUMNS = ['Tickets Distintos', 'P50', 'P95', 'P99']
+
+
+def _sketch_sources(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...],
+                    keys: list[str]) -> pd.DataFrame:
+    """Sketches de todo o intervalo, com as colunas ``keys`` (de ``day``, ``hostname`` e ``num_caixa``).
+
+    Dias inteiros vêm de ``items_daily_sketches`` (mantidos mesmo para meses
+    arquivados); as pontas parciais são resumidas na hora, de ``items`` ou do
+    arquivo.
+    """
+    segments, full_days = rollup.split_range(start_date, end_date)
+    parts = [sketches.read(db, *full_days, operation_types, keys)] if full_days else []
+    for start, end in segments:
+        archived, hot = archive.split_tiers(start, end)
+        if archived:
+            parts.append(sketches.summarize_archive(*archived, operation_types))
+        if hot:
+            parts.append(sketches.summarize_items(db, *hot, operation_types))
+    parts = [part[[*keys, 'item_count', 'tickets', 'vl_total']] for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=[*keys, 'item_count', 'tickets', 'vl_total'])
+    return pd.concat(parts, ignore_index=True)
+
+
+def _sketch_stats(merged: pd.DataFrame) -> pd.DataFrame:
+    return merged.rename(columns={
+        'distinct_tickets': 'Tickets Distintos', 'p50': 'P50', 'p95': 'P95', 'p99': 'P99',
+    })
+
+
+@metrics.track
+@cache.cached("caixa_sketch_stats")
+def get_hostname_caixa_sketch_stats(
+    db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]
+):
+    """Tickets distintos e percentis de valor total por hostname e num_caixa (aproximados, ver app.sketches)."""
+    keys = ['hostname', 'num_caixa']
+    merged = sketches.merge(_sketch_sources(db, start_date, end_date, operation_types, keys), keys)
+    rows = [
+        (
+            None if hostname == rollup.NULL_HOSTNAME else hostname,
+            None if num_caixa == rollup.NULL_NUM_CAIXA else int(num_caixa),
+            *values,
+        )
+        for hostname, num_caixa, *values in _sketch_stats(merged)[['hostname', 'num_caixa', *SKETCH_COLUMNS]]
+        .itertuples(index=False)
+    ]
+    nulls_first = db.get_bind().dialect.name == 'sqlite'
+    result = sorted(rows, key=_null_aware_key(nulls_first))
+    return pd.DataFrame(result, columns=['Hostname', 'Num Caixa', *SKETCH_COLUMNS])
+
+
+@metrics.track
+@cache.cached("daily_sketch_stats")
+def get_daily_sketch_stats(db: Session, start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]):
+    """Tickets distintos e percentis de valor total por dia (aproximados, ver app.sketches)."""
+    merged = sketches.merge(_sketch_sources(db, start_date, end_date, operation_types, ['day']), ['day'])
+    return _sketch_stats(merged)[['day', *SKETCH_COLUMNS]].rename(columns={'day': 'Data'})
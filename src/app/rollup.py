@@ -0,0 +1,172 @@
+# rollup.py
+"""Manutenção do agregado diário ``items_daily_rollup``.
+
+O rollup é incrementado na mesma transação da ingestão (``apply_items``) e pode
+ser reconstruído a partir de ``items`` com::
+
+    python -m app.rollup rebuild [--start AAAA-MM-DD] [--end AAAA-MM-DD]
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import cache, models
+from app.database import MaintenanceSessionLocal
+
+NULL_HOSTNAME = ''
+NULL_NUM_CAIXA = -1
+
+_KEY_COLUMNS = ('day', 'operation_type', 'success', 'hostname', 'num_caixa')
+
+
+def _upsert(db: Session):
+    dialect = db.get_bind().dialect.name
+    insert_fn = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+    stmt = insert_fn(models.ItemDailyRollupModel)
+    return stmt.on_conflict_do_update(
+        index_elements=list(_KEY_COLUMNS),
+        set_={
+            'item_count': models.ItemDailyRollupModel.item_count + stmt.excluded.item_count,
+            'vl_total_sum': models.ItemDailyRollupModel.vl_total_sum + stmt.excluded.vl_total_sum,
+        },
+    )
+
+
+def apply_items(db: Session, rows: Iterable[dict]) -> None:
+    """Soma itens recém-inseridos ao rollup, sem fazer commit.
+
+    Cada linha precisa de ``created_at``, ``operation_type``, ``success``,
+    ``hostname``, ``num_caixa`` e ``vl_total``.
+    """
+    aggregated = defaultdict(lambda: [0, 0.0])
+    for row in rows:
+        key = (
+            row['created_at'].date(),
+            row['operation_type'],
+            row['success'],
+            row['hostname'] if row['hostname'] is not None else NULL_HOSTNAME,
+            row['num_caixa'] if row['num_caixa'] is not None else NULL_NUM_CAIXA,
+        )
+        aggregated[key][0] += 1
+        aggregated[key][1] += row['vl_total']
+    if not aggregated:
+        return
+
+    # Ordem estável das chaves evita deadlock entre ingestões concorrentes
+    values = [
+        {**dict(zip(_KEY_COLUMNS, key)), 'item_count': count, 'vl_total_sum': total}
+        for key, (count, total) in sorted(aggregated.items())
+    ]
+    db.execute(_upsert(db), values)
+
+
+def rebuild(db: Session, start: date | None = None, end: date | None = None) -> int:
+    """Recalcula o rollup dos dias em ``[start, end]`` (todos se omitidos) a partir de ``items``.
+
+    Retorna o número de linhas do rollup gravadas.
+    """
+    rollup = models.ItemDailyRollupModel
+    item = models.ItemModel
+
+    if db.get_bind().dialect.name == 'postgresql':
+        # Bloqueia ingestões concorrentes até o commit para não perder nem duplicar incrementos
+        db.execute(text('LOCK TABLE items_daily_rollup IN EXCLUSIVE MODE'))
+
+    delete_stmt = delete(rollup)
+    day = func.date(item.created_at)
+    num_caixa = func.coalesce(item.num_caixa, NULL_NUM_CAIXA)
+    grouped = select(
+        day.label('day'),
+        item.operation_type_id,
+        item.success,
+        item.hostname_id,
+        num_caixa.label('num_caixa'),
+        func.count(item.id).label('item_count'),
+        func.sum(item.vl_total).label('vl_total_sum'),
+    )
+    if start is not None:
+        delete_stmt = delete_stmt.where(rollup.day >= start)
+        grouped = grouped.where(item.created_at >= datetime.combine(start, time.min))
+    if end is not None:
+        delete_stmt = delete_stmt.where(rollup.day <= end)
+        grouped = grouped.where(item.created_at < datetime.combine(end + timedelta(days=1), time.min))
+    # Agrupa pelos ids e só depois junta os rótulos dos dicionários
+    grouped = grouped.group_by(
+        day, item.operation_type_id, item.success, item.hostname_id, num_caixa,
+    ).subquery()
+    hostname = func.coalesce(models.HostnameModel.name, NULL_HOSTNAME)
+    source = (
+        select(
+            grouped.c.day,
+            models.OperationTypeModel.name,
+            grouped.c.success,
+            hostname,
+            grouped.c.num_caixa,
+            func.sum(grouped.c.item_count),
+            func.sum(grouped.c.vl_total_sum),
+        )
+        .join(models.OperationTypeModel, models.OperationTypeModel.id == grouped.c.operation_type_id)
+        .outerjoin(models.HostnameModel, models.HostnameModel.id == grouped.c.hostname_id)
+        # Hostname nulo e '' caem na mesma chave do rollup
+        .group_by(
+            grouped.c.day, models.OperationTypeModel.name, grouped.c.success, hostname, grouped.c.num_caixa,
+        )
+    )
+
+    db.execute(delete_stmt)
+    result = db.execute(
+        insert(rollup).from_select([*_KEY_COLUMNS, 'item_count', 'vl_total_sum'], source)
+    )
+    db.commit()
+    cache.invalidate_all()
+    return result.rowcount
+
+
+def split_range(
+    start_date: datetime, end_date: datetime
+) -> tuple[list[tuple[datetime, datetime]], tuple[date, date] | None]:
+    """Divide ``[start_date, end_date]`` entre dias completos e pontas parciais.
+
+    Retorna os trechos parciais, que precisam ser lidos de ``items``, e o
+    intervalo de dias inteiros (inclusivo) que pode ser lido do rollup.
+    """
+    first_day = start_date.date()
+    if start_date != datetime.combine(first_day, time.min):
+        first_day += timedelta(days=1)
+    last_day = end_date.date()
+    if end_date < datetime.combine(last_day, time.max):
+        last_day -= timedelta(days=1)
+
+    if first_day > last_day:
+        return [(start_date, end_date)], None
+
+    segments = []
+    head_end = datetime.combine(first_day, time.min)
+    if start_date < head_end:
+        segments.append((start_date, head_end - timedelta(microseconds=1)))
+    tail_start = datetime.combine(last_day + timedelta(days=1), time.min)
+    if end_date >= tail_start:
+        segments.append((tail_start, end_date))
+    return segments, (first_day, last_day)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção do rollup diário de items")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recalcula o rollup a partir de items")
+    rebuild_parser.add_argument("--start", type=date.fromisoformat, default=None)
+    rebuild_parser.add_argument("--end", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    with MaintenanceSessionLocal() as db:
+        rows = rebuild(db, args.start, args.end)
+    print(f"Rollup reconstruído: {rows} linhas")
+
+
+if __name__ == "__main__":
+    main()
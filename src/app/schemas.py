@@ -48,4 +48,24 @@ class ItemCreate(ItemBase):
 
 class Item(ItemBase):
     id: int
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Campos aceitos em GET /items?fields=, na ordem da resposta
+ITEM_FIELDS = tuple(Item.model_fields)
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    accepted: bool
+    id: int | None = None
+    # Já gravado antes (ou repetido no lote): id é o do item original
+    duplicate: bool = False
+    errors: list[str] = []
+
+
+class BulkItemsResponse(BaseModel):
+    accepted: int
+    rejected: int
+    duplicates: int = 0
+    results: list[BulkItemResult]
@@ -0,0 +1,88 @@
+# search.py
+"""Filtro de busca por ``search_term`` com suporte de índice.
+
+O termo casa como substring (``ilike '%termo%'``) em ``ticket_code`` e no texto
+de ``num_cupom`` / ``num_caixa``: "12" encontra o cupom 1234.
+
+- PostgreSQL: índices GIN de trigramas em ``ticket_code`` (migração
+  ``d7a3b5c9e1f2``) e em ``CAST(num_cupom AS TEXT)`` / ``CAST(num_caixa AS
+  TEXT)`` (migração ``b6d8f0a2c4e7``); o ``OR`` vira um BitmapOr entre eles.
+- SQLite: a tabela FTS5 ``items_ticket_fts`` com tokenizador ``trigram``
+  indexa as três colunas e é mantida por triggers (ver ``models.py``).
+
+As colunas numéricas só entram na condição quando o termo pode aparecer no
+texto de um inteiro (dígitos e ``-``). Termos só de dígitos também casam por
+igualdade (``num_cupom = n OR num_caixa = n``), atendida pelos B-trees das
+colunas: é o caminho rápido para termos curtos, que os trigramas não cobrem.
+"""
+from sqlalchemy import Text, cast, column, or_, select, table, union
+
+from app import models
+
+# O tokenizador trigram só usa o índice com pelo menos 3 caracteres
+_MIN_TRIGRAM_LENGTH = 3
+_NUMBER_CHARACTERS = frozenset("-0123456789")
+_MAX_BIGINT = 2**63 - 1
+NUMBER_COLUMNS = ("num_cupom", "num_caixa")
+
+_fts = table(models.ITEMS_FTS_TABLE, column("rowid"), column("ticket_code"), *map(column, NUMBER_COLUMNS))
+
+
+def numeric_term(search_term: str) -> int | None:
+    """Valor inteiro do termo, se ele puder ser igual a um num_cupom/num_caixa."""
+    if not search_term.isdigit() or not search_term.isascii():
+        return None
+    value = int(search_term)
+    return value if value <= _MAX_BIGINT else None
+
+
+def _equal_conditions(search_term: str) -> list:
+    value = numeric_term(search_term)
+    if value is None:
+        return []
+    return [getattr(models.ItemModel, name) == value for name in NUMBER_COLUMNS]
+
+
+def matches_numbers(search_term: str) -> bool:
+    """Se o termo pode ser substring do texto de um num_cupom/num_caixa."""
+    return bool(search_term) and set(search_term) <= _NUMBER_CHARACTERS
+
+
+def _sqlite_filter(search_term: str):
+    """Uma única lista de ids (``IN``) para o planner do SQLite buscar por rowid.
+
+    Com ``OR`` entre as condições o SQLite tende a preferir o índice de
+    operation_type e varrer a tabela.
+    """
+    item = models.ItemModel
+    pattern = f"%{search_term}%"
+    names = ["ticket_code", *NUMBER_COLUMNS] if matches_numbers(search_term) else ["ticket_code"]
+    if len(search_term) >= _MIN_TRIGRAM_LENGTH:
+        # LIKE (já sem distinção de maiúsculas no SQLite) sobre a tabela FTS5
+        # trigram usa o índice e mantém a semântica do ilike
+        selects = [select(_fts.c.rowid).where(_fts.c[name].like(pattern)) for name in names]
+    else:
+        # Sem trigramas: o ticket_code é varrido; o texto das colunas numéricas
+        # também, salvo pelo caminho da igualdade abaixo
+        selects = [select(item.id).where(cast(getattr(item, name), Text).ilike(pattern)) for name in names]
+    selects.extend(select(item.id).where(condition) for condition in _equal_conditions(search_term))
+    # Sem correlate(None) o items da subquery seria ligado ao items externo
+    selects = [stmt.correlate(None) for stmt in selects]
+    ids = union(*selects) if len(selects) > 1 else selects[0]
+    return item.id.in_(ids)
+
+
+def search_filter(dialect: str, search_term: str):
+    """Condição de busca do termo para o dialeto informado."""
+    if dialect == "sqlite":
+        return _sqlite_filter(search_term)
+    pattern = f"%{search_term}%"
+    conditions = [models.ItemModel.ticket_code.ilike(pattern)]
+    if matches_numbers(search_term):
+        # CAST AS TEXT igual à expressão dos índices de trigramas
+        conditions.extend(
+            cast(getattr(models.ItemModel, name), Text).ilike(pattern) for name in NUMBER_COLUMNS
+        )
+    # O OR vira BitmapOr entre os GIN de trigramas e os B-trees das colunas
+    conditions.extend(_equal_conditions(search_term))
+    return or_(*conditions)
@@ -0,0 +1,495 @@
+# sketches.py
+"""Sketches diários mescláveis de ``items`` em ``items_daily_sketches``.
+
+Para cada dia e ``(operation_type, hostname, num_caixa)`` são guardados:
+
+- ``tickets``: HyperLogLog (precisão 12, 4096 registradores, erro padrão ~1,6%)
+  dos ``ticket_code``, como a lista dos registradores ocupados (4 bytes cada:
+  índice e valor);
+- ``vl_total``: t-digest (escala k1) dos valores, como centroides de 12 bytes
+  (média e peso); até ``DIGEST_COMPRESSION`` centroides os valores ficam
+  exatos, com peso 1.
+
+Os dois se combinam sem perda por qualquer agrupamento (o HLL pelo máximo de
+cada registrador, o t-digest pela união dos centroides) e a concatenação de
+dois sketches serializados é um sketch válido da união. Assim o PostgreSQL
+junta as linhas de cada grupo com ``string_agg`` e contagens distintas e
+percentis de qualquer intervalo de datas saem da mesclagem dos dias, sem reler
+``items``.
+
+A ingestão grava uma linha nova por chave a cada lote (``apply_items``), sem
+ler nem travar as anteriores; ``compact`` junta as linhas de mesma chave. A API
+compacta os dias recentes a cada ``SKETCH_COMPACT_INTERVAL_S`` segundos
+(``app.ingest.SketchCompactor``); o comando cobre qualquer intervalo::
+
+    python -m app.sketches compact [--start AAAA-MM-DD] [--end AAAA-MM-DD]
+    python -m app.sketches rebuild [--start AAAA-MM-DD] [--end AAAA-MM-DD]
+"""
+import argparse
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, LargeBinary, cast, delete, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+
+from app import archive, cache, dictionary, models
+from app.database import MaintenanceSessionLocal
+from app.rollup import NULL_HOSTNAME, NULL_NUM_CAIXA
+
+HLL_PRECISION = 12
+DIGEST_COMPRESSION = 200
+QUANTILES = (0.5, 0.95, 0.99)
+
+KEY_COLUMNS = ('day', 'operation_type', 'hostname', 'num_caixa')
+
+_REGISTERS = 1 << HLL_PRECISION
+_RANK_BITS = 64 - HLL_PRECISION
+_ENTRY = np.dtype('<u4')
+_CENTROID = np.dtype([('mean', '<f8'), ('weight', '<u4')])
+
+
+def hash_tickets(values) -> np.ndarray:
+    """Hash de 64 bits estável entre processos (o ``hash()`` do Python não é)."""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+# --- HyperLogLog ---
+
+def _hll_registers(codes: np.ndarray, groups: int, hashes: np.ndarray) -> np.ndarray:
+    """Registradores (``groups`` x 4096) dos hashes de cada grupo."""
+    index = (hashes >> np.uint64(_RANK_BITS)).astype(np.int64)
+    rest = hashes & np.uint64((1 << _RANK_BITS) - 1)
+    # Posição do primeiro bit 1: frexp é exato para inteiros de até 53 bits
+    _, exponent = np.frexp(rest.astype(np.float64))
+    rank = (_RANK_BITS + 1 - exponent).astype(np.uint8)
+    return _max_registers(codes.astype(np.int64) * _REGISTERS + index, rank, groups)
+
+
+def _max_registers(positions: np.ndarray, rank: np.ndarray, groups: int) -> np.ndarray:
+    registers = np.zeros(groups * _REGISTERS, dtype=np.uint8)
+    # Em posições repetidas vale a última escrita; em ordem crescente, o máximo
+    order = np.argsort(rank, kind='stable')
+    registers[positions[order]] = rank[order]
+    return registers.reshape(groups, _REGISTERS)
+
+
+def encode_hll(registers: np.ndarray) -> bytes:
+    occupied = np.flatnonzero(registers)
+    return ((occupied.astype(np.uint32) << 8) | registers[occupied]).astype(_ENTRY).tobytes()
+
+
+def _merge_hll(codes: np.ndarray, groups: int, blobs) -> np.ndarray:
+    """Registradores de cada grupo a partir dos HLL serializados de ``codes``."""
+    entries = np.frombuffer(b''.join(blobs), dtype=_ENTRY)
+    owners = np.repeat(codes.astype(np.int64), [len(blob) // _ENTRY.itemsize for blob in blobs])
+    return _max_registers(
+        owners * _REGISTERS + (entries >> 8).astype(np.int64), (entries & 0xFF).astype(np.uint8), groups
+    )
+
+
+def _sigma(x: np.ndarray) -> np.ndarray:
+    result = x.copy()
+    power, weight = x.copy(), 1.0
+    for _ in range(64):
+        power = power * power
+        result += power * weight
+        weight *= 2
+    return result
+
+
+def _tau(x: np.ndarray) -> np.ndarray:
+    result = 1 - x
+    root, weight = x.copy(), 1.0
+    for _ in range(64):
+        root = np.sqrt(root)
+        weight *= 0.5
+        result -= (1 - root) ** 2 * weight
+    return result / 3
+
+
+def estimate_distinct(registers: np.ndarray) -> np.ndarray:
+    """Cardinalidade de cada linha de registradores.
+
+    Estimador de Ertl ("New cardinality estimation algorithms for HyperLogLog
+    sketches", 2017): sem viés em toda a faixa, sem tabelas de correção nem
+    troca para contagem linear.
+    """
+    groups = registers.shape[0]
+    histogram = np.bincount(
+        (np.arange(groups)[:, None] * (_RANK_BITS + 2) + registers).ravel(),
+        minlength=groups * (_RANK_BITS + 2),
+    ).reshape(groups, _RANK_BITS + 2).astype(np.float64)
+    m = float(_REGISTERS)
+    z = m * _tau(1 - histogram[:, _RANK_BITS + 1] / m)
+    for k in range(_RANK_BITS, 0, -1):
+        z = 0.5 * (z + histogram[:, k])
+    empty = histogram[:, 0] == m
+    z = z + m * _sigma(np.where(empty, 0.0, histogram[:, 0] / m))
+    estimate = m * m / (2 * np.log(2)) / z
+    return np.where(empty, 0.0, estimate)
+
+
+# --- t-digest ---
+
+def _decode_digests(codes: np.ndarray, blobs) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    centroids = np.frombuffer(b''.join(blobs), dtype=_CENTROID)
+    owners = np.repeat(codes, [len(blob) // _CENTROID.itemsize for blob in blobs])
+    return owners, centroids['mean'], centroids['weight'].astype(np.float64)
+
+
+def _sorted_centroids(owners, means, weights):
+    # Por média e depois, de forma estável, por grupo: cerca de duas vezes mais
+    # rápido que np.lexsort
+    order = np.argsort(means)
+    order = order[np.argsort(owners[order], kind='stable')]
+    return owners[order], means[order], weights[order]
+
+
+def _compress(owners, means, weights, groups: int):
+    """Junta centroides vizinhos de cada grupo pela escala k1 do t-digest.
+
+    Grupos com até ``DIGEST_COMPRESSION`` centroides ficam como estão.
+    """
+    owners, means, weights = _sorted_centroids(owners, means, weights)
+    if not len(means):
+        return owners, means, weights
+    bounds = np.searchsorted(owners, np.arange(groups + 1))
+    cumulative = np.r_[0.0, np.cumsum(weights)]
+    before = cumulative[bounds[:-1]]
+    total = cumulative[bounds[1:]] - before
+    quantile = (cumulative[1:] - weights / 2 - before[owners]) / total[owners]
+    bucket = np.floor(DIGEST_COMPRESSION / (2 * np.pi) * np.arcsin(2 * quantile - 1)).astype(np.int64)
+    # Grupos pequenos: cada valor fica no próprio centroide
+    small = np.diff(bounds)[owners] <= DIGEST_COMPRESSION
+    bucket = np.where(small, np.arange(len(means)), bucket)
+
+    starts = np.flatnonzero(np.r_[True, (owners[1:] != owners[:-1]) | (bucket[1:] != bucket[:-1])])
+    merged_weights = np.add.reduceat(weights, starts)
+    return owners[starts], np.add.reduceat(means * weights, starts) / merged_weights, merged_weights
+
+
+def encode_digest(means: np.ndarray, weights: np.ndarray) -> bytes:
+    centroids = np.empty(len(means), dtype=_CENTROID)
+    centroids['mean'] = means
+    centroids['weight'] = np.rint(weights)
+    return centroids.tobytes()
+
+
+def _quantiles(owners, means, weights, groups: int, quantiles=QUANTILES) -> np.ndarray:
+    """Percentis (``groups`` x ``len(quantiles)``) com a interpolação linear do
+    ``percentile_cont``; exatos enquanto os centroides têm peso 1."""
+    result = np.full((groups, len(quantiles)), np.nan)
+    if not len(means):
+        return result
+    owners, means, weights = _sorted_centroids(owners, means, weights)
+    bounds = np.searchsorted(owners, np.arange(groups + 1))
+    present = np.flatnonzero(np.diff(bounds) > 0)
+    first, last = bounds[present], bounds[present + 1] - 1
+
+    cumulative = np.cumsum(weights)
+    # Posição (em ranks globais, base 0) do centro de cada centroide
+    centers = cumulative - (weights + 1) / 2
+    start = cumulative[first] - weights[first]
+    total = cumulative[last] - start
+    for column, q in enumerate(quantiles):
+        target = start + q * (total - 1)
+        upper = np.clip(np.searchsorted(centers, target), first, last)
+        lower = np.maximum(upper - 1, first)
+        span = centers[upper] - centers[lower]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.clip(np.where(span > 0, (target - centers[lower]) / span, 1.0), 0.0, 1.0)
+        result[present, column] = means[lower] + fraction * (means[upper] - means[lower])
+    return result
+
+
+# --- Agrupamento ---
+
+def _group(frame: pd.DataFrame, keys: list[str]) -> tuple[np.ndarray, pd.DataFrame]:
+    grouped = frame.groupby(keys, sort=True, dropna=False)
+    return grouped.ngroup().to_numpy(), grouped.size().index.to_frame(index=False)
+
+
+def summarize(frame: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    """Sketches de linhas brutas (``ticket_code``, ``vl_total``) agrupadas por ``keys``.
+
+    Retorna as chaves mais ``item_count``, ``tickets`` e ``vl_total`` serializados.
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=[*keys, 'item_count', 'tickets', 'vl_total'])
+    codes, result = _group(frame, keys)
+    groups = len(result)
+    registers = _hll_registers(codes, groups, hash_tickets(frame['ticket_code'].to_numpy()))
+    values = frame['vl_total'].to_numpy(dtype=np.float64)
+    owners, means, weights = _compress(codes, values, np.ones(len(values)), groups)
+    return _finish(result, np.bincount(codes, minlength=groups), registers, owners, means, weights)
+
+
+def combine(frame: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    """Mescla sketches (saída de ``summarize`` ou linhas da tabela) por ``keys``."""
+    if frame.empty:
+        return pd.DataFrame(columns=[*keys, 'item_count', 'tickets', 'vl_total'])
+    codes, result = _group(frame, keys)
+    groups = len(result)
+    registers = _merge_hll(codes, groups, frame['tickets'].tolist())
+    owners, means, weights = _compress(*_decode_digests(codes, frame['vl_total'].tolist()), groups)
+    counts = np.bincount(codes, weights=frame['item_count'].to_numpy(dtype=np.float64), minlength=groups)
+    return _finish(result, counts.astype(np.int64), registers, owners, means, weights)
+
+
+def _finish(result, counts, registers, owners, means, weights) -> pd.DataFrame:
+    bounds = np.searchsorted(owners, np.arange(len(result) + 1))
+    result['item_count'] = counts
+    result['tickets'] = [encode_hll(row) for row in registers]
+    result['vl_total'] = [
+        encode_digest(means[start:end], weights[start:end]) for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+    return result
+
+
+def merge(frame: pd.DataFrame, keys: list[str], quantiles=QUANTILES) -> pd.DataFrame:
+    """Contagem distinta de tickets e percentis de ``vl_total`` por ``keys``.
+
+    Retorna as chaves mais ``item_count``, ``distinct_tickets`` e uma coluna
+    ``p<NN>`` por quantil.
+    """
+    names = [f"p{round(q * 100)}" for q in quantiles]
+    if frame.empty:
+        return pd.DataFrame(columns=[*keys, 'item_count', 'distinct_tickets', *names])
+    codes, result = _group(frame, keys)
+    groups = len(result)
+    registers = _merge_hll(codes, groups, frame['tickets'].tolist())
+    values = _quantiles(*_decode_digests(codes, frame['vl_total'].tolist()), groups, quantiles)
+    counts = np.bincount(codes, weights=frame['item_count'].to_numpy(dtype=np.float64), minlength=groups)
+    result['item_count'] = counts.astype(np.int64)
+    # O HLL não passa do total de itens; em grupos pequenos isso corta o ruído
+    result['distinct_tickets'] = np.minimum(np.rint(estimate_distinct(registers)), counts).astype(np.int64)
+    for column, name in enumerate(names):
+        result[name] = values[:, column]
+    return result
+
+
+# --- Tabela ---
+
+def _with_key_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.copy()
+    frame['hostname'] = frame['hostname'].fillna(NULL_HOSTNAME)
+    frame['num_caixa'] = pd.to_numeric(frame['num_caixa']).fillna(NULL_NUM_CAIXA).astype(np.int64)
+    return frame
+
+
+def _insert(db: Session, summaries: pd.DataFrame) -> int:
+    if summaries.empty:
+        return 0
+    values = summaries.to_dict('records')
+    for value in values:
+        value['num_caixa'] = int(value['num_caixa'])
+        value['item_count'] = int(value['item_count'])
+    db.execute(insert(models.ItemDailySketchModel), values)
+    return len(values)
+
+
+def _row_sketch(row: dict) -> dict:
+    """Sketch de um único item, sem DataFrame: igual ao de ``summarize``."""
+    hashed = int(hash_tickets([row['ticket_code']])[0])
+    rest = hashed & ((1 << _RANK_BITS) - 1)
+    entry = ((hashed >> _RANK_BITS) << 8) | (_RANK_BITS + 1 - rest.bit_length())
+    return {
+        'day': row['created_at'].date(),
+        'operation_type': row['operation_type'],
+        'hostname': NULL_HOSTNAME if row['hostname'] is None else row['hostname'],
+        'num_caixa': NULL_NUM_CAIXA if row['num_caixa'] is None else int(row['num_caixa']),
+        'item_count': 1,
+        'tickets': np.array([entry], dtype=_ENTRY).tobytes(),
+        'vl_total': encode_digest(np.array([row['vl_total']], dtype=np.float64), np.ones(1)),
+    }
+
+
+def apply_items(db: Session, rows: Iterable[dict]) -> None:
+    """Grava os sketches de itens recém-inseridos, sem fazer commit.
+
+    Cada linha precisa de ``created_at``, ``operation_type``, ``hostname``,
+    ``num_caixa``, ``ticket_code`` e ``vl_total``. Só insere: ingestões
+    concorrentes não disputam as mesmas linhas, e ``compact`` as junta depois.
+    """
+    rows = list(rows)
+    if len(rows) == 1:
+        # POST /items/ direto: um item por requisição, sem pandas
+        db.execute(insert(models.ItemDailySketchModel), [_row_sketch(rows[0])])
+        return
+    frame = pd.DataFrame(
+        [
+            (row['created_at'].date(), row['operation_type'], row['hostname'], row['num_caixa'],
+             row['ticket_code'], row['vl_total'])
+            for row in rows
+        ],
+        columns=[*KEY_COLUMNS, 'ticket_code', 'vl_total'],
+    )
+    if not frame.empty:
+        _insert(db, summarize(_with_key_columns(frame), list(KEY_COLUMNS)))
+
+
+def _items_frame(db: Session, start: datetime, end: datetime, operation_types=None) -> pd.DataFrame:
+    item = models.ItemModel
+    stmt = dictionary.with_labels(
+        select(
+            item.created_at, dictionary.operation_types.label, dictionary.hostnames.label,
+            item.num_caixa, item.ticket_code, item.vl_total,
+        ),
+        dictionary.operation_types, dictionary.hostnames,
+    ).where(item.created_at >= start, item.created_at < end)
+    if operation_types is not None:
+        stmt = stmt.where(item.operation_type_id.in_(dictionary.operation_types.ids(db, operation_types)))
+    frame = pd.DataFrame(
+        db.execute(stmt).all(),
+        columns=['created_at', 'operation_type', 'hostname', 'num_caixa', 'ticket_code', 'vl_total'],
+    )
+    frame.insert(0, 'day', pd.to_datetime(frame['created_at']).dt.date)
+    return _with_key_columns(frame.drop(columns='created_at'))
+
+
+def summarize_items(db: Session, start_date: datetime, end_date: datetime,
+                    operation_types: tuple[str, ...]) -> pd.DataFrame:
+    """Sketches por ``day``, ``hostname`` e ``num_caixa`` de um trecho de ``items``."""
+    frame = _items_frame(db, start_date, end_date + timedelta(microseconds=1), operation_types)
+    return summarize(frame, ['day', 'hostname', 'num_caixa'])
+
+
+def summarize_archive(start_date: datetime, end_date: datetime, operation_types: tuple[str, ...]) -> pd.DataFrame:
+    """Mesmo que ``summarize_items`` para um trecho do arquivo Parquet."""
+    frame = archive.items_frame(
+        start_date, end_date, operation_types, ['created_at', 'hostname', 'num_caixa', 'ticket_code', 'vl_total']
+    )
+    frame.insert(0, 'day', pd.to_datetime(frame['created_at']).dt.date)
+    return summarize(_with_key_columns(frame.drop(columns='created_at')), ['day', 'hostname', 'num_caixa'])
+
+
+def _clamp_to_archive(start: date | None) -> date | None:
+    # Antes do cutoff o arquivo é a referência e items pode já ter sido podada:
+    # esses sketches ficam como estão
+    cutoff = archive.cutoff()
+    if cutoff is not None and (start is None or start < cutoff.date()):
+        return cutoff.date()
+    return start
+
+
+def _day_range(db: Session, start: date | None, end: date | None) -> list[date]:
+    if start is None or end is None:
+        first, last = db.execute(
+            select(func.min(models.ItemModel.created_at), func.max(models.ItemModel.created_at))
+        ).one()
+        if first is None:
+            return []
+        start = start or first.date()
+        end = end or last.date()
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def rebuild(db: Session, start: date | None = None, end: date | None = None) -> int:
+    """Recalcula os sketches dos dias em ``[start, end]`` (todos se omitidos) a partir de ``items``.
+
+    Retorna o número de linhas gravadas.
+    """
+    sketch = models.ItemDailySketchModel
+    start = _clamp_to_archive(start)
+    if db.get_bind().dialect.name == 'postgresql':
+        # Bloqueia ingestões concorrentes até o commit para não perder nem duplicar deltas
+        db.execute(text('LOCK TABLE items_daily_sketches IN EXCLUSIVE MODE'))
+
+    delete_stmt = delete(sketch)
+    if start is not None:
+        delete_stmt = delete_stmt.where(sketch.day >= start)
+    if end is not None:
+        delete_stmt = delete_stmt.where(sketch.day <= end)
+    db.execute(delete_stmt)
+
+    written = 0
+    # Um dia por vez limita a memória ao volume diário
+    for day in _day_range(db, start, end):
+        frame = _items_frame(db, datetime.combine(day, time.min), datetime.combine(day + timedelta(days=1), time.min))
+        written += _insert(db, summarize(frame, list(KEY_COLUMNS)))
+    db.commit()
+    cache.invalidate_all()
+    return written
+
+
+def compact(db: Session, start: date | None = None, end: date | None = None) -> int:
+    """Junta em uma só as linhas de mesma chave nos dias em ``[start, end]``.
+
+    Só as linhas lidas são removidas: deltas gravados durante a compactação
+    continuam valendo. Um dia que outra compactação (de outro worker) mexeu ao
+    mesmo tempo fica para a próxima. Retorna o número de linhas removidas.
+    """
+    sketch = models.ItemDailySketchModel
+    key = [getattr(sketch, column) for column in KEY_COLUMNS]
+    repeated = select(sketch.day).group_by(*key).having(func.count() > 1)
+    if start is not None:
+        repeated = repeated.where(sketch.day >= start)
+    if end is not None:
+        repeated = repeated.where(sketch.day <= end)
+
+    removed = 0
+    for day in sorted(set(db.scalars(repeated))):
+        rows = db.execute(
+            select(sketch.id, *key, sketch.item_count, sketch.tickets, sketch.vl_total).where(sketch.day == day)
+        ).all()
+        frame = pd.DataFrame(rows, columns=['id', *KEY_COLUMNS, 'item_count', 'tickets', 'vl_total'])
+        deleted = db.execute(delete(sketch).where(sketch.id.in_(frame['id'].tolist()))).rowcount
+        if deleted != len(frame):
+            db.rollback()
+            continue
+        written = _insert(db, combine(frame.drop(columns='id'), list(KEY_COLUMNS)))
+        db.commit()
+        removed += len(frame) - written
+    return removed
+
+
+def read(db: Session, start_day: date, end_day: date, operation_types: tuple[str, ...],
+         keys: list[str]) -> pd.DataFrame:
+    """Sketches da tabela nos dias ``[start_day, end_day]`` com as colunas ``keys``.
+
+    No PostgreSQL vem uma linha por grupo de ``keys``, já concatenada; nos
+    demais bancos, as linhas da tabela, e ``merge`` faz o agrupamento.
+    """
+    sketch = models.ItemDailySketchModel
+    key_columns = [getattr(sketch, key) for key in keys]
+    conditions = (sketch.day.between(start_day, end_day), sketch.operation_type.in_(operation_types))
+    if db.get_bind().dialect.name == 'postgresql':
+        empty = literal(b'', LargeBinary)
+        stmt = (
+            select(
+                *key_columns,
+                cast(func.sum(sketch.item_count), BigInteger),
+                func.string_agg(sketch.tickets, empty, type_=LargeBinary),
+                func.string_agg(sketch.vl_total, empty, type_=LargeBinary),
+            )
+            .where(*conditions)
+            .group_by(*key_columns)
+        )
+    else:
+        stmt = select(*key_columns, sketch.item_count, sketch.tickets, sketch.vl_total).where(*conditions)
+    return pd.DataFrame(db.execute(stmt).all(), columns=[*keys, 'item_count', 'tickets', 'vl_total'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção dos sketches diários de items")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (
+        ("compact", "Junta as linhas de mesma chave gravadas pela ingestão"),
+        ("rebuild", "Recalcula os sketches a partir de items"),
+    ):
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument("--start", type=date.fromisoformat, default=None)
+        command_parser.add_argument("--end", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    with MaintenanceSessionLocal() as db:
+        if args.command == "compact":
+            print(f"Sketches compactados: {compact(db, args.start, args.end)} linhas removidas")
+        else:
+            print(f"Sketches reconstruídos: {rebuild(db, args.start, args.end)} linhas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# conftest.py
+"""Bancos descartáveis para os testes.
+
+Sempre roda no SQLite; com ``TEST_POSTGRES_URL`` (um banco só para os testes,
+que é apagado a cada uso) os testes marcados com o fixture ``engine`` rodam
+também no PostgreSQL.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Antes de importar app.config: nada de tocar o banco ou o cache configurados
+_TMP = Path(tempfile.mkdtemp(prefix="data_lake_tests_"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TMP / 'app.sqlite3'}")
+os.environ["QUERY_CACHE_PATH"] = str(_TMP / "query_cache.sqlite3")
+
+from sqlalchemy import create_engine, text
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def engine(request, tmp_path):
+    """Engine de um banco vazio."""
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path / 'test.sqlite3'}")
+    else:
+        if not POSTGRES_URL:
+            pytest.skip("TEST_POSTGRES_URL não definida")
+        engine = create_engine(POSTGRES_URL)
+        with engine.begin() as connection:
+            connection.execute(text("DROP SCHEMA public CASCADE"))
+            connection.execute(text("CREATE SCHEMA public"))
+    yield engine
+    engine.dispose()
@@ -0,0 +1,122 @@
+# test_archive.py
+"""Leituras de linhas (tabela, página, exportação) com meses já arquivados e podados."""
+import contextlib
+import io
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import archive, dictionary, export, migrations, models, repository
+from app.config import settings
+
+OPERATION_TYPES = ("AUTOMATIC_VALIDATION", "MANUAL_VALIDATION")
+START, END = datetime(2024, 1, 1), datetime(2024, 6, 30, 23, 59, 59)
+ORDERS = [
+    (None, "desc"), ("Criado em", "asc"), ("Valor Total", "desc"), ("Valor Total", "asc"),
+    ("Num Caixa", "desc"), ("Num Caixa", "asc"), ("Hostname", "asc"), ("Ticket Code", "desc"),
+]
+
+
+@pytest.fixture
+def db(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "ARCHIVE_PATH", None)
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    rng = random.Random(1)
+    rows = []
+    for n in range(600):
+        operation_type = rng.choice(OPERATION_TYPES)
+        rows.append({
+            "ticket_code": f"T{rng.randrange(10_000):05d}", "num_ped_ecf": None, "num_cupom": n,
+            "num_caixa": rng.choice([None, 1, 2, 3]), "hostname": rng.choice([None, "0001", "0002"]),
+            "vl_total": round(rng.uniform(1, 500), 2), "operation_type": operation_type,
+            "success": rng.random() < 0.9, "message": "ok",
+            "created_at": START + timedelta(seconds=rng.randrange(int((END - START).total_seconds()))),
+        })
+    with Session(engine) as session:
+        session.execute(insert(models.ItemModel), dictionary.encode_rows(session, rows))
+        session.commit()
+        yield session
+
+
+def _archive(db, root, monkeypatch):
+    archive.run(db, root, datetime(2024, 4, 1), prune=True)
+    monkeypatch.setattr(settings, "ARCHIVE_PATH", str(root))
+    assert archive.cutoff() == datetime(2024, 4, 1)
+
+
+def _pages(db, sort_by, sort_order, search_term=None):
+    return [
+        [tuple(row) for row in repository.get_items_page(
+            db, START, END, OPERATION_TYPES, search_term, sort_by, sort_order, limit=70, offset=offset,
+        )]
+        for offset in (0, 140, 280, 420, 560)
+    ]
+
+
+def _export(db, fmt, sort_by=None, sort_order="desc") -> bytes:
+    @contextlib.contextmanager
+    def session_context():
+        yield db
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(export, "analytics_db_context", session_context)
+        return b"".join(export.iter_export(fmt, START, END, OPERATION_TYPES, None, sort_by, sort_order, 50))
+
+
+def test_paginas_e_tabela_incluem_o_arquivo(db, tmp_path, monkeypatch):
+    pages = {order: _pages(db, *order) for order in ORDERS}
+    searched = _pages(db, "Valor Total", "asc", "T0")
+    table = [tuple(row) for row in repository.get_items_by_date(db, START, END, OPERATION_TYPES)]
+    frame = repository.get_items_frame(db, START, END, OPERATION_TYPES)
+
+    _archive(db, tmp_path / "archive", monkeypatch)
+    assert db.query(models.ItemModel).count() < 600
+
+    for order, expected in pages.items():
+        assert _pages(db, *order) == expected, order
+    assert _pages(db, "Valor Total", "asc", "T0") == searched
+    assert [tuple(row) for row in repository.get_items_by_date(db, START, END, OPERATION_TYPES)] == table
+    pd.testing.assert_frame_equal(repository.get_items_frame(db, START, END, OPERATION_TYPES), frame)
+
+
+def test_exportacao_inclui_o_arquivo(db, tmp_path, monkeypatch):
+    expected = {
+        ("csv", None): _export(db, "csv"),
+        ("csv", "Valor Total"): _export(db, "csv", "Valor Total", "asc"),
+        ("parquet", None): pd.read_parquet(io.BytesIO(_export(db, "parquet"))),
+    }
+
+    _archive(db, tmp_path / "archive", monkeypatch)
+
+    assert _export(db, "csv") == expected["csv", None]
+    # Sem o arquivo, a exportação não desempata valores iguais: compara as linhas e a ordem do valor
+    lines = _export(db, "csv", "Valor Total", "asc").decode().splitlines()
+    assert sorted(lines) == sorted(expected["csv", "Valor Total"].decode().splitlines())
+    values = [float(line.split(",")[5]) for line in lines[1:]]
+    assert values == sorted(values)
+    pd.testing.assert_frame_equal(pd.read_parquet(io.BytesIO(_export(db, "parquet"))), expected["parquet", None])
+
+
+@pytest.mark.parametrize("sort_by, sort_order", [("Valor Total", "desc"), ("Hostname", "asc"), ("Num Caixa", "desc")])
+def test_exportacao_ordenada_junta_trechos_do_arquivo(db, tmp_path, monkeypatch, sort_by, sort_order):
+    def table():
+        return [tuple(row) for row in repository.get_items_page(
+            db, START, END, OPERATION_TYPES, None, sort_by, sort_order, limit=600,
+        )]
+
+    expected = table()
+    _archive(db, tmp_path / "archive", monkeypatch)
+    # Vários trechos ordenados do arquivo, juntados a partir do disco
+    monkeypatch.setattr(archive, "BATCH_ROWS", 16)
+    monkeypatch.setattr(archive, "RUN_ROWS", 40)
+
+    exported = pa.ipc.open_stream(_export(db, "arrow", sort_by, sort_order)).read_all()
+    assert [tuple(row.values()) for row in exported.to_pylist()] == expected
+    assert table() == expected
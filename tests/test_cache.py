@@ -0,0 +1,83 @@
+# test_cache.py
+"""Cache de consultas (``app.cache``): os valores voltam iguais sem passar por pickle."""
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import cache, dictionary, migrations, models, repository, rollup, sketches
+from app.config import settings
+
+OPERATION_TYPES = ("AUTOMATIC_VALIDATION", "MANUAL_VALIDATION")
+START, END = datetime(2024, 1, 1), datetime(2024, 3, 31, 23, 59, 59)
+FILTERS = (START, END, OPERATION_TYPES)
+
+
+@pytest.fixture
+def db(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(settings, "ARCHIVE_PATH", None)
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    rng = random.Random(5)
+    rows = [
+        {
+            "ticket_code": f"T{rng.randrange(500):04d}", "num_ped_ecf": None, "num_cupom": n,
+            "num_caixa": rng.choice([None, 1, 2]), "hostname": rng.choice([None, "0001", "0002"]),
+            "vl_total": round(rng.uniform(1, 500), 2), "operation_type": rng.choice(OPERATION_TYPES),
+            "success": rng.random() < 0.9, "message": "ok",
+            "created_at": START + timedelta(minutes=rng.randrange(130_000)),
+        }
+        for n in range(300)
+    ]
+    with Session(engine) as session:
+        session.execute(insert(models.ItemModel), dictionary.encode_rows(session, rows))
+        rollup.rebuild(session)
+        sketches.rebuild(session)
+        session.commit()
+        yield session
+
+
+def _plain(value):
+    if isinstance(value, list):
+        return [tuple(item) if not isinstance(item, dict) else item for item in value]
+    return value
+
+
+@pytest.mark.parametrize("name, call", [
+    ("items", lambda db: repository.get_items_by_date(db, *FILTERS)),
+    ("items_frame", lambda db: repository.get_items_frame(db, *FILTERS)),
+    ("items_page", lambda db: repository.get_items_page(db, *FILTERS, None, "Valor Total", "asc", 50, 10)),
+    ("count", lambda db: repository.count_items_by_date(db, *FILTERS, "T00")),
+    ("kpi", lambda db: repository.get_kpi_data(db, *FILTERS)),
+    ("daily_counts", lambda db: repository.get_daily_counts(db, *FILTERS)),
+    ("distribution", lambda db: repository.get_hostname_caixa_distribution(db, *FILTERS)),
+    ("caixa_sketch_stats", lambda db: repository.get_hostname_caixa_sketch_stats(db, *FILTERS)),
+    ("daily_sketch_stats", lambda db: repository.get_daily_sketch_stats(db, *FILTERS)),
+])
+def test_valor_do_cache_igual_ao_calculado(db, monkeypatch, name, call):
+    monkeypatch.setattr(settings, "QUERY_CACHE_ENABLED", False)
+    expected = call(db)
+    monkeypatch.setattr(settings, "QUERY_CACHE_ENABLED", True)
+    call(db)
+    before = cache.stats()["hits"]
+    found = call(db)
+    assert cache.stats()["hits"] == before + 1
+
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(found, expected)
+    else:
+        assert _plain(found) == _plain(expected)
+
+
+def test_entrada_em_outro_formato_conta_como_ausente(db, monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_CACHE_ENABLED", True)
+    repository.get_daily_counts(db, *FILTERS)
+    conn = cache._connect()
+    conn.execute("UPDATE entries SET value = ?", (b"\x80\x05N.",))  # pickle de None
+    misses = cache.stats()["misses"]
+    assert repository.get_daily_counts(db, *FILTERS)
+    assert cache.stats()["misses"] == misses + 1
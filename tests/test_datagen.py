@@ -0,0 +1,28 @@
+# test_datagen.py
+"""Gerador de dados sintéticos (``app.datagen``)."""
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import datagen, dedup, migrations, models
+
+
+def test_itens_gerados_tem_chave_de_idempotencia(engine):
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    url = engine.url.render_as_string(hide_password=False)
+
+    done = datagen.generate(
+        60, url=url, days=30, end=datetime(2024, 3, 1, 12), workers=1, batch_size=25,
+        rebuild_rollup=False, rebuild_sketches=False,
+    )
+
+    with Session(engine) as db:
+        assert done == db.scalar(select(func.count()).select_from(models.ItemModel)) == 60
+        assert db.scalar(select(func.count()).select_from(models.ItemKeyModel)) == 60
+        item = db.scalars(select(models.ItemModel).limit(1)).one()
+        key = dedup.item_key({
+            "ticket_code": item.ticket_code, "num_cupom": item.num_cupom, "operation_type": item.operation_type,
+        })
+        assert dedup.existing_items(db, [key])[key].id == item.id
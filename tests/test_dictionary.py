@@ -0,0 +1,27 @@
+# test_dictionary.py
+"""Cache em memória das tabelas de dicionário (``app.dictionary``)."""
+from sqlalchemy.orm import Session
+
+from app import dictionary, migrations, models
+from app.config import settings
+
+
+def test_cache_descarta_os_menos_usados(engine, monkeypatch):
+    monkeypatch.setattr(settings, "DICTIONARY_CACHE_SIZE", 2)
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    messages = dictionary.Dictionary(models.MessageModel, "message")
+
+    with Session(engine) as db:
+        first = messages.encode(db, ["a", "b"])
+        db.commit()
+        # "a" acabou de ser usado: "b" é o que sai quando "c" entra
+        assert messages.ids(db, ["a"]) == [first["a"]]
+        created = messages.encode(db, ["c"])
+        db.commit()
+
+        assert list(messages._ids[engine]) == ["a", "c"]
+        assert len(messages._labels[engine]) == 2
+        # Quem saiu do cache volta do banco
+        assert messages.ids(db, ["b", "c"]) == [first["b"], created["c"]]
+        assert messages.labels(db, [first["b"], None]) == {first["b"]: "b"}
@@ -0,0 +1,108 @@
+# test_ingest.py
+"""Gravação em lote de ``POST /items/`` (``app.ingest.BatchWriter``)."""
+import asyncio
+import threading
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, ingest, migrations, schemas
+
+
+@pytest.fixture
+def writer(engine):
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    writer = ingest.BatchWriter(sessionmaker(engine), max_rows=10, max_wait_ms=50, max_queue_size=100)
+    yield writer
+    writer.stop()
+
+
+def _item(ticket_code: str | None = None) -> schemas.ItemCreate:
+    # Códigos únicos: a deduplicação em memória é global ao processo
+    return schemas.ItemCreate(
+        ticket_code=ticket_code or uuid.uuid4().hex, vl_total=10.0,
+        operation_type="MANUAL_VALIDATION", success=True, message="ok",
+    )
+
+
+def test_item_ruim_nao_derruba_o_lote(writer, monkeypatch):
+    create_items_bulk = crud.create_items_bulk
+
+    def failing(db, items):
+        if any(item.ticket_code == "RUIM" for item in items):
+            raise ValueError("item inválido")
+        return create_items_bulk(db, items)
+
+    monkeypatch.setattr(crud, "create_items_bulk", failing)
+    items = [_item(), _item("RUIM"), _item()]
+    futures = [writer.submit(item) for item in items]
+    writer.start()
+
+    good = [futures[0].result(timeout=5), futures[2].result(timeout=5)]
+    assert [item.ticket_code for item in good] == [items[0].ticket_code, items[2].ticket_code]
+    assert good[0].id != good[1].id
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert writer.stats.snapshot()["errors"] == 2
+
+
+def test_timeout_na_fila_nao_grava(writer):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(writer.write(_item(), timeout=0.05))
+    assert error.value.status_code == 503
+
+    writer.start()
+    writer.stop()
+    assert writer.stats.snapshot()["rows"] == 0
+
+
+def test_timeout_depois_de_sair_da_fila_espera_o_commit(writer, monkeypatch):
+    create_items_bulk = crud.create_items_bulk
+    flushing, release = threading.Event(), threading.Event()
+
+    def slow(db, items):
+        flushing.set()
+        release.wait(5)
+        return create_items_bulk(db, items)
+
+    monkeypatch.setattr(crud, "create_items_bulk", slow)
+    writer.start()
+
+    async def write():
+        task = asyncio.create_task(writer.write(_item(), timeout=0.05))
+        await asyncio.to_thread(flushing.wait, 5)
+        await asyncio.sleep(0.1)  # Passa do timeout com o item já em gravação
+        release.set()
+        return await task
+
+    assert asyncio.run(write()).id is not None
+
+
+def test_gravacao_travada_responde_504(writer):
+    session_factory = writer.session_factory
+    flushing, release = threading.Event(), threading.Event()
+
+    def stuck():
+        flushing.set()
+        release.wait(5)
+        return session_factory()
+
+    writer.session_factory = stuck
+    writer.flush_timeout = 0.1
+    writer.start()
+
+    async def write():
+        # Bem acima de max_wait_ms: o item já saiu da fila quando o timeout vence
+        task = asyncio.create_task(writer.write(_item(), timeout=0.5))
+        await asyncio.to_thread(flushing.wait, 5)
+        try:
+            return await task
+        finally:
+            release.set()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(write())
+    assert error.value.status_code == 504
@@ -0,0 +1,144 @@
+# test_migrations.py
+"""Banco novo pelas migrações (``app.migrations``) contra ``models.Base.metadata``."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import insert, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app import dictionary, migrations, models, partitions, sketches
+
+# Só existem nas migrações: partições de items, tabelas do FTS5 (SQLite) e o
+# GIN de trigramas (PostgreSQL)
+MIGRATION_ONLY_TABLES = ("items_p", "items_default", "items_ticket_fts")
+MIGRATION_ONLY_INDEXES = {"ix_items_ticket_code_trgm", "ix_items_num_cupom_trgm", "ix_items_num_caixa_trgm"}
+# O SQLite não altera NOT NULL de coluna existente (f3a5c7e9b1d4)
+SQLITE_NULLABLE = {"operation_type_id", "message_id"}
+
+
+def _include(obj, name, type_, reflected, compare_to):
+    if type_ == "table" and reflected and compare_to is None:
+        return not name.startswith(MIGRATION_ONLY_TABLES)
+    if type_ == "index" and reflected and compare_to is None:
+        return name not in MIGRATION_ONLY_INDEXES
+    return True
+
+
+def _differences(connection) -> list:
+    context = MigrationContext.configure(connection, opts={"include_object": _include})
+    differences = []
+    for diff in compare_metadata(context, models.Base.metadata):
+        # Alterações de coluna vêm agrupadas em listas
+        change = diff[0] if isinstance(diff, list) else diff
+        if (connection.dialect.name == "sqlite" and change[0] == "modify_nullable"
+                and change[3] in SQLITE_NULLABLE):
+            continue
+        differences.append(diff)
+    return differences
+
+
+@pytest.mark.filterwarnings("ignore:.*expression-based index")
+def test_banco_vazio_recebe_as_migracoes(engine):
+    migrations.prepare(engine, "check")
+
+    with engine.connect() as connection:
+        assert migrations.current(connection) == migrations.heads()
+        assert _differences(connection) == []
+        if engine.dialect.name == "postgresql":
+            assert "ix_items_ticket_code_trgm" in {
+                index["name"] for index in inspect(connection).get_indexes("items")
+            }
+    if engine.dialect.name == "postgresql":
+        with Session(engine) as db:
+            assert partitions.is_partitioned(db)
+    # Já nos heads: a segunda subida só confere
+    migrations.prepare(engine, "check")
+
+
+def test_workers_sobem_juntos_em_banco_vazio(engine):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("advisory lock só no PostgreSQL")
+    with ThreadPoolExecutor(4) as pool:
+        for result in [pool.submit(migrations.prepare, engine, "check") for _ in range(4)]:
+            result.result()
+
+    with engine.connect() as connection:
+        assert migrations.current(connection) == migrations.heads()
+
+
+def test_check_recusa_revisao_antiga(engine):
+    migrations.prepare(engine, "check")
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE alembic_version SET version_num = '03ee80d94e80'"))
+
+    with pytest.raises(RuntimeError, match="app.migrations upgrade"):
+        migrations.prepare(engine, "check")
+
+
+def test_check_recusa_banco_sem_versao(engine):
+    models.Base.metadata.create_all(bind=engine)
+
+    with pytest.raises(RuntimeError, match="stamp 03ee80d94e80"):
+        migrations.prepare(engine, "check")
+
+
+def test_banco_do_create_all_marcado_recebe_as_migracoes(engine):
+    # Schema antigo sem alembic_version, como o create_all deixava
+    with engine.begin() as connection:
+        migrations.upgrade(connection, "03ee80d94e80")
+        connection.execute(text("DROP TABLE alembic_version"))
+
+    with engine.begin() as connection:
+        migrations.stamp(connection, "03ee80d94e80")
+        migrations.upgrade(connection)
+    migrations.prepare(engine, "check")
+
+
+def test_migracao_dos_sketches_preenche_o_historico(engine):
+    with engine.begin() as connection:
+        migrations.upgrade(connection, "f3a5c7e9b1d4")
+    rows = [
+        {
+            "ticket_code": f"T{n % 7}", "num_ped_ecf": None, "num_cupom": n, "num_caixa": 1,
+            "hostname": "0001", "vl_total": float(n), "operation_type": "AUTOMATIC_VALIDATION",
+            "success": True, "message": "ok", "created_at": datetime(2024, 3, 1 + n % 2, 10),
+        }
+        for n in range(20)
+    ]
+    # Um dia com mais valores que a compressão do t-digest e chaves nulas
+    rows += [
+        {
+            "ticket_code": f"U{n}", "num_ped_ecf": None, "num_cupom": n, "num_caixa": None,
+            "hostname": None, "vl_total": n * 1.5, "operation_type": "MANUAL_VALIDATION",
+            "success": True, "message": "ok", "created_at": datetime(2024, 3, 5, n % 24),
+        }
+        for n in range(500)
+    ]
+    with Session(engine) as db:
+        db.execute(insert(models.ItemModel), dictionary.encode_rows(db, rows))
+        db.commit()
+
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+
+    # A cópia congelada na migração grava os mesmos sketches que app.sketches
+    sketch = models.ItemDailySketchModel
+    columns = (sketch.day, sketch.operation_type, sketch.hostname, sketch.num_caixa,
+               sketch.item_count, sketch.tickets, sketch.vl_total)
+    with Session(engine) as db:
+        migrated = sorted(tuple(row) for row in db.execute(select(*columns)))
+        sketches.rebuild(db)
+        assert sorted(tuple(row) for row in db.execute(select(*columns))) == migrated
+        assert len(migrated) == 3
+
+    with Session(engine) as db:
+        frame = sketches.read(db, datetime(2024, 3, 1).date(), datetime(2024, 3, 2).date(),
+                              ("AUTOMATIC_VALIDATION",), ["day"])
+    result = sketches.merge(frame, ["day"]).sort_values("day")
+    assert result["item_count"].tolist() == [10, 10]
+    assert result["distinct_tickets"].tolist() == [7, 7]
+    # Poucos valores: o percentil é exato
+    assert result["p50"].tolist() == [9.0, 10.0]
@@ -0,0 +1,78 @@
+# test_partitions.py
+"""Retenção de ``partitions.maintain`` (somente PostgreSQL)."""
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app import dictionary, migrations, models, partitions, repository, rollup, sketches
+from app.config import settings
+
+
+def _row(created_at: datetime) -> dict:
+    return {
+        "ticket_code": f"T{created_at:%Y%m%d}", "num_ped_ecf": None, "num_cupom": 1, "num_caixa": 1,
+        "hostname": "0001", "vl_total": 10.0, "operation_type": "MANUAL_VALIDATION",
+        "success": True, "message": "ok", "created_at": created_at,
+    }
+
+
+def _count(db: Session, model, column, boundary) -> int:
+    return db.scalar(select(func.count()).select_from(model).where(column < boundary))
+
+
+def test_retencao_limpa_default_rollup_e_sketches(engine):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("partições só existem no PostgreSQL")
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+
+    with Session(engine) as db:
+        # Sem partição para esses meses: as linhas caem na default
+        created = [datetime(2023, 1, 10), datetime(2023, 2, 5), datetime(2024, 5, 10)]
+        db.execute(insert(models.ItemModel), dictionary.encode_rows(db, [_row(value) for value in created]))
+        db.commit()
+        partitions.create_partition(db, date(2023, 2, 1))
+        rollup.rebuild(db)
+        sketches.rebuild(db)
+        db.commit()
+
+        report = partitions.maintain(db, ahead=1, retain_months=3, drop=True, today=date(2024, 6, 15))
+
+        boundary = date(2024, 3, 1)
+        assert report["dropped"] == ["items_p2023_02"]
+        assert report["default_rows_deleted"] == 1
+        assert _count(db, models.ItemModel, models.ItemModel.created_at, boundary) == 0
+        assert _count(db, models.ItemDailyRollupModel, models.ItemDailyRollupModel.day, boundary) == 0
+        assert _count(db, models.ItemDailySketchModel, models.ItemDailySketchModel.day, boundary) == 0
+        assert db.scalar(select(func.count()).select_from(models.ItemModel)) == 1
+        assert db.scalar(select(func.count()).select_from(models.ItemDailySketchModel)) == 1
+
+
+def test_retencao_com_arquivo_mantem_os_sketches(engine, tmp_path, monkeypatch):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("partições só existem no PostgreSQL")
+    monkeypatch.setattr(settings, "QUERY_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "ARCHIVE_PATH", str(tmp_path / "archive"))
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+
+    with Session(engine) as db:
+        created = [datetime(2024, 1, 10, 12), datetime(2024, 2, 5, 12), datetime(2024, 5, 10, 12)]
+        db.execute(insert(models.ItemModel), dictionary.encode_rows(db, [_row(value) for value in created]))
+        db.commit()
+        partitions.create_partition(db, date(2024, 1, 1))
+        rollup.rebuild(db)
+        sketches.rebuild(db)
+        db.commit()
+
+        partitions.maintain(db, ahead=1, retain_months=3, drop=True, today=date(2024, 6, 15))
+
+        assert _count(db, models.ItemModel, models.ItemModel.created_at, date(2024, 3, 1)) == 0
+        stats = repository.get_daily_sketch_stats(
+            db, datetime(2024, 1, 1), datetime(2024, 6, 30, 23, 59, 59), ("MANUAL_VALIDATION",)
+        )
+        assert sorted(pd.to_datetime(stats["Data"]).dt.date) == [date(2024, 1, 10), date(2024, 2, 5), date(2024, 5, 10)]
+        assert stats["Tickets Distintos"].tolist() == [1, 1, 1]
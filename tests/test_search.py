@@ -0,0 +1,71 @@
+# test_search.py
+"""Busca por ``search_term`` (``app.search``): substring em ticket_code, num_cupom e num_caixa."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import archive, dictionary, migrations, models, repository
+from app.config import settings
+
+OPERATION_TYPES = ("AUTOMATIC_VALIDATION", "MANUAL_VALIDATION")
+START, END = datetime(2024, 1, 1), datetime(2024, 6, 30, 23, 59, 59)
+ITEMS = [
+    # (ticket_code, num_cupom, num_caixa, created_at)
+    ("ab12-cd", 7, 3, datetime(2024, 2, 10)),
+    ("xyz-000", 1234, 5, datetime(2024, 2, 11)),
+    ("xyz-001", 8, 412, datetime(2024, 5, 10)),
+    ("xyz-002", 99, None, datetime(2024, 5, 11)),
+    ("QQ-9", 512, 1, datetime(2024, 5, 12)),
+]
+
+
+@pytest.fixture
+def db(engine, monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "ARCHIVE_PATH", None)
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    rows = [
+        {
+            "ticket_code": ticket_code, "num_ped_ecf": None, "num_cupom": num_cupom, "num_caixa": num_caixa,
+            "hostname": "0001", "vl_total": 10.0, "operation_type": "MANUAL_VALIDATION",
+            "success": True, "message": "ok", "created_at": created_at,
+        }
+        for ticket_code, num_cupom, num_caixa, created_at in ITEMS
+    ]
+    with Session(engine) as session:
+        session.execute(insert(models.ItemModel), dictionary.encode_rows(session, rows))
+        session.commit()
+        yield session
+
+
+def _tickets(db, search_term: str) -> set[str]:
+    rows = repository.get_items_page(db, START, END, OPERATION_TYPES, search_term, limit=100)
+    assert repository.count_items_by_date(db, START, END, OPERATION_TYPES, search_term) == len(rows)
+    return {row[0] for row in rows}
+
+
+CASES = {
+    "12": {"ab12-cd", "xyz-000", "xyz-001", "QQ-9"},
+    "123": {"xyz-000"},
+    "41": {"xyz-001"},
+    "xyz": {"xyz-000", "xyz-001", "xyz-002"},
+    "qq": {"QQ-9"},
+    "9": {"QQ-9", "xyz-002"},
+    "-00": {"xyz-000", "xyz-001", "xyz-002"},
+}
+
+
+def test_termo_numerico_casa_como_substring(db):
+    for search_term, expected in CASES.items():
+        assert _tickets(db, search_term) == expected, search_term
+
+
+def test_arquivo_busca_com_a_mesma_semantica(db, tmp_path, monkeypatch):
+    archive.run(db, tmp_path / "archive", datetime(2024, 4, 1), prune=True)
+    monkeypatch.setattr(settings, "ARCHIVE_PATH", str(tmp_path / "archive"))
+
+    for search_term, expected in CASES.items():
+        assert _tickets(db, search_term) == expected, search_term
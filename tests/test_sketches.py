@@ -0,0 +1,170 @@
+# test_sketches.py
+"""Sketches diários (``app.sketches``): precisão, mesclagem, gravação pela
+ingestão e compactação."""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import ingest, migrations, models, sketches
+
+KEYS = list(sketches.KEY_COLUMNS)
+# Erro padrão do HLL: 1,04 / sqrt(registradores)
+HLL_STANDARD_ERROR = 1.04 / np.sqrt(1 << sketches.HLL_PRECISION)
+
+
+def _item(n: int, **overrides) -> dict:
+    item = {
+        "created_at": datetime.combine(date.today(), datetime.min.time()).replace(hour=10),
+        "operation_type": "AUTOMATIC_VALIDATION", "hostname": "0001", "num_caixa": 1,
+        "ticket_code": f"T{n}", "vl_total": float(n),
+    }
+    return {**item, **overrides}
+
+
+def _sketch_rows(db) -> int:
+    return db.scalar(select(func.count()).select_from(models.ItemDailySketchModel))
+
+
+def test_sketch_de_um_item_igual_ao_do_summarize():
+    for row in (_item(7), _item(8, hostname=None, num_caixa=None), _item(9, ticket_code="")):
+        frame = pd.DataFrame([{
+            "day": row["created_at"].date(), **{key: row[key] for key in KEYS[1:]},
+            "ticket_code": row["ticket_code"], "vl_total": row["vl_total"],
+        }])
+        expected = sketches.summarize(sketches._with_key_columns(frame), KEYS).iloc[0].to_dict()
+        single = sketches._row_sketch(row)
+        assert single == {**expected, "num_caixa": int(expected["num_caixa"]), "item_count": 1}
+
+
+def test_compactacao_junta_as_linhas_da_ingestao(engine):
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    Session_ = sessionmaker(bind=engine)
+    with Session_() as db:
+        for n in range(30):
+            sketches.apply_items(db, [_item(n, hostname=f"000{n % 2}")])
+        sketches.apply_items(db, [_item(n) for n in range(30, 40)])
+        db.commit()
+        assert _sketch_rows(db) == 31
+        before = sketches.merge(sketches.read(db, date.today(), date.today(), ("AUTOMATIC_VALIDATION",), KEYS), KEYS)
+
+    assert ingest.SketchCompactor(Session_, interval_s=60).run_once() == 29
+    with Session(engine) as db:
+        assert _sketch_rows(db) == 2
+        after = sketches.merge(sketches.read(db, date.today(), date.today(), ("AUTOMATIC_VALIDATION",), KEYS), KEYS)
+    pd.testing.assert_frame_equal(before.sort_values("hostname").reset_index(drop=True),
+                                  after.sort_values("hostname").reset_index(drop=True))
+
+
+def _frame(tickets, values, group=0) -> pd.DataFrame:
+    return pd.DataFrame({"group": group, "ticket_code": tickets, "vl_total": values})
+
+
+def _distinct(summaries: pd.DataFrame) -> float:
+    """Estimativa do HLL sem o corte pelo total de itens que ``merge`` aplica."""
+    codes = np.zeros(len(summaries), dtype=np.int64)
+    return sketches.estimate_distinct(sketches._merge_hll(codes, 1, summaries["tickets"].tolist()))[0]
+
+
+def _rank_error(values: np.ndarray, estimate: float, q: float) -> float:
+    """Distância, em quantil, entre ``estimate`` e o quantil ``q`` exato."""
+    ordered = np.sort(values)
+    low, high = np.searchsorted(ordered, estimate, "left"), np.searchsorted(ordered, estimate, "right")
+    return max(0.0, low / len(values) - q, q - high / len(values))
+
+
+@pytest.mark.parametrize("distinct", [1_000, 20_000, 200_000])
+def test_hll_dentro_do_erro_padrao(distinct):
+    errors = []
+    for sample in range(10):
+        tickets = [f"S{sample}-{n}" for n in range(distinct)]
+        summary = sketches.summarize(_frame(tickets, 1.0), ["group"])
+        errors.append(_distinct(summary) / distinct - 1)
+    errors = np.array(errors)
+    assert np.abs(errors).max() < 3 * HLL_STANDARD_ERROR
+    assert np.sqrt((errors ** 2).mean()) < 1.5 * HLL_STANDARD_ERROR
+
+
+def test_hll_ignora_tickets_repetidos():
+    tickets = [f"T{n % 5_000}" for n in range(50_000)]
+    summary = sketches.summarize(_frame(tickets, 1.0), ["group"])
+    assert abs(_distinct(summary) / 5_000 - 1) < 3 * HLL_STANDARD_ERROR
+
+
+def test_tdigest_erro_de_quantil():
+    values = np.random.default_rng(7).lognormal(3.5, 0.8, 200_000)
+    summary = sketches.summarize(_frame([f"T{n}" for n in range(len(values))], values), ["group"])
+    result = sketches.merge(summary, ["group"])
+    assert len(summary["vl_total"][0]) // 12 <= 2 * sketches.DIGEST_COMPRESSION
+    # A escala k1 concentra os centroides nas caudas
+    for q, tolerance in ((0.5, 0.005), (0.95, 0.002), (0.99, 0.001)):
+        assert _rank_error(values, result[f"p{round(q * 100)}"][0], q) < tolerance
+
+
+def test_exato_ate_a_compressao():
+    values = np.random.default_rng(3).normal(100, 30, sketches.DIGEST_COMPRESSION).round(2)
+    tickets = [f"T{n}" for n in range(len(values))]
+    result = sketches.merge(sketches.summarize(_frame(tickets, values), ["group"]), ["group"])
+    for q in sketches.QUANTILES:
+        # Mesma interpolação do percentile_cont
+        assert result[f"p{round(q * 100)}"][0] == pytest.approx(np.percentile(values, q * 100), rel=1e-12)
+    assert result["item_count"][0] == len(values)
+    assert abs(result["distinct_tickets"][0] - len(values)) <= 1
+
+
+def test_mesclagem_associativa():
+    rng = np.random.default_rng(11)
+    parts = [
+        _frame([f"T{rng.integers(30_000)}" for _ in range(20_000)], rng.lognormal(3, 1, 20_000))
+        for _ in range(3)
+    ]
+    a, b, c = (sketches.summarize(part, ["group"]) for part in parts)
+    left = sketches.combine(pd.concat([sketches.combine(pd.concat([a, b]), ["group"]), c]), ["group"])
+    right = sketches.combine(pd.concat([a, sketches.combine(pd.concat([b, c]), ["group"])]), ["group"])
+    flat = pd.concat([a, b, c])
+    everything = pd.concat(parts)
+
+    # O HLL mescla sem perda: mesmos registradores em qualquer ordem
+    assert left["tickets"][0] == right["tickets"][0]
+    assert _distinct(left) == _distinct(flat) == _distinct(sketches.summarize(everything, ["group"]))
+    for grouping in (left, right, flat):
+        result = sketches.merge(grouping, ["group"])
+        assert result["item_count"][0] == len(everything)
+        for q in sketches.QUANTILES:
+            assert _rank_error(everything["vl_total"].to_numpy(), result[f"p{round(q * 100)}"][0], q) < 0.005
+
+
+def test_read_concatena_as_linhas_de_cada_grupo(engine):
+    """No PostgreSQL ``read`` junta as linhas com string_agg; o resultado tem de
+    ser o mesmo que mesclar as linhas da tabela uma a uma."""
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    rng = np.random.default_rng(5)
+    first = date(2024, 5, 1)
+    with Session(engine) as db:
+        for _ in range(4):
+            rows = [
+                _item(int(n), created_at=datetime(2024, 5, 1, 10) + timedelta(days=int(rng.integers(3))),
+                      hostname=f"000{rng.integers(3)}", vl_total=float(rng.lognormal(3, 1)))
+                for n in rng.integers(0, 2_000, 1_500)
+            ]
+            sketches.apply_items(db, rows)
+        db.commit()
+
+        read = sketches.read(db, first, first + timedelta(days=2), ("AUTOMATIC_VALIDATION",), ["hostname"])
+        sketch = models.ItemDailySketchModel
+        raw = pd.DataFrame(
+            db.execute(select(sketch.hostname, sketch.item_count, sketch.tickets, sketch.vl_total)).all(),
+            columns=["hostname", "item_count", "tickets", "vl_total"],
+        )
+    assert len(raw) > 3
+    if engine.dialect.name == "postgresql":
+        assert len(read) == 3
+    expected = sketches.merge(raw, ["hostname"]).sort_values("hostname").reset_index(drop=True)
+    result = sketches.merge(read, ["hostname"]).sort_values("hostname").reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected)
+    assert result["item_count"].sum() == 6_000